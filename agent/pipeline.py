@@ -3,13 +3,14 @@ from __future__ import annotations
 import os, time, json, logging
 from typing import Any, Dict, List, Optional, Tuple
 
-from vendors.openai_client import client, CHAT_MODEL, EMBED_MODEL
+from vendors.openai_client import client, CHAT_MODEL
 from vendors.pinecone_client import get_index
 from vendors.supabase_client import supabase
 
 from agent import store
 from validators.json import strict_parse_or_retry
 from memory.selection import rank_and_pack_minimal
+from memory.retrieval import retrieve
 
 logger = logging.getLogger(__name__)
 
@@ -32,33 +33,6 @@ def _recency_decay(days: float, half_life: int = int(os.getenv("RECENCY_HALFLIFE
     import math
     return math.exp(-math.log(2) * (days / float(half_life)))
 
-def _embed(text: str) -> List[float]:
-    return client.embeddings.create(model=EMBED_MODEL, input=text).data[0].embedding
-
-def _pine_query(query: str, namespace: str, top_k: int = 10) -> List[Dict[str,Any]]:
-    idx = get_index()
-    vec = _embed(query)
-    res = idx.query(vector=vec, top_k=top_k, namespace=namespace, include_metadata=True)
-    # unify shape
-    matches = res.get("matches") if isinstance(res, dict) else getattr(res, "matches", [])
-    out=[]
-    for m in matches or []:
-        meta = m.get("metadata") if isinstance(m, dict) else getattr(m, "metadata", {}) or {}
-        out.append({
-            "id": m.get("id") if isinstance(m, dict) else getattr(m, "id", None),
-            "score": m.get("score") if isinstance(m, dict) else getattr(m, "score", 0.0),
-            "namespace": namespace,
-            "metadata": meta,
-        })
-    return out
-
-def _fetch_memories(ids: List[str]) -> List[Dict[str,Any]]:
-    if not ids:
-        return []
-    # ids are like mem_<uuid>; strip mem_ to look up embedding_id or store both
-    r = supabase.table("memories").select("*").in_("embedding_id", ids).execute()
-    return r.data or []
-
 def _answer_llm(context_blocks: List[Dict[str,Any]], prompt: str) -> Dict[str, Any]:
     # Build context text
     ctx = []
@@ -108,17 +82,19 @@ def handle_chat(req: Dict[str,Any]) -> Dict[str,Any]:
     if intent != "qa":
         return {"session_id": session["id"], "answer": "This endpoint currently supports QA only.", "citations": [], "guidance_questions": [], "autosave": {"saved": False}, "redteam": {"action":"allow","reasons":["non-qa request"]}, "metrics":{"latency_ms": int((time.time()-t0)*1000)}}
 
-    # 3) per-type vector search (minimal day1)
-    hits = []
-    for ns in ("episodic","semantic","procedural"):
-        try:
-            hits.extend(_pine_query(prompt, namespace=ns, top_k=int(os.getenv("TOPK_PER_TYPE","10"))))
-        except Exception as ex:
-            logger.warning(f"pinecone query failed for {ns}: {ex}")
-
-    # 4) fetch records
-    embedding_ids = [h["id"] for h in hits if h.get("id")]
-    recs = _fetch_memories(embedding_ids)
+    # 3+4) per-type vector search and records: one embedding, one memories query
+    retrieval_metrics: Dict[str, Any] = {}
+    try:
+        recs = retrieve(
+            supabase, get_index(), prompt,
+            namespaces=("episodic","semantic","procedural"),
+            top_k_per_ns=int(os.getenv("TOPK_PER_TYPE","10")),
+            metrics=retrieval_metrics,
+        )
+    except Exception as ex:
+        logger.warning(f"retrieval failed: {ex}")
+        recs = []
+    hits = [{"id": r["id"], "score": r["score"], "namespace": r["namespace"]} for r in recs]
 
     # 5) rank + pack (day1 minimal)
     packed = rank_and_pack_minimal(hits, recs, wm, prompt)
@@ -151,5 +127,5 @@ def handle_chat(req: Dict[str,Any]) -> Dict[str,Any]:
         "guidance_questions": draft.get("guidance_questions",[]),
         "autosave": autosave,
         "redteam": redteam,
-        "metrics": {"latency_ms": int((time.time()-t0)*1000)},
+        "metrics": {"latency_ms": int((time.time()-t0)*1000), "retrieval": retrieval_metrics},
     }
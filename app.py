@@ -4,6 +4,8 @@ import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from ingest.spool import UploadBodyLimit
+
 # Load config once at startup. Fail loudly if env is broken.
 from config import (
     load_config,
@@ -30,6 +32,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cap /upload and /upload/bulk request bodies before the multipart parser spools them.
+app.add_middleware(UploadBodyLimit)
+
 # Track router mount failures so 404s aren’t mysteries.
 _router_failures = []
 _mounted = []
@@ -48,6 +53,7 @@ def _mount(router_module_name: str):
 # Mount all known routers. If any explode at import-time, we’ll see it in /debug/routers.
 _mount("chat")
 _mount("upload")
+_mount("upload_bulk")
 _mount("ingest")
 _mount("memories")
 _mount("debug_selftest")
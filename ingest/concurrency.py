@@ -0,0 +1,29 @@
+# ingest/concurrency.py
+# Bounded, order-preserving fan-out for the per-chunk ingest stages.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def stage_limit(env_name: str, default: int) -> int:
+    """
+    In-flight cap for one ingest stage (e.g. INGEST_META_CONCURRENCY).
+    INGEST_CONCURRENT=false forces every stage back to serial execution.
+    """
+    if os.getenv("INGEST_CONCURRENT", "true").lower() != "true":
+        return 1
+    try:
+        return max(1, int(os.getenv(env_name, str(default))))
+    except ValueError:
+        return default
+
+def bounded_map(fn: Callable[[T], R], items: Iterable[T], max_workers: int, name: str = "ingest") -> List[R]:
+    """Like list(map(fn, items)) with at most max_workers calls in flight; results keep input order."""
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [fn(x) for x in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix=name) as pool:
+        return list(pool.map(fn, items))
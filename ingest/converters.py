@@ -1,51 +1,269 @@
 # ingest/converters.py
-import io, os, re
-from typing import Tuple
+# Every converter takes `src`: the file's bytes, or the path of a spooled upload
+# (ingest/spool.py) which is read through a file handle / mmap instead of a bytes copy.
+import codecs, io, mmap, os, posixpath, re, zipfile
+from typing import List, Optional, Tuple, Union
 from pypdf import PdfReader
 from docx import Document
 from bs4 import BeautifulSoup
+from lxml import etree
 
-def _norm_text(s: str) -> str:
-    s = s or ""
-    # remove common cruft
-    s = re.sub(r"\r\n", "\n", s)
-    s = re.sub(r"[ \t]+", " ", s)
-    # drop repeating page footers/headers (very light heuristic)
-    s = re.sub(r"\n{3,}", "\n\n", s).strip()
-    return s
-
-def from_pdf(data: bytes) -> Tuple[str, str]:
-    reader = PdfReader(io.BytesIO(data))
-    pages = []
-    for p in reader.pages:
+from ingest.text import NormalizedText, normalize_text, normalize_with_offsets
+from ingest.executors import cpu_pool, in_worker_process, reset_cpu_pool, run_in_cpu
+
+Source = Union[bytes, str, os.PathLike]
+
+def _norm_text(s: str) -> NormalizedText:
+    # \r\n, runs of spaces/tabs, 3+ blank lines; the result is marked so later passes are no-ops
+    return normalize_text(s)
+
+def _stream(src: Source):
+    """Binary file object for src (caller closes it)."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return io.BytesIO(src)
+    return open(src, "rb")
+
+def _decode(src: Source) -> str:
+    """UTF-8 text of src (errors ignored); paths are decoded straight from an mmap."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return codecs.utf_8_decode(src, "ignore", True)[0]
+    with open(src, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return codecs.utf_8_decode(mm, "ignore", True)[0]
+
+def _pdf_pages(src: Source, start: int, end: int) -> List[str]:
+    """Text of pages [start, end); runs in a worker process for large PDFs (src is then a path)."""
+    with _stream(src) as f:
+        reader = PdfReader(f)
+        pages = []
+        for i in range(start, end):
+            try:
+                pages.append(reader.pages[i].extract_text() or "")
+            except Exception:
+                pages.append("")
+        return pages
+
+def _pdf_workers() -> int:
+    try:
+        return max(1, int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1)))))
+    except ValueError:
+        return 1
+
+def _pdf_parallel(n_pages: int) -> bool:
+    return _pdf_workers() > 1 and n_pages >= int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24")) and not in_worker_process()
+
+def _pdf_page_count(src: Source) -> int:
+    with _stream(src) as f:
+        return len(PdfReader(f).pages)
+
+def _extract_pdf_pages(src: Source, n_pages: int) -> List[str]:
+    """
+    Per-page text in page order. PDFs with at least PDF_PARALLEL_MIN_PAGES pages (default 24)
+    are split into contiguous page ranges (about two per PDF_WORKERS, default min(4, cpus)) run
+    on the shared conversion pool (ingest/executors.py); smaller files, PDF_WORKERS=1, calls from
+    inside a worker process, or a pool failure run serially.
+    """
+    if _pdf_parallel(n_pages):
+        step = -(-n_pages // (_pdf_workers() * 2))  # ~2 ranges per worker evens out slow pages
+        ranges = [(i, min(i + step, n_pages)) for i in range(0, n_pages, step)]
         try:
-            pages.append(p.extract_text() or "")
-        except Exception:
-            pages.append("")
+            pool = cpu_pool()
+            futures = [pool.submit(_pdf_pages, src, a, b) for a, b in ranges]
+            return [t for f in futures for t in f.result()]
+        except Exception as e:
+            print("Parallel PDF extraction failed, extracting serially:", e)
+            reset_cpu_pool()
+    return _pdf_pages(src, 0, n_pages)
+
+def from_pdf(src: Source, n_pages: Optional[int] = None) -> Tuple[str, str]:
+    if n_pages is None:
+        n_pages = _pdf_page_count(src)
+    pages = _extract_pdf_pages(src, n_pages)
     txt = "\n\n".join(pages)
-    return _norm_text(txt), "application/pdf"
+    # page i starts after the pages before it and their "\n\n" joiners
+    starts, pos = [], 0
+    for p in pages:
+        starts.append(pos)
+        pos += len(p) + 2
+    norm, page_starts = normalize_with_offsets(txt, starts)
+    norm.page_starts = page_starts
+    return norm, "application/pdf"
+
+def _fast_converters() -> bool:
+    # CONVERTER_ENGINE=legacy goes back to the BeautifulSoup / python-docx object models
+    return os.getenv("CONVERTER_ENGINE", "fast").lower() != "legacy"
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY, _W_P, _W_TBL, _W_SDT = _W + "body", _W + "p", _W + "tbl", _W + "sdt"
+_W_R, _W_HYPERLINK, _W_T, _W_BR, _W_TYPE = _W + "r", _W + "hyperlink", _W + "t", _W + "br", _W + "type"
+# run children with a fixed text equivalent (w:br depends on its type), as python-docx reads them
+_RUN_TEXT = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+_OFFICE_DOCUMENT = "/officeDocument"
+
+def _docx_main_part(z: zipfile.ZipFile) -> str:
+    """Zip member of the main document part (the package's officeDocument relationship)."""
+    try:
+        rels = etree.fromstring(z.read("_rels/.rels"))
+    except (KeyError, etree.XMLSyntaxError):
+        return "word/document.xml"
+    for rel in rels:
+        if (rel.get("Type") or "").endswith(_OFFICE_DOCUMENT) and rel.get("TargetMode") != "External":
+            return posixpath.normpath(rel.get("Target", "")).lstrip("/")
+    return "word/document.xml"
+
+def _run_text(r) -> str:
+    parts = []
+    for c in r:
+        tag = c.tag
+        if tag == _W_T:
+            parts.append(c.text or "")
+        elif tag == _W_BR:
+            if c.get(_W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in _RUN_TEXT:
+            parts.append(_RUN_TEXT[tag])
+    return "".join(parts)
+
+def _paragraph_text(p) -> str:
+    # direct w:r and w:hyperlink/w:r children, like python-docx Paragraph.text
+    parts = []
+    for c in p:
+        if c.tag == _W_R:
+            parts.append(_run_text(c))
+        elif c.tag == _W_HYPERLINK:
+            parts.extend(_run_text(r) for r in c if r.tag == _W_R)
+    return "".join(parts)
+
+def _docx_text(src: Source) -> str:
+    """
+    "\n"-joined text of the body-level paragraphs (python-docx `doc.paragraphs`), streamed
+    from the main document part with iterparse; each top-level block is freed once read.
+    """
+    paras: List[str] = []
+    with _stream(src) as f, zipfile.ZipFile(f) as z, z.open(_docx_main_part(z)) as xml:
+        # blank text is kept: python-docx's remove_blank_text never drops the text of a leaf w:t,
+        # and in incremental parsing libxml2 applies that heuristic unevenly across read chunks
+        for _, el in etree.iterparse(xml, events=("end",), tag=(_W_P, _W_TBL, _W_SDT), resolve_entities=False):
+            parent = el.getparent()
+            if parent is None or parent.tag != _W_BODY:
+                continue
+            if el.tag == _W_P:
+                paras.append(_paragraph_text(el))
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+    return "\n".join(paras)
+
+def _docx_text_legacy(src: Source) -> str:
+    with _stream(src) as f:
+        doc = Document(f)
+    return "\n".join([p.text for p in doc.paragraphs])
 
-def from_docx(data: bytes) -> Tuple[str, str]:
-    f = io.BytesIO(data)
-    doc = Document(f)
-    txt = "\n".join([p.text for p in doc.paragraphs])
+def from_docx(src: Source) -> Tuple[str, str]:
+    txt = None
+    if _fast_converters():
+        try:
+            txt = _docx_text(src)
+        except Exception as e:
+            print("Fast DOCX conversion failed, using python-docx:", e)
+    if txt is None:
+        txt = _docx_text_legacy(src)
     return _norm_text(txt), "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
 
-def from_md(data: bytes) -> Tuple[str, str]:
-    txt = data.decode("utf-8", errors="ignore")
+def from_md(src: Source) -> Tuple[str, str]:
+    txt = _decode(src)
     # strip yaml frontmatter
     txt = re.sub(r"^---\n.*?\n---\n", "", txt, flags=re.DOTALL)
     return _norm_text(txt), "text/markdown"
 
-def from_html(data: bytes) -> Tuple[str, str]:
-    html = data.decode("utf-8", errors="ignore")
+class _HTMLText:
+    """
+    lxml parser target that collects the text BeautifulSoup(html, "lxml").get_text("\\n") returns
+    once script/style/noscript are decomposed, without building a tree:
+    - text is split into strings at every tag, comment, doctype and processing instruction
+    - a whitespace-only string becomes "\\n" (or " " without a newline) outside pre/textarea
+    - strings under script/style/noscript and bs4's special containers (template, rt, rp) are dropped
+    """
+
+    SKIP = frozenset(("script", "style", "noscript", "template", "rt", "rp"))
+    PRESERVE = frozenset(("pre", "textarea"))
+    SPACES = " \n\t\x0c\r"
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self.buf: List[str] = []
+        self.skip = 0
+        self.preserve = 0
+
+    def _flush(self):
+        if not self.buf:
+            return
+        s = "".join(self.buf)
+        self.buf = []
+        if self.skip:
+            return
+        if not self.preserve and not s.strip(self.SPACES):
+            s = "\n" if "\n" in s else " "
+        self.strings.append(s)
+
+    def start(self, tag, attrib, nsmap=None):
+        self._flush()
+        if tag in self.SKIP:
+            self.skip += 1
+        if tag in self.PRESERVE:
+            self.preserve += 1
+
+    def end(self, tag):
+        self._flush()
+        if tag in self.SKIP:
+            self.skip -= 1
+        if tag in self.PRESERVE:
+            self.preserve -= 1
+
+    def data(self, data):
+        self.buf.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def doctype(self, *args):
+        self._flush()
+
+    def close(self) -> str:
+        self._flush()
+        return "\n".join(self.strings)
+
+def _html_text(html: str) -> str:
+    if html[:1] == "\ufeff":  # bs4 drops a leading BOM before handing str markup to lxml
+        html = html[1:]
+    parser = etree.HTMLParser(target=_HTMLText(), recover=True)
+    parser.feed(html)
+    return parser.close()
+
+def _html_text_legacy(html: str) -> str:
     soup = BeautifulSoup(html, "lxml")
     for tag in soup(["script","style","noscript"]):
         tag.decompose()
-    txt = soup.get_text("\n")
+    return soup.get_text("\n")
+
+def from_html(src: Source) -> Tuple[str, str]:
+    html = _decode(src)
+    txt = None
+    if _fast_converters():
+        try:
+            txt = _html_text(html)
+        except Exception as e:
+            print("Fast HTML conversion failed, using BeautifulSoup:", e)
+    if txt is None:
+        txt = _html_text_legacy(html)
     return _norm_text(txt), "text/html"
 
-def sniff_and_convert(filename: str, data: bytes) -> Tuple[str, str]:
+def sniff_and_convert(filename: str, data: Source) -> Tuple[str, str]:
     name = (filename or "").lower()
     if name.endswith(".pdf"):
         return from_pdf(data)
@@ -56,4 +274,17 @@ def sniff_and_convert(filename: str, data: bytes) -> Tuple[str, str]:
     if name.endswith(".html") or name.endswith(".htm"):
         return from_html(data)
     # fallback: assume utf-8 text
-    return _norm_text(data.decode("utf-8", errors="ignore")), "text/plain"
+    return _norm_text(_decode(data)), "text/plain"
+
+def convert_offloaded(filename: str, src: Source) -> Tuple[str, str]:
+    """
+    sniff_and_convert with the CPU work on the conversion process pool, so a large
+    document does not hold the GIL of the API process: big PDFs fan their pages out
+    across the pool, everything else is converted as one pool task.
+    """
+    if (filename or "").lower().endswith(".pdf"):
+        n_pages = _pdf_page_count(src)
+        if _pdf_parallel(n_pages):
+            return from_pdf(src, n_pages)
+        return run_in_cpu(from_pdf, src, n_pages)
+    return run_in_cpu(sniff_and_convert, filename, src)
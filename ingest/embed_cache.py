@@ -0,0 +1,189 @@
+# ingest/embed_cache.py
+# Persistent, content-addressed embedding cache (SQLite, stdlib only).
+# Key = sha256(model | dimensions | normalized text); value = float64 vector bytes.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence
+
+from ingest.text import normalize_text
+
+Vector = List[float]
+
+def cache_key(text: str, model: str, dims: Optional[int]) -> str:
+    h = hashlib.sha256()
+    h.update(f"{model}|{dims or ''}|".encode("utf-8"))
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.hexdigest()
+
+class EmbeddingCache:
+    """
+    Thread-safe SQLite store of embedding vectors with least-recently-used eviction
+    once the stored vectors exceed max_bytes. Counts hits/misses/writes/evictions.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max(0, max_bytes)
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+        self._lock = threading.Lock()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute("pragma synchronous=normal")
+        self._db.execute(
+            "create table if not exists embeddings ("
+            " key text primary key, model text not null, dims integer,"
+            " vec blob not null, bytes integer not null, used_at real not null)"
+        )
+        self._db.execute("create index if not exists embeddings_used_at on embeddings(used_at)")
+        self._bytes = self._db.execute("select coalesce(sum(bytes), 0) from embeddings").fetchone()[0]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Vector]:
+        """Vectors for the keys that are cached; touches their used_at."""
+        found: Dict[str, Vector] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            try:
+                for start in range(0, len(uniq), 500):  # stay under SQLite's bound-variable limit
+                    part = uniq[start : start + 500]
+                    marks = ",".join("?" * len(part))
+                    for key, blob in self._db.execute(f"select key, vec from embeddings where key in ({marks})", part):
+                        found[key] = array("d", blob).tolist()
+                if found:
+                    now = time.time()
+                    self._db.executemany("update embeddings set used_at = ? where key = ?", [(now, k) for k in found])
+            except sqlite3.Error:
+                self.stats["errors"] += 1
+                return {}
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(uniq) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, Vector], model: str, dims: Optional[int]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vec in items.items():
+            blob = array("d", vec).tobytes()
+            rows.append((key, model, dims, blob, len(blob), now))
+        with self._lock:
+            try:
+                old = self._sizes([r[0] for r in rows])
+                self._db.executemany(
+                    "insert or replace into embeddings(key, model, dims, vec, bytes, used_at) values (?,?,?,?,?,?)", rows
+                )
+                self._bytes += sum(r[4] for r in rows) - sum(old.values())
+                self.stats["writes"] += len(rows)
+                self._evict()
+            except sqlite3.Error:
+                self.stats["errors"] += 1
+
+    def _sizes(self, keys: List[str]) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start : start + 500]
+            marks = ",".join("?" * len(part))
+            out.update(self._db.execute(f"select key, bytes from embeddings where key in ({marks})", part).fetchall())
+        return out
+
+    def _evict(self) -> None:
+        """Drop least-recently-used vectors until the store is back under 90% of max_bytes."""
+        if not self.max_bytes or self._bytes <= self.max_bytes:
+            return
+        excess = self._bytes - int(self.max_bytes * 0.9)
+        victims: List[str] = []
+        for key, size in self._db.execute("select key, bytes from embeddings order by used_at"):
+            if excess <= 0:
+                break
+            victims.append(key)
+            excess -= size
+            self._bytes -= size
+        self._db.executemany("delete from embeddings where key = ?", [(k,) for k in victims])
+        self.stats["evictions"] += len(victims)
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._db.execute("select count(*) from embeddings").fetchone()[0]
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": True,
+                "path": self.path,
+                "entries": entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                **self.stats,
+            }
+
+_cache: Optional[EmbeddingCache] = None
+_cache_failed = False
+_init_lock = threading.Lock()
+
+# the cache sits at the same place whichever directory the app or a script is started from
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide cache, or None when EMBED_CACHE=false or the store cannot be opened.
+    EMBED_CACHE_PATH (default .cache/embeddings.sqlite3; relative paths are taken from the repo
+    root, not the working directory), EMBED_CACHE_MAX_MB (default 512).
+    """
+    global _cache, _cache_failed
+    if _cache is not None or _cache_failed or os.getenv("EMBED_CACHE", "true").lower() != "true":
+        return _cache
+    with _init_lock:
+        if _cache is None and not _cache_failed:
+            try:
+                _cache = EmbeddingCache(
+                    os.path.join(_ROOT, os.getenv("EMBED_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))),
+                    int(float(os.getenv("EMBED_CACHE_MAX_MB", "512")) * 1024 * 1024),
+                )
+            except Exception as e:
+                print("Embedding cache disabled:", e)
+                _cache_failed = True
+    return _cache
+
+def cache_summary() -> Dict[str, object]:
+    c = get_cache()
+    return c.summary() if c else {"enabled": False}
+
+def cached_embed(
+    texts: Sequence[str],
+    model: str,
+    dims: Optional[int],
+    embed_fn: Callable[[List[str]], List[Optional[Vector]]],
+) -> List[Optional[Vector]]:
+    """
+    One vector per input (None where embedding failed). Cached vectors are served
+    locally; embed_fn is called once with the remaining unique texts.
+    """
+    cache = get_cache()
+    if cache is None:
+        return list(embed_fn(list(texts)))
+    keys = [cache_key(t, model, dims) for t in texts]
+    found = cache.get_many(keys)
+    miss: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in miss:
+            miss[k] = t
+    if miss:
+        vecs = embed_fn(list(miss.values()))
+        fresh = {k: v for k, v in zip(miss.keys(), vecs) if v}
+        cache.put_many(fresh, model, dims)
+        found.update(fresh)
+    return [found.get(k) for k in keys]
+
+def cached_embed_one(text: str, model: str, dims: Optional[int], embed_fn: Callable[[str], Vector]) -> Vector:
+    """Single-text form for query-time callers; embed_fn errors propagate as before."""
+    vec = cached_embed([text], model, dims, lambda ts: [embed_fn(ts[0])])[0]
+    if vec is None:
+        raise RuntimeError("embedding unavailable")
+    return vec
@@ -0,0 +1,111 @@
+# ingest/embeddings.py
+# Batched embedding calls: pack many texts into one embeddings.create request.
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from ingest.concurrency import bounded_map, stage_limit
+from ingest.embed_cache import cached_embed
+
+_client = None
+_encoder = None
+
+def _oai():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI()
+    return _client
+
+def embed_kwargs() -> Dict[str, Any]:
+    """Model/dimensions for embeddings.create, driven by EMBED_MODEL / EMBED_DIM."""
+    kwargs: Dict[str, Any] = {"model": os.getenv("EMBED_MODEL", "text-embedding-3-small")}
+    if os.getenv("EMBED_DIM"):
+        kwargs["dimensions"] = int(os.getenv("EMBED_DIM"))
+    return kwargs
+
+def count_tokens(text: str) -> int:
+    """
+    Token count with tiktoken (cl100k_base, used by the text-embedding-3 family).
+    Falls back to a chars/4 estimate if tiktoken or its encoding file is unavailable
+    (the failure is remembered so the load is not retried on every call).
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder is False:
+        return len(text or "") // 4 + 1
+    return len(_encoder.encode(text or "", disallowed_special=()))
+
+def plan_batches(texts: Sequence[str], max_inputs: int, max_tokens: int) -> List[List[int]]:
+    """
+    Group text indexes into request-sized batches.
+    - at most `max_inputs` texts per request (API input-count limit)
+    - at most `max_tokens` summed tokens per request (a single oversized text gets its own batch)
+    """
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    cur_tokens = 0
+    for i, t in enumerate(texts):
+        n = count_tokens(t)
+        if cur and (len(cur) >= max_inputs or cur_tokens + n > max_tokens):
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+def _request(texts: List[str]) -> List[List[float]]:
+    er = _oai().embeddings.create(input=texts, **embed_kwargs())
+    data = sorted(er.data, key=lambda d: d.index)
+    if len(data) != len(texts):
+        raise RuntimeError(f"embeddings returned {len(data)} vectors for {len(texts)} inputs")
+    return [d.embedding for d in data]
+
+def embed_one(text: str) -> List[float]:
+    """One text in one request, uncached; API errors propagate (query-time callers)."""
+    return _request([text])[0]
+
+def _embed_into(texts: Sequence[str], idxs: List[int], out: List[Optional[List[float]]]) -> None:
+    """Embed texts[idxs] in one request; on failure bisect so only the offending inputs stay None."""
+    try:
+        vecs = _request([texts[i] for i in idxs])
+    except Exception:
+        if len(idxs) == 1:
+            return
+        mid = len(idxs) // 2
+        _embed_into(texts, idxs[:mid], out)
+        _embed_into(texts, idxs[mid:], out)
+        return
+    for i, v in zip(idxs, vecs):
+        out[i] = v
+
+def embed_texts(texts: Sequence[str]) -> List[Optional[List[float]]]:
+    """
+    Embed many texts with as few round trips as possible.
+    Returns one vector per input, in input order; None where embedding failed.
+    Texts already in the embedding cache (ingest.embed_cache) are not sent.
+    Tunables: EMBED_BATCH_MAX_INPUTS (default 2048), EMBED_BATCH_MAX_TOKENS (default 250000),
+    EMBED_CONCURRENCY (requests in flight, default 4).
+    """
+    if not texts:
+        return []
+    kw = embed_kwargs()
+    return cached_embed(texts, kw["model"], kw.get("dimensions"), _embed_uncached)
+
+def _embed_uncached(texts: Sequence[str]) -> List[Optional[List[float]]]:
+    out: List[Optional[List[float]]] = [None] * len(texts)
+    if not texts:
+        return out
+    max_inputs = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "2048"))
+    max_tokens = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "250000"))
+    batches = plan_batches(texts, max_inputs, max_tokens)
+    # batches write disjoint slots of `out`, so they can run side by side
+    bounded_map(lambda b: _embed_into(texts, b, out), batches, stage_limit("EMBED_CONCURRENCY", 4), "embed")
+    return out
@@ -0,0 +1,179 @@
+# ingest/entities.py
+# Entity id cache + bulk entity / entity_mentions writes for the ingest pipeline.
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Key = Tuple[str, str]  # (name, type)
+
+class EntityCache:
+    """Thread-safe LRU of (name, type) -> entities.id."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[Key, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.warmed = False
+
+    def get(self, key: Key) -> Optional[str]:
+        with self._lock:
+            eid = self._data.get(key)
+            if eid is not None:
+                self._data.move_to_end(key)
+            return eid
+
+    def put(self, key: Key, eid: str) -> None:
+        with self._lock:
+            self._data[key] = eid
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict(self, key: Key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+_cache = EntityCache(int(os.getenv("ENTITY_CACHE_SIZE", "50000")))
+_warm_lock = threading.Lock()
+
+def _rows(res) -> List[Dict]:
+    return (res.data if hasattr(res, "data") else res.get("data")) or []
+
+def warm_cache(sb) -> None:
+    """Load up to ENTITY_CACHE_SIZE entities once per process (ENTITY_CACHE_WARM=false skips)."""
+    if _cache.warmed or os.getenv("ENTITY_CACHE_WARM", "true").lower() != "true":
+        return
+    with _warm_lock:
+        if _cache.warmed:
+            return
+        page = 1000
+        start = 0
+        try:
+            while start < _cache.maxsize:
+                res = sb.table("entities").select("id,name,type").order("id").range(start, start + page - 1).execute()
+                rows = _rows(res)
+                for r in rows:
+                    _cache.put((r["name"], r["type"]), r["id"])
+                if len(rows) < page:
+                    break
+                start += page
+        except Exception:
+            pass  # a cold cache only costs the bulk upsert below
+        _cache.warmed = True
+
+def _resolve_one(sb, name: str, typ: str) -> Optional[str]:
+    try:
+        sel = sb.table("entities").select("id").eq("name", name).eq("type", typ).limit(1).execute()
+        rows = _rows(sel)
+        if rows:
+            return rows[0]["id"]
+        sb.table("entities").insert({"name": name, "type": typ}).execute()
+        sel2 = sb.table("entities").select("id").eq("name", name).eq("type", typ).limit(1).execute()
+        rows2 = _rows(sel2)
+        return rows2[0]["id"] if rows2 else None
+    except Exception:
+        return None
+
+def resolve_entity_ids(sb, keys: Iterable[Key]) -> Dict[Key, str]:
+    """
+    Map (name, type) -> id, creating missing entities with one
+    upsert(on_conflict="name,type") per ENTITY_UPSERT_BATCH (default 500) keys.
+    Falls back to per-entity select/insert if the bulk upsert is rejected.
+    """
+    warm_cache(sb)
+    out: Dict[Key, str] = {}
+    missing: List[Key] = []
+    for key in dict.fromkeys(keys):
+        eid = _cache.get(key)
+        if eid:
+            out[key] = eid
+        else:
+            missing.append(key)
+
+    size = max(1, int(os.getenv("ENTITY_UPSERT_BATCH", "500")))
+    for start in range(0, len(missing), size):
+        batch = missing[start : start + size]
+        try:
+            res = (
+                sb.table("entities")
+                .upsert([{"name": n, "type": t} for n, t in batch], on_conflict="name,type")
+                .execute()
+            )
+            for r in _rows(res):
+                key = (r["name"], r["type"])
+                _cache.put(key, r["id"])
+                out[key] = r["id"]
+        except Exception:
+            for n, t in batch:
+                eid = _resolve_one(sb, n, t)
+                if eid:
+                    _cache.put((n, t), eid)
+                    out[(n, t)] = eid
+    return out
+
+def link_entities_bulk(sb, ents_by_memory: Dict[str, List[Dict[str, str]]]) -> Dict[str, List[str]]:
+    """
+    Resolve every entity for a batch of memories and write all entity_mentions
+    rows in one upsert (duplicates ignored). Returns memory_id -> [entity_id, ...].
+    If the bulk upsert is rejected (e.g. a cached id whose entity was deleted), the
+    mentions are retried one by one; see _link_one.
+    """
+    ids = resolve_entity_ids(
+        sb, ((e["name"], e["type"]) for ents in ents_by_memory.values() for e in (ents or []))
+    )
+    linked: Dict[str, List[str]] = {}
+    mentions: List[Tuple[str, Key]] = []
+    for mid, ents in ents_by_memory.items():
+        keys = list(dict.fromkeys((e["name"], e["type"]) for e in (ents or []) if (e["name"], e["type"]) in ids))
+        linked[mid] = list(dict.fromkeys(ids[k] for k in keys))
+        mentions.extend((mid, k) for k in keys)
+    if mentions:
+        try:
+            _upsert_mentions(sb, [_mention(ids[k], mid) for mid, k in mentions])
+        except Exception:
+            fixed: Dict[Key, Optional[str]] = {}  # re-resolved ids, shared by every memory mentioning the key
+            linked = {mid: [] for mid in ents_by_memory}
+            for mid, key in mentions:
+                eid = _link_one(sb, mid, key, ids[key], fixed)
+                if eid and eid not in linked[mid]:
+                    linked[mid].append(eid)
+    return linked
+
+def _mention(eid: str, mid: str) -> Dict:
+    return {"entity_id": eid, "memory_id": mid, "weight": 1.0}
+
+def _upsert_mentions(sb, rows: List[Dict]) -> None:
+    sb.table("entity_mentions").upsert(rows, on_conflict="entity_id,memory_id", ignore_duplicates=True).execute()
+
+def _link_one(sb, mid: str, key: Key, eid: str, fixed: Dict[Key, Optional[str]]) -> Optional[str]:
+    """
+    Write one mention. When it fails the first time for a key, the cached id is evicted and
+    resolved again (once per key, shared through fixed); a different, fresh id is retried.
+    Returns the id written, or None: mentions stay best-effort.
+    """
+    eid = fixed.get(key, eid)
+    if not eid:
+        return None
+    try:
+        _upsert_mentions(sb, [_mention(eid, mid)])
+        return eid
+    except Exception:
+        if key in fixed:
+            return None
+    _cache.evict(key)
+    fresh = fixed[key] = _resolve_one(sb, *key)
+    if not fresh:
+        return None
+    _cache.put(key, fresh)
+    if fresh == eid:
+        return None  # the entity is fine; this row failed for its own reason
+    try:
+        _upsert_mentions(sb, [_mention(fresh, mid)])
+        return fresh
+    except Exception:
+        return None
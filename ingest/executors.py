@@ -0,0 +1,86 @@
+# ingest/executors.py
+# Shared, bounded executors that keep blocking ingest work off the event loop:
+# - a process pool for CPU-bound conversion (pypdf / BeautifulSoup / python-docx hold the GIL)
+# - a thread pool for blocking vendor I/O (Supabase, OpenAI, Pinecone clients)
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_cpu: Optional[ProcessPoolExecutor] = None
+_io: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+def in_worker_process() -> bool:
+    """True inside a pool worker: no nested pools there, callers run inline."""
+    return multiprocessing.parent_process() is not None
+
+def cpu_pool() -> ProcessPoolExecutor:
+    """
+    Conversion processes: CONVERT_WORKERS (default min(4, cpus)). Spawned rather than
+    forked, since callers are threaded (ingest jobs, the vendor I/O pool).
+    """
+    global _cpu
+    with _lock:
+        if _cpu is None:
+            _cpu = ProcessPoolExecutor(
+                max_workers=_env_int("CONVERT_WORKERS", min(4, os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _cpu
+
+def reset_cpu_pool() -> None:
+    """Drop a broken process pool (a worker died); the next cpu_pool() starts a fresh one."""
+    global _cpu
+    with _lock:
+        pool, _cpu = _cpu, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def io_pool() -> ThreadPoolExecutor:
+    """Threads for blocking vendor I/O: UPLOAD_IO_WORKERS (default 8)."""
+    global _io
+    with _lock:
+        if _io is None:
+            _io = ThreadPoolExecutor(max_workers=_env_int("UPLOAD_IO_WORKERS", 8), thread_name_prefix="vendor-io")
+        return _io
+
+def run_in_cpu(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Blocking call of fn(*args) in the conversion pool (fn and args must pickle).
+    Runs inline inside a worker process, with CONVERT_IN_PROCESS=false, or if the pool breaks.
+    """
+    if in_worker_process() or os.getenv("CONVERT_IN_PROCESS", "true").lower() != "true":
+        return fn(*args)
+    try:
+        fut = cpu_pool().submit(fn, *args)
+    except Exception as e:
+        print("Conversion pool unavailable, running inline:", e)
+        reset_cpu_pool()
+        return fn(*args)
+    try:
+        return fut.result()
+    except Exception as e:
+        from concurrent.futures.process import BrokenProcessPool
+        if not isinstance(e, BrokenProcessPool):
+            raise
+        print("Conversion pool broke, running inline:", e)
+        reset_cpu_pool()
+        return fn(*args)
+
+async def run_blocking(fn: Callable[..., T], *args: Any, executor: Optional[Executor] = None, **kwargs: Any) -> T:
+    """await fn(*args, **kwargs) on the vendor I/O pool (or the given executor)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or io_pool(), functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,89 @@
+# ingest/file_dedupe.py
+# Whole-file dedupe for /upload: files.content_hash is the sha256 of the raw uploaded
+# bytes (computed while spooling). A finished ingest stores its response summary in
+# files.ingest_result, so re-sending the same bytes (client retries) is answered from
+# that row, and files.text_extracted doubles as a conversion cache for re-ingests.
+# Only clean ingests are stored, keyed on the upload parameters as well as the bytes.
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ingest.text import NormalizedText
+
+_ROW_COLS = "id, filename, mime_type, ingest_result"
+
+# skip reasons of upsert_memories_from_chunks that leave a chunk unwritten or without its vector
+FAILED_REASONS = ("insert_failed", "insert_select_missed", "update_failed", "embed_failed", "upsert_failed")
+
+def _rows(res):
+    return (res.data if hasattr(res, "data") else res.get("data")) or []
+
+def find_by_content_hash(sb, content_hash: str) -> Optional[Dict[str, Any]]:
+    """The files row holding these bytes (id, filename, mime_type, ingest_result), or None."""
+    try:
+        rows = _rows(sb.table("files").select(_ROW_COLS).eq("content_hash", content_hash).limit(1).execute())
+    except Exception as e:
+        # older schema without files.content_hash: no whole-file dedupe
+        print("content_hash lookup skipped:", e)
+        return None
+    return rows[0] if rows else None
+
+def ingest_params(mem_type: str, tags: Iterable[str], extract_signals: bool) -> Dict[str, Any]:
+    """The upload parameters a stored result is only valid for."""
+    return {"type": mem_type, "tags": sorted(set(tags)), "extract_signals": bool(extract_signals)}
+
+def ingest_failures(*results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Skipped entries of upsert_memories_from_chunks results that need a retry (see FAILED_REASONS)."""
+    return [s for r in results for s in (r or {}).get("skipped") or [] if s.get("reason") in FAILED_REASONS]
+
+def duplicate_response(row: Dict[str, Any], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The stored /upload response for a finished ingest of the same bytes with the same
+    parameters (see ingest_params); None while unfinished, after failures, or when they differ.
+    """
+    stored = row.get("ingest_result")
+    if not isinstance(stored, dict) or stored.get("params") != params:
+        return None
+    if (stored.get("ingest") or {}).get("failed"):
+        return None
+    out = {k: v for k, v in stored.items() if k != "conversion"}
+    out.update({"file_id": row.get("id"), "ingest_job_id": None, "duplicate": True})
+    return out
+
+def cached_conversion(sb, row: Dict[str, Any]) -> Optional[Tuple[NormalizedText, str]]:
+    """
+    (text, mime) from files.text_extracted when it holds the whole converted text
+    (not cut by FILES_TEXT_MAX_CHARS / FILES_STORE_TEXT); PDF page offsets come back too.
+    """
+    conv = (row.get("ingest_result") or {}).get("conversion") or {}
+    if not conv.get("chars"):
+        return None
+    try:
+        rows = _rows(sb.table("files").select("text_extracted").eq("id", row["id"]).limit(1).execute())
+    except Exception:
+        return None
+    text = (rows[0].get("text_extracted") if rows else None) or ""
+    if len(text) != conv["chars"]:
+        return None
+    out = NormalizedText(text)
+    out.page_starts = conv.get("page_starts")
+    return out, row.get("mime_type") or "text/plain"
+
+def result_record(response: Dict[str, Any], text: NormalizedText, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What goes into files.ingest_result: the response without per-memory detail, plus the
+    parameters it was ingested with and conversion facts (text only needs len() and
+    page_starts, so a SpooledText serves as well).
+    """
+    rec = {k: v for k, v in response.items() if k not in ("ingest_job_id", "duplicate")}
+    rec["ingest"] = {k: v for k, v in (response.get("ingest") or {}).items() if k != "raw"}
+    rec["params"] = params
+    rec["conversion"] = {"chars": len(text), "page_starts": getattr(text, "page_starts", None)}
+    return rec
+
+def record_result(sb, file_id: Optional[str], record: Dict[str, Any]) -> None:
+    if not file_id:
+        return
+    try:
+        sb.table("files").update({"ingest_result": record}).eq("id", file_id).execute()
+    except Exception as e:
+        print("files.ingest_result not saved:", e)
@@ -0,0 +1,158 @@
+# ingest/jobs.py
+# In-process background job queue for long-running ingest work (e.g. /upload);
+# memory/chat_jobs.py runs a second, bounded registry for post-response chat work.
+# Jobs live in memory: ids are only resolvable on the worker process that accepted them.
+
+import datetime
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+class IngestJob:
+    """One queued unit of work; `progress` is a stage -> count map fed by the pipeline's on_progress."""
+
+    def __init__(self, kind: str, meta: Optional[Dict[str, Any]] = None):
+        self.id = str(uuid4())
+        self.kind = kind
+        self.meta: Dict[str, Any] = dict(meta or {})
+        self.status = "queued"  # queued | running | done | failed
+        self.stage: Optional[str] = None
+        self.progress: Dict[str, int] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._done_ts: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+
+    def add(self, stage: str, n: int = 1) -> None:
+        """Pipeline progress callback: on_progress=job.add."""
+        with self._lock:
+            self.progress[stage] = self.progress.get(stage, 0) + n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "meta": dict(self.meta),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+                "result": self.result,
+            }
+
+class JobRegistry:
+    """
+    Worker pool of INGEST_MAX_CONCURRENT_JOBS (default 2) threads; extra jobs wait in the pool queue.
+    Finished jobs are kept for INGEST_JOB_TTL_S (default 3600) and at most INGEST_JOB_HISTORY (default 500).
+    """
+
+    def __init__(self, max_workers: int, ttl_s: float, history: int, max_pending: int = 0, name: str = "ingest-job"):
+        self.max_workers = max(1, max_workers)
+        self.ttl_s = ttl_s
+        self.history = max(1, history)
+        self.max_pending = max(0, max_pending)  # try_submit() bound on queued + running jobs; 0 = none
+        self._active = 0
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+
+    def submit(self, kind: str, fn: Callable[[IngestJob], Optional[Dict[str, Any]]], meta: Optional[Dict[str, Any]] = None) -> IngestJob:
+        """Queue fn(job); its return value becomes job.result, an exception marks the job failed."""
+        return self._enqueue(kind, fn, meta, bounded=False)
+
+    def try_submit(self, kind: str, fn: Callable[[IngestJob], Optional[Dict[str, Any]]], meta: Optional[Dict[str, Any]] = None) -> Optional[IngestJob]:
+        """submit(), or None when max_pending jobs are already queued or running (caller runs the work itself)."""
+        return self._enqueue(kind, fn, meta, bounded=True)
+
+    def _enqueue(self, kind: str, fn: Callable[[IngestJob], Optional[Dict[str, Any]]], meta: Optional[Dict[str, Any]], bounded: bool) -> Optional[IngestJob]:
+        job = IngestJob(kind, meta)
+        with self._lock:
+            if bounded and self.max_pending and self._active >= self.max_pending:
+                return None
+            self._prune()
+            self._jobs[job.id] = job
+            self._active += 1
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.snapshot() for j in reversed(jobs[-limit:])]
+
+    def find_active(self, kind: str, **meta: Any) -> Optional[IngestJob]:
+        """A queued/running job of this kind whose meta contains all the given items."""
+        with self._lock:
+            for j in reversed(list(self._jobs.values())):
+                if j.kind == kind and j.status in ("queued", "running") and all(j.meta.get(k) == v for k, v in meta.items()):
+                    return j
+        return None
+
+    def counts(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        with self._lock:
+            for j in self._jobs.values():
+                out[j.status] = out.get(j.status, 0) + 1
+        return out
+
+    def _run(self, job: IngestJob, fn: Callable[[IngestJob], Optional[Dict[str, Any]]]) -> None:
+        job.status, job.started_at = "running", _now()
+        try:
+            job.result = fn(job)
+            job.status, job.stage = "done", None
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            job.status = "failed"
+            print(f"[ingest-job {job.id}] failed:", job.error)
+            traceback.print_exc()
+        finally:
+            job.finished_at, job._done_ts = _now(), time.time()
+            with self._lock:
+                self._active -= 1
+
+    def _prune(self) -> None:
+        now = time.time()
+        done = [j for j in self._jobs.values() if j._done_ts is not None]
+        expired = {j.id for j in done if now - j._done_ts > self.ttl_s}
+        overflow = len(self._jobs) - len(expired) - self.history
+        if overflow > 0:
+            rest = sorted((j for j in done if j.id not in expired), key=lambda j: j._done_ts)
+            expired.update(j.id for j in rest[:overflow])
+        for jid in expired:
+            self._jobs.pop(jid, None)
+
+_registry: Optional[JobRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> JobRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = JobRegistry(
+                    int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2")),
+                    float(os.getenv("INGEST_JOB_TTL_S", "3600")),
+                    int(os.getenv("INGEST_JOB_HISTORY", "500")),
+                )
+    return _registry
@@ -0,0 +1,112 @@
+# ingest/journal.py
+# Append-only, per-document JSONL journal of ingest progress, so an interrupted
+# upsert_memories_from_chunks can be resubmitted and pick up where it stopped.
+#
+# One line per event, keyed by the chunk's dedupe_hash:
+#   {"h": ..., "stage": "enriched", "meta": {title, summary, tags, entities}}
+#   {"h": ..., "stage": "row", "memory_id": ..., "out": "upserted" | "updated"}
+#   {"h": ..., "stage": "embedded"}          (vector itself lives in ingest/embed_cache)
+#   {"h": ..., "stage": "linked", "entity_ids": [...]}
+#   {"h": ..., "stage": "vector"}
+# plus a header {"stage": "open", "file_id": ...}. The file is removed once the ingest completes.
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+def journal_key(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p if p is not None else "").encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()[:32]
+
+class IngestJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.file_id: Optional[str] = None
+        self.chunks: Dict[str, Dict[str, Any]] = {}  # dedupe_hash -> merged stage state
+        self._buf: List[str] = []
+        self._lock = threading.Lock()
+        self._load()
+        self.resumed = bool(self.chunks)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash mid-write
+                    self._apply(rec)
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, rec: Dict[str, Any]) -> None:
+        stage = rec.get("stage")
+        if stage == "open":
+            self.file_id = rec.get("file_id") or self.file_id
+            return
+        h = rec.get("h")
+        if not h or not stage:
+            return
+        st = self.chunks.setdefault(h, {})
+        st[stage] = True
+        for k, v in rec.items():
+            if k not in ("h", "stage"):
+                st[k] = v
+
+    def get(self, h: str) -> Dict[str, Any]:
+        return self.chunks.get(h) or {}
+
+    def record(self, h: Optional[str], stage: str, **data: Any) -> None:
+        rec = {"h": h, "stage": stage, **data} if h else {"stage": stage, **data}
+        with self._lock:
+            self._apply(rec)
+            self._buf.append(json.dumps(rec, ensure_ascii=False, default=str))
+
+    def set_file(self, file_id: Optional[str]) -> None:
+        if file_id and file_id != self.file_id:
+            self.record(None, "open", file_id=file_id)
+            self.flush()
+
+    def flush(self) -> None:
+        """Append buffered events and fsync; called at each stage boundary of an ingest window."""
+        with self._lock:
+            if not self._buf:
+                return
+            lines, self._buf = self._buf, []
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print("ingest journal write failed:", e)
+
+    def complete(self) -> None:
+        """The ingest finished: nothing left to resume."""
+        with self._lock:
+            self._buf = []
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+def open_journal(key: str) -> Optional[IngestJournal]:
+    """
+    Journal for one logical ingest (same key on resubmission), or None when
+    INGEST_JOURNAL=false. Files live under INGEST_JOURNAL_DIR (default .cache/ingest_journal).
+    """
+    if os.getenv("INGEST_JOURNAL", "true").lower() != "true":
+        return None
+    d = os.getenv("INGEST_JOURNAL_DIR", os.path.join(".cache", "ingest_journal"))
+    try:
+        os.makedirs(d, exist_ok=True)
+    except OSError as e:
+        print("ingest journal disabled:", e)
+        return None
+    return IngestJournal(os.path.join(d, f"{key}.jsonl"))
@@ -0,0 +1,159 @@
+# ingest/lsh.py
+# Banded LSH index over 64-bit SimHash values for near-duplicate lookup.
+#
+# The 64 bits are split into SIMHASH_LSH_BANDS bands (default 4 x 16 bits). Two hashes
+# within Hamming distance d differ in at most d // bands bits of some band (pigeonhole),
+# so a lookup probes, in every band, each bucket key within that many bit flips of the
+# query's key (multi-probe). Every hash within max_distance is therefore a candidate,
+# not just the ones sharing a band exactly. Candidates are then verified with an exact
+# Hamming check, so no false positives are returned.
+
+import itertools
+import os
+import time
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ingest.simhash import hamming
+
+@lru_cache(maxsize=32)
+def _flip_masks(width: int, radius: int) -> Tuple[int, ...]:
+    """Every mask of at most radius set bits within width bits (0 included)."""
+    masks = [0]
+    for k in range(1, min(radius, width) + 1):
+        for bits in itertools.combinations(range(width), k):
+            masks.append(sum(1 << b for b in bits))
+    return tuple(masks)
+
+class SimHashIndex:
+    def __init__(self, bands: int = 4):
+        if bands <= 0 or 64 % bands:
+            raise ValueError("bands must divide 64")
+        self.bands = bands
+        self.width = 64 // bands
+        self.mask = (1 << self.width) - 1
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in range(bands)]
+        self._hashes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _keys(self, h: int) -> Iterable[Tuple[int, int]]:
+        for b in range(self.bands):
+            yield b, (h >> (b * self.width)) & self.mask
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, mem_id: str, h: int) -> None:
+        """Insert or re-point a memory's SimHash (unsigned 64-bit)."""
+        with self._lock:
+            self._discard(mem_id)
+            self._hashes[mem_id] = h
+            for b, key in self._keys(h):
+                self._buckets[b].setdefault(key, set()).add(mem_id)
+
+    def remove(self, mem_id: str) -> None:
+        with self._lock:
+            self._discard(mem_id)
+
+    def _discard(self, mem_id: str) -> None:
+        old = self._hashes.pop(mem_id, None)
+        if old is None:
+            return
+        for b, key in self._keys(old):
+            bucket = self._buckets[b].get(key)
+            if bucket is not None:
+                bucket.discard(mem_id)
+                if not bucket:
+                    del self._buckets[b][key]
+
+    def nearest(self, h: int, max_distance: int, exclude: Optional[Set[str]] = None) -> Optional[Tuple[str, int]]:
+        """Return (memory_id, distance) of the closest indexed hash within max_distance, else None."""
+        best: Optional[Tuple[str, int]] = None
+        masks = _flip_masks(self.width, max(0, max_distance) // self.bands)
+        with self._lock:
+            seen: Set[str] = set()
+            for b, key in self._keys(h):
+                buckets = self._buckets[b]
+                for m in masks:
+                    for mid in buckets.get(key ^ m, ()):
+                        if mid in seen or (exclude and mid in exclude):
+                            continue
+                        seen.add(mid)
+                        hd = hamming(self._hashes[mid], h)
+                        if hd <= max_distance and (best is None or hd < best[1]):
+                            best = (mid, hd)
+        return best
+
+# -----------------------------
+# Process-wide indexes, one per memory type
+# -----------------------------
+_indexes: Dict[str, Tuple[float, SimHashIndex]] = {}
+_load_lock = threading.Lock()                  # guards _indexes / _loading only, never held while loading
+_loading: Dict[str, threading.Lock] = {}       # one loader per memory type
+
+def _load(sb, mem_type: str) -> SimHashIndex:
+    """Page through memories.(id, simhash64) for one type; text columns are never fetched."""
+    from ingest.pipeline import signed_to_u64
+
+    idx = SimHashIndex(int(os.getenv("SIMHASH_LSH_BANDS", "4")))
+    page = max(1, int(os.getenv("SIMHASH_INDEX_PAGE", "1000")))
+    start = 0
+    while True:
+        res = (
+            sb.table("memories")
+            .select("id,simhash64")
+            .eq("type", mem_type)
+            .order("id")
+            .range(start, start + page - 1)
+            .execute()
+        )
+        rows = res.data if hasattr(res, "data") else res.get("data") or []
+        for r in rows or []:
+            if r.get("simhash64") is not None:
+                idx.add(r["id"], signed_to_u64(int(r["simhash64"])))
+        if not rows or len(rows) < page:
+            break
+        start += page
+    return idx
+
+def get_simhash_index(sb, mem_type: str) -> Optional[SimHashIndex]:
+    """
+    Shared index for a memory type, loaded on first use and reloaded after
+    SIMHASH_INDEX_TTL_S seconds (default 3600) to pick up other workers' writes.
+    Returns None if the corpus cannot be loaded (near-dup detection is best-effort).
+    The index is built outside the shared lock and swapped in; while a stale index is being
+    reloaded, other callers keep using it instead of waiting.
+    """
+    ttl = float(os.getenv("SIMHASH_INDEX_TTL_S", "3600"))
+    def fresh(entry) -> bool:
+        return bool(entry) and (ttl <= 0 or time.time() - entry[0] < ttl)
+
+    with _load_lock:
+        cached = _indexes.get(mem_type)
+        if fresh(cached):
+            return cached[1]
+        loader = _loading.setdefault(mem_type, threading.Lock())
+    if not loader.acquire(blocking=cached is None):
+        return cached[1]
+    try:
+        with _load_lock:
+            current = _indexes.get(mem_type)
+        if fresh(current):
+            return current[1]  # loaded by another caller while this one waited
+        try:
+            idx = _load(sb, mem_type)
+        except Exception:
+            return current[1] if current else None
+        with _load_lock:
+            _indexes[mem_type] = (time.time(), idx)
+        return idx
+    finally:
+        loader.release()
+
+def forget(mem_ids: Iterable[str]) -> None:
+    """Drop deleted memories from every loaded index."""
+    ids = list(mem_ids)
+    for _, idx in list(_indexes.values()):
+        for mid in ids:
+            idx.remove(mid)
@@ -4,9 +4,18 @@ import os
 import re
 import hashlib
 import datetime
-from typing import List, Dict, Any, Optional
-
-from ingest.simhash import simhash64, hamming  # expects your existing file
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from ingest.simhash import simhash64_many
+from ingest.lsh import get_simhash_index
+from ingest.embeddings import count_tokens, embed_texts
+from ingest.vectors import VectorUpserter
+from ingest.concurrency import bounded_map, stage_limit
+from ingest.entities import link_entities_bulk, resolve_entity_ids
+from ingest.journal import IngestJournal
+from ingest.text import NormalizedText, as_normalized, normalize_text  # normalize_text re-exported for callers
 
 # -----------------------------
 # small utilities
@@ -33,26 +42,129 @@ def _sanitize_metadata(md: dict) -> dict:
             out[k] = str(v)
     return out
 
-def normalize_text(s: str) -> str:
-    s = s or ""
-    s = re.sub(r"\r\n", "\n", s)
-    s = re.sub(r"[ \t]+", " ", s)
-    s = re.sub(r"\n{3,}", "\n\n", s)
-    return s.strip()
-
 def chunk_text(s: str, chunk_size: int, overlap: int) -> List[str]:
+    """Legacy fixed-stride character chunker (no chunk cap; prefer iter_chunks)."""
     s = (s or "").strip()
     if not s:
         return []
     chunks: List[str] = []
     i, n = 0, len(s)
     step = max(1, chunk_size - overlap)
-    max_chunks = int(os.getenv("MAX_CHUNKS_PER_FILE", "500"))
-    while i < n and len(chunks) < max_chunks:
+    while i < n:
         chunks.append(s[i : i + chunk_size])
         i += step
     return chunks
 
+# -----------------------------
+# Streaming, token-aware chunker
+# -----------------------------
+_PARA_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_SENT_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def _spans(s: str, sep: "re.Pattern", start: int, end: int) -> Iterator[Tuple[int, int]]:
+    """Split s[start:end] at sep; each piece keeps its trailing separator."""
+    prev = start
+    for m in sep.finditer(s, start, end):
+        if m.end() > prev:
+            yield prev, m.end()
+            prev = m.end()
+    if prev < end:
+        yield prev, end
+
+def _hard_split(s: str, start: int, end: int, max_tokens: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Cut an over-long sentence into the longest prefixes that fit max_tokens (binary search on chars).
+    The search window is max_tokens * 8 chars (tokens average ~4), so each cut tokenizes a bounded
+    slice instead of the rest of the sentence.
+    """
+    while start < end:
+        lo, hi = start + 1, min(end, start + max_tokens * 8)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if count_tokens(s[start:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        yield start, lo, count_tokens(s[start:lo])
+        start = lo
+
+def _units(s: str, max_tokens: int) -> Iterator[Tuple[int, int, int]]:
+    """(start, end, tokens) units: whole paragraphs when they fit, else sentences, else hard cuts."""
+    for ps, pe in _spans(s, _PARA_BREAK, 0, len(s)):
+        n = count_tokens(s[ps:pe])
+        if n <= max_tokens:
+            yield ps, pe, n
+            continue
+        for ss, se in _spans(s, _SENT_BREAK, ps, pe):
+            n = count_tokens(s[ss:se])
+            if n <= max_tokens:
+                yield ss, se, n
+            else:
+                yield from _hard_split(s, ss, se, max_tokens)
+
+def iter_chunks(s: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> Iterator[str]:
+    """
+    Lazily yield chunks of at most max_tokens tokens (tiktoken, same encoding as the
+    embedder), packing whole paragraphs first and falling back to sentence boundaries.
+    Consecutive chunks share up to overlap_tokens of trailing units. No chunk cap.
+    Defaults: CHUNK_TOKENS (500), CHUNK_OVERLAP_TOKENS (50); capped at EMBED_MAX_TOKENS (8191).
+    Chunks of a NormalizedText are yielded as NormalizedText (the pipeline skips re-normalizing them);
+    when it knows its page_starts (PDFs), each chunk also carries .page / .page_end (1-based).
+    """
+    s = s or ""
+    normalized = isinstance(s, NormalizedText)
+    paged = normalized and bool(s.page_starts)
+
+    def emit(a: int, b: int) -> str:
+        piece = s[a:b]
+        chunk = piece.strip()
+        if not normalized or not chunk:
+            return chunk
+        chunk = as_normalized(chunk)
+        if paged:
+            start = a + len(piece) - len(piece.lstrip())
+            chunk.page = s.page_at(start)
+            chunk.page_end = s.page_at(start + len(chunk) - 1)
+        return chunk
+    max_tokens = max_tokens or int(os.getenv("CHUNK_TOKENS", "500"))
+    max_tokens = max(1, min(max_tokens, int(os.getenv("EMBED_MAX_TOKENS", "8191"))))
+    overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50")) if overlap_tokens is None else overlap_tokens
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    window: List[Tuple[int, int, int]] = []
+    used = 0
+    fresh = False  # window holds units not yet emitted
+    for unit in _units(s, max_tokens):
+        if window and used + unit[2] > max_tokens:
+            if fresh:
+                chunk = emit(window[0][0], window[-1][1])
+                if chunk:
+                    yield chunk
+            # carry trailing units (<= overlap_tokens) into the next chunk
+            keep: List[Tuple[int, int, int]] = []
+            kept = 0
+            for u in reversed(window):
+                if kept + u[2] > overlap_tokens or kept + u[2] + unit[2] > max_tokens:
+                    break
+                keep.insert(0, u)
+                kept += u[2]
+            window, used = keep, kept
+        window.append(unit)
+        used += unit[2]
+        fresh = True
+    if window and fresh:
+        chunk = emit(window[0][0], window[-1][1])
+        if chunk:
+            yield chunk
+
+def iter_fulltext_chunks(s: str) -> Iterator[str]:
+    """
+    The "fulltext" semantic copy of a document, cut only where it must be to stay embeddable:
+    iter_chunks at FULLTEXT_CHUNK_TOKENS (default 8000, under the 8191-token embedding limit), no overlap.
+    Documents that fit stay a single chunk.
+    """
+    return iter_chunks(s, int(os.getenv("FULLTEXT_CHUNK_TOKENS", "8000")), 0)
+
 def sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
@@ -132,40 +244,234 @@ def llm_entities(text: str) -> List[Dict[str, str]]:
     except Exception:
         return []
 
+# -----------------------------
+# Combined enrichment (metadata + entities in one call)
+# -----------------------------
+_ENTITY_TYPES = ["person", "org", "project", "artifact", "concept"]
+
+_ENRICH_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["items"],
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["key", "title", "summary", "tags", "entities"],
+                "properties": {
+                    "key": {"type": "string"},
+                    "title": {"type": "string"},
+                    "summary": {"type": "string"},
+                    "tags": {"type": "array", "items": {"type": "string"}},
+                    "entities": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "additionalProperties": False,
+                            "required": ["name", "type"],
+                            "properties": {
+                                "name": {"type": "string"},
+                                "type": {"type": "string", "enum": _ENTITY_TYPES},
+                            },
+                        },
+                    },
+                },
+            },
+        }
+    },
+}
+
+_EMPTY_ENRICHMENT = {"title": None, "summary": None, "tags": [], "entities": []}
+
+def _clean_enrichment(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply the same clamps as llm_chunk_meta / llm_entities."""
+    ents: List[Dict[str, str]] = []
+    for d in data.get("entities") or []:
+        name = (d.get("name") or "").strip()
+        typ = (d.get("type") or "").strip().lower()
+        if name and typ in _ENTITY_TYPES:
+            ents.append({"name": name[:120], "type": typ})
+    return {
+        "title": (str(data.get("title") or "")[:120] or None),
+        "summary": (str(data.get("summary") or "")[:1000] or None),
+        "tags": [t.strip()[:32] for t in (data.get("tags") or []) if isinstance(t, str)][:6],
+        "entities": ents[:20],
+    }
+
+def _enrich_request(texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """One chat call for a pack of chunks; None for chunks the model left out."""
+    import json
+    from openai import OpenAI
+    oai = OpenAI()
+    sys = (
+        "You are an expert technical summarizer and entity extractor. For every <chunk>, return an item "
+        "with its key, a concise title (<=120 chars), a 1–3 sentence summary (<=1000 chars), 2–5 short tags, "
+        "and the named entities it mentions (type one of person, org, project, artifact, concept; max 20)."
+    )
+    body = "\n\n".join(f'<chunk key="c{i}">\n{t[:4000]}\n</chunk>' for i, t in enumerate(texts))
+    r = oai.chat.completions.create(
+        model=os.getenv("ENRICH_MODEL", os.getenv("EXTRACTOR_MODEL", os.getenv("CHAT_MODEL", "gpt-4.1-mini"))),
+        messages=[{"role": "system", "content": sys}, {"role": "user", "content": body}],
+        temperature=0,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "chunk_enrichment", "strict": True, "schema": _ENRICH_SCHEMA},
+        },
+    )
+    data = json.loads(r.choices[0].message.content or "{}")
+    by_key = {it.get("key"): it for it in (data.get("items") or []) if isinstance(it, dict)}
+    return [_clean_enrichment(by_key[f"c{i}"]) if f"c{i}" in by_key else None for i in range(len(texts))]
+
+def _enrich_pack(texts: List[str]) -> List[Dict[str, Any]]:
+    try:
+        out = _enrich_request(texts)
+    except Exception:
+        out = [None] * len(texts)
+    if len(texts) > 1:
+        # a failed or partial pack is retried chunk by chunk
+        out = [o if o is not None else _enrich_pack([t])[0] for o, t in zip(out, texts)]
+    return [o if o is not None else dict(_EMPTY_ENRICHMENT) for o in out]
+
+def llm_enrich(texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Return one {"title", "summary", "tags", "entities"} per text, in input order.
+    Small chunks are packed into one request (ENRICH_PACK_MAX_CHARS, default 6000;
+    ENRICH_PACK_MAX_ITEMS, default 8) and packs fan out under INGEST_META_CONCURRENCY.
+    Fails closed to empty fields per chunk, like llm_chunk_meta / llm_entities.
+    """
+    max_chars = int(os.getenv("ENRICH_PACK_MAX_CHARS", "6000"))
+    max_items = max(1, int(os.getenv("ENRICH_PACK_MAX_ITEMS", "8")))
+    packs: List[List[int]] = []
+    cur: List[int] = []
+    cur_chars = 0
+    for i, t in enumerate(texts):
+        n = min(len(t), 4000)
+        if cur and (len(cur) >= max_items or cur_chars + n > max_chars):
+            packs.append(cur)
+            cur, cur_chars = [], 0
+        cur.append(i)
+        cur_chars += n
+    if cur:
+        packs.append(cur)
+
+    results = bounded_map(
+        lambda pack: _enrich_pack([texts[i] for i in pack]),
+        packs, stage_limit("INGEST_META_CONCURRENCY", 8), "ingest-enrich",
+    )
+    out: List[Dict[str, Any]] = [dict(_EMPTY_ENRICHMENT) for _ in texts]
+    for pack, res in zip(packs, results):
+        for i, r in zip(pack, res):
+            out[i] = r
+    return out
+
 # -----------------------------
 # Entities in DB
 # -----------------------------
 def upsert_entity(sb, name: str, typ: str) -> Optional[str]:
+    """Id for (name, type), served from the in-process cache when possible."""
     try:
-        sel = sb.table("entities").select("id").eq("name", name).eq("type", typ).limit(1).execute()
-        rows = sel.data if hasattr(sel, "data") else sel.get("data")
-        if rows:
-            return rows[0]["id"]
-        sb.table("entities").insert({"name": name, "type": typ}).execute()
-        sel2 = sb.table("entities").select("id").eq("name", name).eq("type", typ).limit(1).execute()
-        rows2 = sel2.data if hasattr(sel2, "data") else sel2.get("data")
-        return rows2[0]["id"] if rows2 else None
+        return resolve_entity_ids(sb, [(name, typ)]).get((name, typ))
     except Exception:
         return None
 
 def link_entities(sb, memory_id: str, ents: List[Dict[str, str]]) -> List[str]:
-    ids: List[str] = []
-    for e in ents:
-        eid = upsert_entity(sb, e["name"], e["type"])
-        if not eid:
-            continue
-        ids.append(eid)
+    """Link one memory's entities with a single bulk mentions insert."""
+    return link_entities_bulk(sb, {memory_id: ents}).get(memory_id, [])
+
+# -----------------------------
+# Exact-duplicate lookup
+# -----------------------------
+def _existing_by_hash(sb, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve which dedupe_hashes already exist with .in_() lookups of
+    DEDUPE_LOOKUP_PAGE hashes each (default 100, keeps request URLs short).
+    A failed page is treated as "no matches"; the conflict-safe insert still
+    catches those rows as duplicates.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    size = max(1, int(os.getenv("DEDUPE_LOOKUP_PAGE", "100")))
+    for start in range(0, len(hashes), size):
+        page = hashes[start : start + size]
+        try:
+            res = (
+                sb.table("memories")
+                .select("id,embedding_id,dedupe_hash,title,tags,file_id")
+                .in_("dedupe_hash", page)
+                .execute()
+            )
+            rows = res.data if hasattr(res, "data") else res.get("data") or []
+        except Exception:
+            rows = []
+        for r in rows or []:
+            found[r["dedupe_hash"]] = r
+    return found
+
+# -----------------------------
+# Bulk insert of new memory rows
+# -----------------------------
+def _bulk_insert_memories(sb, items: List[Dict[str, Any]]):
+    """
+    Insert queued rows with upsert(on_conflict="dedupe_hash", ignore_duplicates=True)
+    in batches of MEMORY_INSERT_BATCH (default 200), reading ids from the returned rows.
+    Yields (item, memory_id, skip_reason); memory_id is None when the row was not written.
+    - rows dropped by the conflict clause lost a race with a concurrent ingest -> "duplicate"
+    - if a whole batch is rejected, its rows are retried one by one so only bad rows fail
+    """
+    size = max(1, int(os.getenv("MEMORY_INSERT_BATCH", "200")))
+    for start in range(0, len(items), size):
+        batch = items[start : start + size]
         try:
-            sb.table("entity_mentions").insert(
-                {"entity_id": eid, "memory_id": memory_id, "weight": 1.0}
-            ).execute()
+            res = (
+                sb.table("memories")
+                .upsert([it["payload"] for it in batch], on_conflict="dedupe_hash", ignore_duplicates=True)
+                .execute()
+            )
+            data = res.data if hasattr(res, "data") else res.get("data") or []
         except Exception:
-            pass
-    return ids
+            for it in batch:
+                try:
+                    res = sb.table("memories").insert(it["payload"]).execute()
+                    data = res.data if hasattr(res, "data") else res.get("data") or []
+                    mid = data[0].get("id") if data else None
+                except Exception as e:
+                    yield it, None, {"reason": "insert_failed", "error": str(e)}
+                    continue
+                yield it, mid, {"reason": "insert_select_missed"}
+            continue
+
+        ids = {r.get("dedupe_hash"): r.get("id") for r in (data or [])}
+        missed = [it for it in batch if not ids.get(it["payload"]["dedupe_hash"])]
+        winners: Dict[str, str] = {}
+        if missed:
+            try:
+                sel = (
+                    sb.table("memories")
+                    .select("id,dedupe_hash")
+                    .in_("dedupe_hash", [it["payload"]["dedupe_hash"] for it in missed])
+                    .execute()
+                )
+                rows = sel.data if hasattr(sel, "data") else sel.get("data") or []
+                winners = {r["dedupe_hash"]: r["id"] for r in rows or []}
+            except Exception:
+                winners = {}
+        for it in batch:
+            h = it["payload"]["dedupe_hash"]
+            if ids.get(h):
+                yield it, ids[h], None
+            elif winners.get(h):
+                yield it, None, {"reason": "duplicate", "memory_id": winners[h]}
+            else:
+                yield it, None, {"reason": "insert_select_missed"}
 
 # -----------------------------
 # Main upsert pipeline (used by upload/ingest and autosave)
 # -----------------------------
+def _default_title(text: str, idx: int, title_prefix: str) -> str:
+    prefix = getattr(text, "title_prefix", None) or title_prefix
+    return f"{prefix} — part {getattr(text, 'part', None) or idx + 1}"
+
 def upsert_memories_from_chunks(
     *,
     sb,
@@ -173,248 +479,311 @@ def upsert_memories_from_chunks(
     embedder,  # kept for signature compatibility (unused)
     file_id: Optional[str],
     title_prefix: str,
-    chunks: List[str],
+    chunks: Iterable[str],
     mem_type: str = "semantic",
     tags: Optional[List[str]] = None,
     role_view: Optional[List[str]] = None,
     source: str = "upload",
     text_col_env: str = "text",
     author_user_id: Optional[str] = None,
+    on_progress: Optional[Callable[[str, int], None]] = None,
+    journal: Optional[IngestJournal] = None,
 ) -> Dict[str, Any]:
     """
-    - exact duplicates (sha256) are skipped
+    - chunks may be a list or a lazy iterator; they are processed in windows of INGEST_WINDOW (default 256)
+    - exact duplicates (sha256) are skipped; resolved in-memory and with one IN lookup per window
     - near-duplicates (SimHash Hamming <= SIMHASH_DISTANCE) are updated in-place when UPSERT_MODE=update
-      or appended as new when UPSERT_MODE=append
-    - entity_ids are linked and included in Pinecone metadata
+      or appended as new when UPSERT_MODE=append; candidates come from the LSH index (ingest/lsh.py)
+    - ENRICH_MODE=combined (default) gets title/summary/tags/entities from one llm_enrich call;
+      ENRICH_MODE=separate keeps the llm_chunk_meta + llm_entities pair
+    - LLM metadata and entity calls fan out with per-stage caps (INGEST_META_CONCURRENCY,
+      INGEST_ENTITY_CONCURRENCY; INGEST_CONCURRENT=false runs everything serially)
+    - new rows are inserted in bulk (conflict-safe on dedupe_hash), then embedded together in
+      token/input-count sized batches
+    - entity_ids are linked (cached ids, bulk entity + mention upserts) and included in Pinecone metadata
+    - vectors are upserted in per-namespace batches; embedding_id back-writes are coalesced per batch
+    - on_progress(stage, n) is called with per-window increments for the stages
+      chunked / enriched / written / embedded / vectors / skipped (e.g. to drive ingest/jobs.py)
+    - chunks that carry file_id / title_prefix / part (NormalizedText attributes, set by /upload/bulk)
+      use them instead of the call-wide file_id / title_prefix / chunk number, so one run can span files
+    - journal (ingest/journal.py) records per-chunk stages; on a resubmitted ingest, chunks whose
+      row the journal recorded are finished (embed from cache, link, upsert vector) instead of being
+      skipped as duplicates, and journaled enrichment is reused instead of calling the LLM again
     """
     tags = tags or []
     role_view = role_view or []
     text_col = (os.getenv("MEMORIES_TEXT_COLUMN") or text_col_env or "text").strip().lower()
     mode = (os.getenv("UPSERT_MODE", "update")).lower()
     sim_thresh = int(os.getenv("SIMHASH_DISTANCE", "6"))
+    combined = (os.getenv("ENRICH_MODE", "combined")).lower() == "combined"
+    role_view = [str(r) for r in role_view]
 
     created: List[Dict[str, Any]] = []
     skipped: List[Dict[str, Any]] = []
     updated: List[Dict[str, Any]] = []
 
-    def embed(text: str) -> Optional[List[float]]:
-        try:
-            from openai import OpenAI
-            oai = OpenAI()
-            kwargs = {"model": os.getenv("EMBED_MODEL", "text-embedding-3-small"), "input": text}
-            if os.getenv("EMBED_DIM"):
-                kwargs["dimensions"] = int(os.getenv("EMBED_DIM"))
-            er = oai.embeddings.create(**kwargs)
-            return er.data[0].embedding
-        except Exception:
-            return None
-
-    for idx, raw in enumerate(chunks):
-        text = normalize_text(raw)
-        if not text:
-            skipped.append({"idx": idx, "reason": "empty"})
-            continue
-
-        dedupe_hash = sha256_hex(text)
-        sh_u = simhash64(text)        # unsigned 64-bit
-        sh_s = u64_to_signed(sh_u)    # signed BIGINT-safe
-
-        # ---- exact duplicate
-        try:
-            existing = (
-                sb.table("memories")
-                .select("id,embedding_id")
-                .eq("dedupe_hash", dedupe_hash)
-                .limit(1)
-                .execute()
-            )
-            rows = existing.data if hasattr(existing, "data") else existing.get("data")
-        except Exception:
-            rows = None
+    # ---- per-call state shared by all windows
+    first_idx: Dict[str, int] = {}   # dedupe_hash -> first chunk idx seen in this call
+    claimed: set = set()             # rows written by this call: never near-duplicate targets for its later chunks
+    near_index = None                # LSH index, loaded on first use
+    namespace = {"semantic": "semantic", "episodic": "episodic", "procedural": "procedural"}[mem_type]
+    by_idx: Dict[int, Dict[str, Any]] = {}
 
-        if rows:
-            skipped.append({"idx": idx, "reason": "duplicate", "memory_id": rows[0]["id"]})
-            continue
-
-        # ---- near-duplicate search (recent, same type)
-        try:
-            near = (
-                sb.table("memories")
-                .select(f"id,{text_col},simhash64,created_at")
-                .eq("type", mem_type)
-                .order("created_at", desc=True)
-                .limit(50)
-                .execute()
-            )
-            near_rows = near.data if hasattr(near, "data") else near.get("data") or []
-        except Exception:
-            near_rows = []
-
-        nearest = None
-        best_hd = 65
-        for r in near_rows:
-            sim = r.get("simhash64")
-            if sim is None:
-                continue
-            sim_u = signed_to_u64(int(sim))  # DB -> unsigned
-            hd = hamming(sim_u, sh_u)
-            if hd < best_hd:
-                best_hd, nearest = hd, r
-
-        # ---- LLM metadata
-        meta = llm_chunk_meta(text)
-        title = meta["title"] or f"{title_prefix} — part {idx + 1}"
-        summary = meta["summary"]
-        tagset = [str(t) for t in (tags or []) + meta["tags"]]
-        role_view = [str(r) for r in (role_view or [])]
-
-        # ============================================================
-        # Path A: update-in-place for near-duplicate (mode == "update")
-        # ============================================================
-        if nearest and best_hd <= sim_thresh and mode == "update":
+    def report(stage: str, n: int) -> None:
+        if on_progress and n:
             try:
-                upd = {
-                    text_col: text,
-                    "dedupe_hash": dedupe_hash,
-                    "simhash64": sh_s,  # signed
+                on_progress(stage, n)
+            except Exception:
+                pass  # progress is advisory
+
+    upserter = VectorUpserter(sb, pinecone_index)
+    try:
+        # ---- chunks may be a lazy iterator (see iter_chunks): work through it window by window,
+        #      so embedding starts before chunking finishes and memory stays flat
+        window_size = max(1, int(os.getenv("INGEST_WINDOW", "256")))
+        numbered = enumerate(chunks)
+        while True:
+            window = list(itertools.islice(numbered, window_size))
+            if not window:
+                break
+            report("chunked", len(window))
+            skipped_before = len(skipped)
+
+            # ---- normalize + hash the window up front; collapse duplicates before any I/O
+            prepared: List[Tuple[int, str, str]] = []
+            for idx, raw in window:
+                text = normalize_text(raw)
+                if not text:
+                    skipped.append({"idx": idx, "reason": "empty"})
+                    continue
+                h = sha256_hex(text)
+                if h in first_idx:
+                    skipped.append({"idx": idx, "reason": "duplicate", "duplicate_of": first_idx[h]})
+                    continue
+                first_idx[h] = idx
+                prepared.append((idx, text, h))
+
+            # rows written in the first pass (or by an interrupted run); embedded together afterwards
+            pending: List[Dict[str, Any]] = []
+            # Path B rows, inserted in bulk after the loop
+            to_insert: List[Dict[str, Any]] = []
+
+            # ---- exact duplicates: one (paginated) IN lookup per window
+            existing = _existing_by_hash(sb, [h for _, _, h in prepared])
+
+            fresh: List[Tuple[int, str, str]] = []
+            for idx, text, dedupe_hash in prepared:
+                row = existing.get(dedupe_hash)
+                j = journal.get(dedupe_hash) if journal else {}
+                own_file = getattr(text, "file_id", None) or file_id
+                resumed_row = bool(row and j.get("row") and j.get("memory_id") == row["id"])
+                # a row of this same file whose embedding never landed (e.g. re-ingest after an embed failure)
+                unembedded = bool(row and own_file and row.get("file_id") == own_file and not row.get("embedding_id"))
+                if resumed_row or unembedded:
+                    # written by the interrupted run, or this file's own unfinished row (rows of other
+                    # files are plain duplicates): report it if its vector landed, else finish it
+                    out = updated if j.get("out") == "updated" else created
+                    if row.get("embedding_id") and j.get("vector"):
+                        out.append({"idx": idx, "memory_id": row["id"]})
+                        continue
+                    meta = j.get("meta") or {}
+                    claimed.add(row["id"])
+                    pending.append({
+                        "idx": idx, "memory_id": row["id"], "text": text, "hash": dedupe_hash, "out": out,
+                        "title": meta.get("title") or row.get("title") or _default_title(text, idx, title_prefix),
+                        "tags": [str(t) for t in (tags or []) + (meta.get("tags") or [])] if meta else (row.get("tags") or tags),
+                        "ents": meta.get("entities") if combined and meta else None,
+                        "entity_ids": j.get("entity_ids") if j.get("linked") else None,
+                    })
+                    continue
+                if row:
+                    skipped.append({"idx": idx, "reason": "duplicate", "memory_id": row["id"]})
+                    continue
+                fresh.append((idx, text, dedupe_hash))
+
+            if near_index is None and mode == "update" and fresh:
+                near_index = get_simhash_index(sb, mem_type)
+
+            # ---- LLM metadata (+ entities in combined mode) for every surviving chunk, input order kept
+            texts = [t for _, t, _ in fresh]
+            metas: List[Optional[Dict[str, Any]]] = [
+                (journal.get(h).get("meta") if journal else None) for _, _, h in fresh
+            ]
+            todo = [i for i, m in enumerate(metas) if m is None]
+            todo_texts = [texts[i] for i in todo]
+            if combined:
+                new_metas = llm_enrich(todo_texts)
+            else:
+                new_metas = bounded_map(llm_chunk_meta, todo_texts, stage_limit("INGEST_META_CONCURRENCY", 8), "ingest-meta")
+            for i, m in zip(todo, new_metas):
+                metas[i] = m
+                if journal:
+                    journal.record(fresh[i][2], "enriched", meta=m)
+            if journal:
+                journal.flush()
+            entities_by_idx = {idx: m.get("entities") or [] for (idx, _, _), m in zip(fresh, metas)}
+            report("enriched", len(todo))
+
+            for (idx, text, dedupe_hash), sh_u, meta in zip(fresh, simhash64_many(texts), metas):
+                sh_s = u64_to_signed(sh_u)    # signed BIGINT-safe (sh_u is unsigned 64-bit)
+
+                # ---- near-duplicate search (LSH over the whole corpus of this type; no text fetched)
+                nearest = None
+                if mode == "update" and near_index is not None:
+                    nearest = near_index.nearest(sh_u, sim_thresh, exclude=claimed)
+
+                title = meta["title"] or _default_title(text, idx, title_prefix)
+                chunk_file_id = getattr(text, "file_id", None) or file_id
+                summary = meta["summary"]
+                tagset = [str(t) for t in (tags or []) + meta["tags"]]
+
+                # ============================================================
+                # Path A: update-in-place for near-duplicate (mode == "update")
+                # ============================================================
+                if nearest:
+                    try:
+                        upd = {
+                            text_col: text,
+                            "dedupe_hash": dedupe_hash,
+                            "simhash64": sh_s,  # signed
+                            "title": title,
+                            "summary": summary,
+                            "tags": tagset,
+                            "updated_at": datetime.datetime.utcnow().isoformat(),
+                            "file_id": chunk_file_id,
+                            "source": source,
+                            "type": mem_type,
+                        }
+                        if author_user_id:
+                            upd["author_user_id"] = author_user_id
+
+                        sb.table("memories").update(upd).eq("id", nearest[0]).execute()
+                        memory_id = nearest[0]
+                    except Exception as e:
+                        skipped.append({"idx": idx, "reason": "update_failed", "error": str(e)})
+                        continue
+
+                    claimed.add(memory_id)
+                    near_index.add(memory_id, sh_u)
+                    if journal:
+                        journal.record(dedupe_hash, "row", memory_id=memory_id, out="updated")
+                    pending.append({"idx": idx, "memory_id": memory_id, "text": text, "hash": dedupe_hash,
+                                    "title": title, "tags": tagset, "out": updated,
+                                    "ents": entities_by_idx.get(idx) if combined else None})
+                    continue  # end Path A
+
+                # ==============================
+                # Path B: queue a brand-new row
+                # ==============================
+                payload = {
+                    "type": mem_type,
                     "title": title,
+                    text_col: text,
                     "summary": summary,
                     "tags": tagset,
-                    "updated_at": datetime.datetime.utcnow().isoformat(),
-                    "file_id": file_id,
                     "source": source,
-                    "type": mem_type,
+                    "role_view": role_view,
+                    "file_id": chunk_file_id,
+                    "dedupe_hash": dedupe_hash,
+                    "simhash64": sh_s,  # signed
                 }
                 if author_user_id:
-                    upd["author_user_id"] = author_user_id
-
-                sb.table("memories").update(upd).eq("id", nearest["id"]).execute()
-                memory_id = nearest["id"]
-            except Exception as e:
-                skipped.append({"idx": idx, "reason": "update_failed", "error": str(e)})
-                continue
-
-            # ---- embed + upsert vector (safe, no swallowed exceptions)
-            vec = embed(text)
-            if not vec:
-                # still try to link entities
-                try:
-                    link_entities(sb, memory_id, llm_entities(text))
-                except Exception:
-                    pass
-                skipped.append({"idx": idx, "reason": "embed_failed"})
-                continue
-
-            namespace = {"semantic": "semantic", "episodic": "episodic", "procedural": "procedural"}[mem_type]
+                    payload["author_user_id"] = author_user_id
+
+                to_insert.append({"idx": idx, "payload": payload, "text": text, "title": title,
+                                  "tags": tagset, "simhash": sh_u})
+
+            # ---- one bulk insert for all new rows; ids come back from the insert itself
+            for item, memory_id, reason in _bulk_insert_memories(sb, to_insert):
+                if not memory_id:
+                    skipped.append({"idx": item["idx"], **reason})
+                    continue
+                claimed.add(memory_id)  # same as within a window: a document's own chunks never overwrite each other
+                if near_index is not None:
+                    near_index.add(memory_id, item["simhash"])
+                dedupe_hash = item["payload"]["dedupe_hash"]
+                if journal:
+                    journal.record(dedupe_hash, "row", memory_id=memory_id, out="upserted")
+                pending.append({"idx": item["idx"], "memory_id": memory_id, "text": item["text"], "hash": dedupe_hash,
+                                "title": item["title"], "tags": item["tags"], "out": created,
+                                "ents": entities_by_idx.get(item["idx"]) if combined else None})
+            if journal:
+                journal.flush()
+
+            report("written", len(pending))
+
+            # ---- embed every written row in as few requests as possible,
+            #      while entity extraction runs alongside with its own cap
+            pending_texts = [p["text"] for p in pending]
+            to_link = [p for p in pending if p.get("entity_ids") is None]
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-embed") as side:
+                vec_future = side.submit(embed_texts, pending_texts)
+                need = [p for p in to_link if p.get("ents") is None]
+                found = bounded_map(llm_entities, [p["text"] for p in need],
+                                    stage_limit("INGEST_ENTITY_CONCURRENCY", 8), "ingest-ents")
+                for p, ents in zip(need, found):
+                    p["ents"] = ents
+                vectors = vec_future.result()
+            report("embedded", sum(1 for v in vectors if v))
+
+            # ---- entities + mentions for the whole batch in bulk (linked even if embedding failed)
             try:
-                try:
-                    eid_list = link_entities(sb, memory_id, llm_entities(text)) or []
-                except Exception:
-                    eid_list = []
+                linked = link_entities_bulk(sb, {p["memory_id"]: p["ents"] or [] for p in to_link})
+            except Exception:
+                linked = {}
+            for p in pending:
+                if p.get("entity_ids") is not None:
+                    linked[p["memory_id"]] = p["entity_ids"]
+                elif journal and p["memory_id"] in linked:
+                    journal.record(p["hash"], "linked", entity_ids=linked[p["memory_id"]])
+            if journal:
+                for p, vec in zip(pending, vectors):
+                    if vec:
+                        journal.record(p["hash"], "embedded")
+                journal.flush()
+
+            for p, vec in zip(pending, vectors):
+                idx, memory_id = p["idx"], p["memory_id"]
+                if not vec:
+                    skipped.append({"idx": idx, "reason": "embed_failed"})
+                    continue
+                eid_list = linked.get(memory_id) or []
 
                 # build Pinecone-safe metadata
                 metadata = _sanitize_metadata({
                     "type": mem_type,
-                    "title": title,
-                    "tags": tagset,
+                    "title": p["title"],
+                    "tags": p["tags"],
                     "created_at": now_iso(),
                     "role_view": role_view,
                     "entity_ids": eid_list,
                     "source": source,
                     "author_user_id": author_user_id,  # omitted if None
+                    "page": getattr(p["text"], "page", None),          # PDF chunks only
+                    "page_end": getattr(p["text"], "page_end", None),
                 })
-
-                vector_id = f"mem_{memory_id}"
-                pinecone_index.upsert(
-                    vectors=[{"id": vector_id, "values": vec, "metadata": metadata}],
-                    namespace=namespace,
-                )
-                sb.table("memories").update({"embedding_id": vector_id}).eq("id", memory_id).execute()
-                updated.append({"idx": idx, "memory_id": memory_id})
-            except Exception as e:
-                skipped.append({"idx": idx, "reason": "upsert_failed", "error": str(e)})
-            continue  # end Path A
-
-        # ==============================
-        # Path B: insert a brand-new row
-        # ==============================
-        payload = {
-            "type": mem_type,
-            "title": title,
-            text_col: text,
-            "summary": summary,
-            "tags": tagset,
-            "source": source,
-            "role_view": role_view,
-            "file_id": file_id,
-            "dedupe_hash": dedupe_hash,
-            "simhash64": sh_s,  # signed
-        }
-        if author_user_id:
-            payload["author_user_id"] = author_user_id
-
-        try:
-            ins = sb.table("memories").insert(payload).execute()
-        except Exception as e:
-            skipped.append({"idx": idx, "reason": "insert_failed", "error": str(e)})
-            continue
-
-        # fetch id
-        try:
-            d = ins.data if hasattr(ins, "data") else ins.get("data") or []
-            if d and isinstance(d, list) and d[0].get("id"):
-                memory_id = d[0]["id"]
-            else:
-                sel = sb.table("memories").select("id").eq("dedupe_hash", dedupe_hash).limit(1).execute()
-                data = sel.data if hasattr(sel, "data") else sel.get("data")
-                memory_id = data[0]["id"] if data else None
-        except Exception:
-            memory_id = None
-
-        if not memory_id:
-            skipped.append({"idx": idx, "reason": "insert_select_missed"})
-            continue
-
-        # ---- embed + upsert vector (safe)
-        vec = embed(text)
-        if not vec:
-            # still extract+link entities for graph even if embedding failed
-            try:
-                link_entities(sb, memory_id, llm_entities(text))
-            except Exception:
-                pass
-            skipped.append({"idx": idx, "reason": "embed_failed"})
-            continue
-
-        namespace = {"semantic": "semantic", "episodic": "episodic", "procedural": "procedural"}[mem_type]
-        try:
-            try:
-                eid_list = link_entities(sb, memory_id, llm_entities(text)) or []
-            except Exception:
-                eid_list = []
-
-            # build Pinecone-safe metadata
-            metadata = _sanitize_metadata({
-                "type": mem_type,
-                "title": title,
-                "tags": tagset,
-                "created_at": now_iso(),
-                "role_view": role_view,
-                "entity_ids": eid_list,
-                "source": source,
-                "author_user_id": author_user_id,  # omitted if None
-            })
-
-            vector_id = f"mem_{memory_id}"
-            pinecone_index.upsert(
-                vectors=[{"id": vector_id, "values": vec, "metadata": metadata}],
-                namespace=namespace,
-            )
-            sb.table("memories").update({"embedding_id": vector_id}).eq("id", memory_id).execute()
-            created.append({"idx": idx, "memory_id": memory_id})
-        except Exception as e:
-            skipped.append({"idx": idx, "reason": "upsert_failed", "error": str(e)})
-            # do NOT set embedding_id on failure; leave created entry out
-
-    # final return (after processing all chunks)
+                by_idx[idx] = p
+                upserter.add(namespace, memory_id, vec, metadata, ref=idx)
+            report("skipped", len(skipped) - skipped_before)
+    finally:
+        # ---- flush buffered vectors (batched per namespace, several batches in flight); also when
+        #      a window raised, so in-flight batches finish and the upsert threads are released
+        results = upserter.close()
+    report("vectors", sum(1 for _, err in results if not err))
+    report("skipped", sum(1 for _, err in results if err))
+    for idx, err in results:
+        p = by_idx[idx]
+        if err:
+            # embedding_id is only set once the vector batch landed
+            skipped.append({"idx": idx, "reason": "upsert_failed", "error": err})
+        else:
+            p["out"].append({"idx": idx, "memory_id": p["memory_id"]})
+            if journal:
+                journal.record(p["hash"], "vector")
+    if journal:
+        journal.flush()
+
+    # final return (after processing all chunks), in original chunk order
+    for lst in (created, updated, skipped):
+        lst.sort(key=lambda r: r["idx"])
     return {"upserted": created, "updated": updated, "skipped": skipped}
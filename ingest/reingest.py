@@ -0,0 +1,109 @@
+# ingest/reingest.py
+# Incremental re-ingest of a revised file: diff chunk hashes against what is
+# already stored for that file, ingest only new/changed chunks, retire the rest.
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from ingest.pipeline import normalize_text, sha256_hex
+from ingest import lsh
+
+def _rows(res) -> List[Dict[str, Any]]:
+    return (res.data if hasattr(res, "data") else res.get("data")) or []
+
+def find_previous_file(sb, filename: Optional[str], file_id: Optional[str] = None) -> Optional[str]:
+    """files.id to re-ingest into: the explicit file_id if it exists, else the latest row with this filename."""
+    try:
+        if file_id:
+            rows = _rows(sb.table("files").select("id").eq("id", file_id).limit(1).execute())
+        elif filename:
+            rows = _rows(
+                sb.table("files").select("id").eq("filename", filename)
+                .order("created_at", desc=True).limit(1).execute()
+            )
+        else:
+            rows = []
+    except Exception:
+        rows = []
+    return rows[0]["id"] if rows else None
+
+def stored_chunks(sb, file_id: str, page: int = 1000) -> List[Dict[str, Any]]:
+    """All memories rows of a file (no text column), paged."""
+    out: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        rows = _rows(
+            sb.table("memories").select("id,type,dedupe_hash,embedding_id")
+            .eq("file_id", file_id).order("id").range(start, start + page - 1).execute()
+        )
+        out.extend(rows)
+        if len(rows) < page:
+            return out
+        start += page
+
+class ReingestPlan:
+    """
+    Usage:
+        plan = ReingestPlan(sb, file_id)
+        upsert_memories_from_chunks(..., chunks=plan.filter(chunks))
+        plan.retire(sb, pinecone_index, keep_ids=<ids updated in place>)
+    """
+
+    def __init__(self, sb, file_id: str):
+        self.file_id = file_id
+        self.stored: Dict[str, Dict[str, Any]] = {
+            r["dedupe_hash"]: r for r in stored_chunks(sb, file_id) if r.get("dedupe_hash")
+        }
+        self.seen: Set[str] = set()
+        self.unchanged = 0
+        self.retired = 0
+
+    def filter(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Yield only chunks not already stored (with their vector) for this file. A stored row
+        without embedding_id (its embed failed earlier) goes through again and is finished in place.
+        """
+        for c in chunks:
+            h = sha256_hex(normalize_text(c))
+            self.seen.add(h)
+            if (self.stored.get(h) or {}).get("embedding_id"):
+                self.unchanged += 1
+                continue
+            yield c
+
+    def stale(self, keep_ids: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        keep = set(keep_ids)
+        return [r for h, r in self.stored.items() if h not in self.seen and r["id"] not in keep]
+
+    def retire(self, sb, pinecone_index, keep_ids: Iterable[str] = ()) -> int:
+        """
+        Delete vectors and rows for chunks that disappeared from the file.
+        keep_ids: rows the ingest rewrote in place (near-duplicate updates) – they are live again.
+        """
+        rows = self.stale(keep_ids)
+        self.retired = retire_memories(sb, pinecone_index, rows)
+        return self.retired
+
+def retire_memories(sb, pinecone_index, rows: List[Dict[str, Any]], batch: int = 500) -> int:
+    """Delete Pinecone vectors (per type namespace) and memories rows; returns rows deleted."""
+    if not rows:
+        return 0
+    by_ns: Dict[str, List[str]] = {}
+    for r in rows:
+        by_ns.setdefault(r.get("type") or "semantic", []).append(r.get("embedding_id") or f"mem_{r['id']}")
+    for ns, vids in by_ns.items():
+        for i in range(0, len(vids), batch):
+            try:
+                pinecone_index.delete(ids=vids[i : i + batch], namespace=ns)
+            except Exception as e:
+                print("reingest: vector delete failed:", e)
+    ids = [r["id"] for r in rows]
+    deleted = 0
+    for i in range(0, len(ids), batch):
+        part = ids[i : i + batch]
+        try:
+            sb.table("memories").delete().in_("id", part).execute()
+            deleted += len(part)
+        except Exception as e:
+            print("reingest: row delete failed:", e)
+    lsh.forget(ids)
+    return deleted
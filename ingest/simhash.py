@@ -1,27 +1,74 @@
 # ingest/simhash.py
 import re, hashlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+try:  # optional fast path; results are bit-identical either way
+    import numpy as _np
+except Exception:
+    _np = None
 
 _WORD = re.compile(r"\w+", re.UNICODE)
 
+@lru_cache(maxsize=1 << 16)
 def _h64(token: str) -> int:
     # Stable 64-bit hash from md5 (first 8 bytes)
     d = hashlib.md5(token.encode("utf-8")).digest()
     return int.from_bytes(d[:8], "big", signed=False)
 
-def simhash64(text: str) -> int:
-    tokens = _WORD.findall((text or "").lower())
-    if not tokens:
-        return 0
-    v = [0]*64
-    for t in tokens:
-        h = _h64(t)
-        for i in range(64):
-            v[i] += 1 if (h >> i) & 1 else -1
+def _fold(ones: List[int], total: int) -> int:
+    # bit i is set when its vote (ones - zeros) is >= 0
     out = 0
     for i in range(64):
-        if v[i] >= 0:
+        if 2 * ones[i] >= total:
             out |= (1 << i)
     return out
 
+def _votes_numpy(hashes: List[int], counts: List[int]) -> int:
+    arr = _np.array(hashes, dtype="<u8")
+    bits = _np.unpackbits(arr.view(_np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    ones = _np.asarray(counts, dtype=_np.int64) @ bits  # per-bit weighted count of set bits
+    return _fold(ones.tolist(), int(sum(counts)))
+
+def _votes_python(hashes: List[int], counts: List[int]) -> int:
+    ones = [0] * 64
+    for h, c in zip(hashes, counts):
+        while h:
+            low = h & -h
+            ones[low.bit_length() - 1] += c
+            h ^= low
+    return _fold(ones, sum(counts))
+
+def _simhash_counts(counts: Dict[str, int], cache: Optional[Dict[str, int]] = None) -> int:
+    if not counts:
+        return 0
+    hashes: List[int] = []
+    for t in counts:
+        if cache is None:
+            hashes.append(_h64(t))
+        else:
+            h = cache.get(t)
+            if h is None:
+                h = cache[t] = _h64.__wrapped__(t)
+            hashes.append(h)
+    weights = list(counts.values())
+    if _np is not None and len(hashes) >= 32:
+        return _votes_numpy(hashes, weights)
+    return _votes_python(hashes, weights)
+
+def simhash64(text: str) -> int:
+    """
+    64-bit SimHash over lowercase \\w+ tokens (md5-derived token hashes, +1/-1 bit votes).
+    Votes are computed once per distinct token, weighted by its count, so the output
+    is identical to the classic per-token loop.
+    """
+    return _simhash_counts(Counter(_WORD.findall((text or "").lower())))
+
+def simhash64_many(texts: Iterable[str]) -> List[int]:
+    """Batch variant of simhash64: token hashes are shared across all texts in the call."""
+    cache: Dict[str, int] = {}
+    return [_simhash_counts(Counter(_WORD.findall((t or "").lower())), cache) for t in texts]
+
 def hamming(a: int, b: int) -> int:
     return ((a ^ b).bit_count())
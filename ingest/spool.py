@@ -0,0 +1,235 @@
+# ingest/spool.py
+# Copy an incoming upload to a temp file block by block, so conversion works from
+# a path (file handle / mmap) and no full in-memory copy of the bytes is kept.
+#
+# By the time a route sees an UploadFile, starlette's multipart parser has already
+# received the whole part (into its own SpooledTemporaryFile). Request size is therefore
+# capped earlier, by UploadBodyLimit (ASGI middleware, installed in app.py), before
+# the parser reads anything.
+
+import hashlib
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from ingest.text import NormalizedText
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int, setting: str = "UPLOAD_MAX_BYTES"):
+        super().__init__(f"upload exceeds {setting} ({limit} bytes)")
+        self.limit = limit
+        self.setting = setting
+
+def upload_limits() -> Tuple[int, int]:
+    """(max_bytes, block_size) from UPLOAD_MAX_BYTES (default 100 MiB) and UPLOAD_BLOCK_SIZE (default 1 MiB)."""
+    max_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+    block = max(4096, int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024))))
+    return max_bytes, block
+
+def bulk_max_bytes() -> int:
+    """BULK_MAX_BYTES (default 1 GiB): total bytes of one /upload/bulk request, after decompression."""
+    return int(os.getenv("BULK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+def body_limit(path: str) -> Tuple[int, str]:
+    """Request body cap for a route (0 = none) and the setting that defines it."""
+    if path.rstrip("/") == "/upload":
+        return upload_limits()[0], "UPLOAD_MAX_BYTES"
+    if path.rstrip("/") == "/upload/bulk":
+        return bulk_max_bytes(), "BULK_MAX_BYTES"
+    return 0, ""
+
+class _BodyTooLarge(Exception):
+    pass
+
+class UploadBodyLimit:
+    """
+    ASGI middleware capping POST bodies of /upload and /upload/bulk (see body_limit) plus
+    UPLOAD_BODY_SLACK bytes of multipart framing (default 64 KiB). A Content-Length over the
+    cap is answered 413 before any of the body is read; bodies without one (chunked) are
+    counted as they arrive and cut off with a 413 at the cap, so the multipart parser never
+    spools more than that.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "POST":
+            return await self.app(scope, receive, send)
+        limit, setting = body_limit(scope.get("path") or "")
+        if not limit:
+            return await self.app(scope, receive, send)
+        cap = limit + int(os.getenv("UPLOAD_BODY_SLACK", str(64 * 1024)))
+        detail = str(UploadTooLarge(limit, setting))
+
+        length = dict(scope.get("headers") or []).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > cap:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+        too_large = started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > cap:
+                    too_large = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # whatever the route makes of the aborted body (FastAPI turns it into a 400) is replaced by the 413
+            nonlocal started
+            if not too_large:
+                started = started or message["type"] == "http.response.start"
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not started:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+class SpooledUpload:
+    """A spooled upload on disk: path, size and sha256 of its bytes. cleanup() removes the file."""
+
+    def __init__(self, filename: Optional[str], path: str, size: int, sha256: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def _cap(max_bytes: int, budget: Optional[int]) -> Tuple[Optional[int], str]:
+    """The effective byte limit (None = none): UPLOAD_MAX_BYTES, or the caller's remaining budget when lower."""
+    if budget is not None and (not max_bytes or budget < max_bytes):
+        return max(0, budget), "BULK_MAX_BYTES"
+    return max_bytes or None, "UPLOAD_MAX_BYTES"
+
+def _spool_path(filename: Optional[str]) -> Tuple[int, str]:
+    suffix = os.path.splitext(filename or "")[1][:16]
+    d = os.getenv("UPLOAD_SPOOL_DIR") or None
+    if d:
+        os.makedirs(d, exist_ok=True)
+    return tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=d)
+
+async def spool_upload(file, budget: Optional[int] = None) -> SpooledUpload:
+    """
+    Copy a starlette UploadFile (already received by the multipart parser) to our spool in
+    UPLOAD_BLOCK_SIZE reads, hashing as it goes. Raises UploadTooLarge, before copying when the
+    parsed part size is known, past UPLOAD_MAX_BYTES (0 = no limit) or past budget bytes (what is
+    left of a caller's total, e.g. BULK_MAX_BYTES). The request as a whole is capped earlier
+    by UploadBodyLimit.
+    """
+    max_bytes, block = upload_limits()
+    limit, setting = _cap(max_bytes, budget)
+    if limit is not None and (getattr(file, "size", None) or 0) > limit:
+        raise UploadTooLarge(limit, setting)
+    fd, path = _spool_path(file.filename)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                buf = await file.read(block)
+                if not buf:
+                    break
+                size += len(buf)
+                if limit is not None and size > limit:
+                    raise UploadTooLarge(limit, setting)
+                h.update(buf)
+                out.write(buf)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return SpooledUpload(file.filename, path, size, h.hexdigest())
+
+def spool_stream(filename: Optional[str], src, budget: Optional[int] = None) -> SpooledUpload:
+    """
+    Same as spool_upload for a blocking binary file object (e.g. a zip entry): copied in
+    UPLOAD_BLOCK_SIZE reads, UploadTooLarge past UPLOAD_MAX_BYTES (or budget) of actual
+    (decompressed) bytes, so at most limit + one block is ever read.
+    """
+    max_bytes, block = upload_limits()
+    limit, setting = _cap(max_bytes, budget)
+    fd, path = _spool_path(filename)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                buf = src.read(block)
+                if not buf:
+                    break
+                size += len(buf)
+                if limit is not None and size > limit:
+                    raise UploadTooLarge(limit, setting)
+                h.update(buf)
+                out.write(buf)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return SpooledUpload(filename, path, size, h.hexdigest())
+
+def spool_bytes(filename: Optional[str], data: bytes) -> SpooledUpload:
+    """Same as spool_upload for bytes already in hand (scripts, tests)."""
+    fd, path = _spool_path(filename)
+    with os.fdopen(fd, "wb") as out:
+        out.write(data)
+    return SpooledUpload(filename, path, len(data), hashlib.sha256(data).hexdigest())
+
+class SpooledText:
+    """
+    A converted, normalized text parked on disk (UTF-8) while other documents are processed.
+    len() and page_starts are kept in memory; load() reads the text back, cleanup() removes the file.
+    """
+
+    def __init__(self, path: str, chars: int, page_starts: Optional[List[int]]):
+        self.path = path
+        self.chars = chars
+        self.page_starts = page_starts
+
+    def __len__(self) -> int:
+        return self.chars
+
+    def load(self) -> NormalizedText:
+        with open(self.path, "r", encoding="utf-8", errors="surrogatepass", newline="") as f:
+            text = NormalizedText(f.read())
+        text.page_starts = self.page_starts
+        return text
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def spool_text(filename: Optional[str], text: NormalizedText) -> SpooledText:
+    fd, path = _spool_path((filename or "") + ".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogatepass", newline="") as out:
+            out.write(text)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return SpooledText(path, len(text), getattr(text, "page_starts", None))
@@ -0,0 +1,84 @@
+# ingest/text.py
+# Whitespace normalization shared by converters, upload and the ingest pipeline.
+
+import re
+from bisect import bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+class NormalizedText(str):
+    """
+    A str already passed through normalize_text. normalize_text returns it unchanged,
+    so converter → upload → chunker → pipeline → embed cache normalize only once.
+    Slices of a normalized string are still normalized; wrap them with as_normalized().
+    page_starts: offsets where each source page begins (PDFs), else None.
+    """
+    page_starts: Optional[List[int]] = None
+    page: Optional[int] = None       # set on chunks cut from a paged text
+    page_end: Optional[int] = None
+    # set on chunks when one ingest run spans several files (/upload/bulk)
+    file_id: Optional[str] = None
+    title_prefix: Optional[str] = None
+    part: Optional[int] = None       # 1-based chunk number within its file
+
+    def page_at(self, offset: int) -> Optional[int]:
+        """1-based page containing offset, when page_starts is known."""
+        if not self.page_starts:
+            return None
+        return max(1, bisect_right(self.page_starts, offset))
+
+# Same result as the old re.sub sequence  \r\n -> \n ; [ \t]+ -> " " ; \n{3,} -> \n\n ; strip
+# with precompiled patterns, a literal replace for CRLF and passes skipped when they cannot match.
+# (A single alternation pass with a replacement callback measured slower in CPython.)
+_SPACES = re.compile(r"[ \t]{2,}|\t")   # lone spaces need no rewrite
+_BLANKS = re.compile(r"\n{3,}")
+_CRLF = re.compile(r"\r\n")  # offset mapping only
+
+def normalize_text(s: str) -> NormalizedText:
+    if isinstance(s, NormalizedText):
+        return s
+    s = s or ""
+    if "\r\n" in s:
+        s = s.replace("\r\n", "\n")
+    s = _SPACES.sub(" ", s)
+    if "\n\n\n" in s:
+        s = _BLANKS.sub("\n\n", s)
+    return NormalizedText(s.strip())
+
+def as_normalized(s: str) -> NormalizedText:
+    """Mark a piece of already-normalized text (e.g. a stripped slice of a NormalizedText)."""
+    return s if isinstance(s, NormalizedText) else NormalizedText(s)
+
+def _sub_mapped(s: str, pattern: "re.Pattern", repl: str, offsets: List[int]) -> Tuple[str, List[int]]:
+    """pattern.sub(repl, s) plus offsets moved onto the result (an offset inside a match lands on its replacement)."""
+    out: List[str] = []
+    mapped: List[int] = []
+    prev = shift = 0
+    k = 0
+    for m in pattern.finditer(s):
+        while k < len(offsets) and offsets[k] < m.end():
+            o = offsets[k]
+            mapped.append(o + shift if o < m.start() else m.start() + shift)
+            k += 1
+        out.append(s[prev : m.start()])
+        out.append(repl)
+        shift += len(repl) - (m.end() - m.start())
+        prev = m.end()
+    out.append(s[prev:])
+    mapped.extend(o + shift for o in offsets[k:])
+    return "".join(out), mapped
+
+def normalize_with_offsets(s: str, offsets: Sequence[int]) -> Tuple[NormalizedText, List[int]]:
+    """
+    normalize_text(s) together with the given raw offsets (ascending) mapped to
+    offsets in the normalized text, clamped to its bounds.
+    """
+    s = s or ""
+    mapped = list(offsets)
+    if "\r\n" in s:
+        s, mapped = _sub_mapped(s, _CRLF, "\n", mapped)
+    s, mapped = _sub_mapped(s, _SPACES, " ", mapped)
+    if "\n\n\n" in s:
+        s, mapped = _sub_mapped(s, _BLANKS, "\n\n", mapped)
+    lead = len(s) - len(s.lstrip())
+    out = NormalizedText(s.strip())
+    return out, [min(max(0, o - lead), len(out)) for o in mapped]
@@ -0,0 +1,92 @@
+# ingest/vectors.py
+# Buffered Pinecone upserts: batch vectors per namespace, keep several batches in flight,
+# and coalesce the memories.embedding_id back-writes into one bulk update per flush.
+
+import os
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, List, Optional, Tuple
+
+def set_embedding_ids(sb, memory_ids: List[str]) -> Dict[str, str]:
+    """
+    Point memories.embedding_id at their vectors (always 'mem_<id>').
+    One RPC call for the whole list; falls back to per-row updates if the
+    set_memory_embedding_ids function is not installed (see supabase_schema.sql).
+    Returns {memory_id: error} for rows that could not be updated (empty when all were).
+    """
+    if not memory_ids:
+        return {}
+    try:
+        sb.rpc("set_memory_embedding_ids", {"ids": memory_ids}).execute()
+        return {}
+    except Exception:
+        pass
+    failed: Dict[str, str] = {}
+    for mid in memory_ids:
+        try:
+            sb.table("memories").update({"embedding_id": f"mem_{mid}"}).eq("id", mid).execute()
+        except Exception as e:
+            failed[mid] = str(e)
+    return failed
+
+class VectorUpserter:
+    """
+    Usage:
+        up = VectorUpserter(sb, index)
+        up.add("semantic", memory_id, values, metadata, ref=idx)
+        results = up.close()   # [(ref, error_or_None), ...]
+
+    Tunables: PINECONE_UPSERT_BATCH (default 100), PINECONE_UPSERT_CONCURRENCY (default 4).
+    """
+
+    def __init__(self, sb, pinecone_index, batch_size: Optional[int] = None, concurrency: Optional[int] = None):
+        self.sb = sb
+        self.index = pinecone_index
+        self.batch_size = max(1, batch_size or int(os.getenv("PINECONE_UPSERT_BATCH", "100")))
+        workers = max(1, concurrency or int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4")))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pc-upsert")
+        self._buffers: Dict[str, List[Tuple[Any, str, Dict[str, Any]]]] = {}
+        self._inflight: List[Tuple[List[Tuple[Any, str]], Future]] = []  # ([(ref, memory_id)], batch future)
+
+    def add(self, namespace: str, memory_id: str, values: List[float], metadata: Dict[str, Any], ref: Any = None) -> None:
+        vec = {"id": f"mem_{memory_id}", "values": values, "metadata": metadata}
+        buf = self._buffers.setdefault(namespace, [])
+        buf.append((ref, memory_id, vec))
+        if len(buf) >= self.batch_size:
+            self._submit(namespace)
+
+    def _submit(self, namespace: str) -> None:
+        batch = self._buffers.pop(namespace, [])
+        if not batch:
+            return
+        refs = [(ref, mid) for ref, mid, _ in batch]
+        fut = self._pool.submit(self._write, namespace, batch)
+        self._inflight.append((refs, fut))
+
+    def _write(self, namespace: str, batch: List[Tuple[Any, str, Dict[str, Any]]]) -> Dict[str, str]:
+        """Upsert one batch; returns the rows whose embedding_id back-write failed (see set_embedding_ids)."""
+        self.index.upsert(vectors=[v for _, _, v in batch], namespace=namespace)
+        return set_embedding_ids(self.sb, [mid for _, mid, _ in batch])
+
+    def flush(self) -> None:
+        """Submit any partially filled batches."""
+        for ns in list(self._buffers):
+            self._submit(ns)
+
+    def close(self) -> List[Tuple[Any, Optional[str]]]:
+        """
+        Flush, wait for every batch, and report (ref, error) per vector; error is None on success.
+        A failed upsert fails its whole batch; a failed embedding_id back-write only its own row.
+        """
+        self.flush()
+        results: List[Tuple[Any, Optional[str]]] = []
+        try:
+            for refs, fut in self._inflight:
+                try:
+                    failed = fut.result()
+                    results.extend((ref, failed.get(mid)) for ref, mid in refs)
+                except Exception as e:
+                    results.extend((ref, str(e)) for ref, _ in refs)
+        finally:
+            self._inflight = []
+            self._pool.shutdown(wait=True)
+        return results
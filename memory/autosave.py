@@ -1,16 +1,10 @@
 import os
-import datetime
 from typing import List, Dict, Any, Optional
 
 from ingest.pipeline import normalize_text, upsert_memories_from_chunks
 from memory.autosave_classifier import classify_importance
 
 
-def _now_iso() -> str:
-    """Return current UTC timestamp in ISO format."""
-    return datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc).isoformat()
-
-
 def _save_memory(
     sb,
     pinecone_index,
@@ -18,6 +12,7 @@ def _save_memory(
     session_id: Optional[str],
     text_col_env: str,
     author_user_id: Optional[str],
+    source: str,
 ) -> Optional[Dict[str, Any]]:
     """
     Persist a single fact/procedure memory via the ingest pipeline.
@@ -38,8 +33,8 @@ def _save_memory(
         mem_type=ftype if ftype in ("episodic", "procedural") else "episodic",
         tags=tags,
         role_view=[],
+        source=source,
         author_user_id=author_user_id,
-        metadata_overrides={"saved_at": _now_iso()},
     )
     if r.get("upserted") or r.get("updated"):
         return r.get("upserted") or r.get("updated")[0]
@@ -56,6 +51,7 @@ def apply_autosave(
     session_id: Optional[str],
     text_col_env: str = "value",
     author_user_id=None,
+    source: str = "chat",
 ) -> Dict[str, Any]:
     """
     Process autosave candidates:
@@ -63,6 +59,7 @@ def apply_autosave(
       • Entity-specific thresholding (stricter than general facts).
       • Splits 'review' vs 'skipped' so borderline items aren't lost.
       • Saves high-quality memories via the ingest pipeline.
+    source: memories.source of saved items ("chat" or "upload").
     """
     thr_fact = float(os.getenv("AUTOSAVE_CONF_THRESHOLD", "0.75"))
     thr_ent  = float(os.getenv("AUTOSAVE_ENTITY_CONF_THRESHOLD", "0.85"))
@@ -92,7 +89,7 @@ def apply_autosave(
         # general facts gate at thr_fact
         if ftype == "entity":
             if c["importance"] == "high" and conf >= thr_ent:
-                mem = _save_memory(sb, pinecone_index, c, session_id, text_col_env, author_user_id)
+                mem = _save_memory(sb, pinecone_index, c, session_id, text_col_env, author_user_id, source)
                 if mem: saved.append(mem)
             elif c["importance"] == "medium" or (0.6 <= conf < thr_ent):
                 c["review_required"] = True
@@ -101,7 +98,7 @@ def apply_autosave(
                 skipped.append({"reason": "low_conf_entity", "title": title})
         else:
             if c["importance"] == "high" and conf >= thr_fact:
-                mem = _save_memory(sb, pinecone_index, c, session_id, text_col_env, author_user_id)
+                mem = _save_memory(sb, pinecone_index, c, session_id, text_col_env, author_user_id, source)
                 if mem: saved.append(mem)
             elif c["importance"] == "medium" or (0.6 <= conf < thr_fact):
                 c["review_required"] = True
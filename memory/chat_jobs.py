@@ -0,0 +1,49 @@
+# memory/chat_jobs.py
+# Post-response work for /chat (autosave, message inserts) on its own bounded job registry,
+# so chat bookkeeping never waits behind uploads. Like ingest jobs, ids live in memory and
+# are only resolvable on the worker process that answered the chat.
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from ingest.jobs import IngestJob, JobRegistry
+
+_registry: Optional[JobRegistry] = None
+_registry_lock = threading.Lock()
+
+def after_response_enabled() -> bool:
+    """CHAT_AFTER_RESPONSE=false keeps autosave and message inserts inside the request."""
+    return os.getenv("CHAT_AFTER_RESPONSE", "true").lower() == "true"
+
+def get_chat_jobs() -> JobRegistry:
+    """
+    CHAT_BG_WORKERS threads (default 4), at most CHAT_BG_QUEUE jobs queued or running (default 500;
+    past that try_submit returns None and the request does the work itself). Finished jobs are kept
+    for CHAT_BG_TTL_S (default 3600) and at most CHAT_BG_HISTORY (default 2000).
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = JobRegistry(
+                    int(os.getenv("CHAT_BG_WORKERS", "4")),
+                    float(os.getenv("CHAT_BG_TTL_S", "3600")),
+                    int(os.getenv("CHAT_BG_HISTORY", "2000")),
+                    max_pending=int(os.getenv("CHAT_BG_QUEUE", "500")),
+                    name="chat-bg",
+                )
+    return _registry
+
+def autosave_status(job: IngestJob) -> Dict[str, Any]:
+    """GET /chat/autosave/{id}: pending | running | done | failed, with apply_autosave's result once done."""
+    snap = job.snapshot()
+    return {
+        "id": snap["id"],
+        "status": "pending" if snap["status"] == "queued" else snap["status"],
+        "session_id": snap["meta"].get("session_id"),
+        "result": snap["result"],
+        "error": snap["error"],
+        "created_at": snap["created_at"],
+        "finished_at": snap["finished_at"],
+    }
@@ -0,0 +1,374 @@
+# memory/retrieval.py
+# Query-time retrieval shared by /chat, /search and the agent: embed the query once
+# (same model/dimensions and embedding cache as ingest), query each type namespace
+# with that vector, then hydrate every hit from `memories` with ONE `in_` query.
+# aretrieve() is the same engine on the asyncio clients (async /chat).
+
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from ingest.embed_cache import cache_key, cached_embed_one, get_cache
+from ingest.embeddings import embed_kwargs, embed_one
+from vendors.openai_client import get_async_client as get_async_openai
+from vendors.pinecone_client import safe_query, safe_query_async
+
+logger = logging.getLogger(__name__)
+
+NAMESPACES = ("semantic", "episodic", "procedural")
+# columns every caller gets from hydration (plus the text column when asked for)
+ROW_COLUMNS = ("id", "type", "title", "tags", "created_at", "source")
+
+def text_column() -> str:
+    return (os.getenv("MEMORIES_TEXT_COLUMN", "text")).strip().lower()
+
+def embed_query(text: str) -> List[float]:
+    """
+    Query vector from the ingest embedder (EMBED_MODEL / EMBED_DIM, embedding cache).
+    The OpenAI error, if any, reaches the caller unchanged.
+    """
+    kw = embed_kwargs()
+    return cached_embed_one(text, kw["model"], kw.get("dimensions"), embed_one)
+
+def _memory_id(m) -> str:
+    md = m.metadata or {}
+    return (md.get("id") or (m.id or "")).replace("mem_", "")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _env_ms(name: str, default: int) -> float:
+    """Milliseconds from the environment as seconds; 0 (or junk) disables."""
+    try:
+        return max(0, int(os.getenv(name, str(default)))) / 1000.0
+    except ValueError:
+        return default / 1000.0
+
+def _query_pool() -> ThreadPoolExecutor:
+    """Threads for namespace queries: RETRIEVAL_WORKERS (default 32), shared by all requests."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                workers = max(1, int(os.getenv("RETRIEVAL_WORKERS", "32")))
+            except ValueError:
+                workers = 32
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+        return _pool
+
+def _query_by(index, deadline: Optional[float], kw: Dict[str, Any]):
+    """safe_query whose request timeout is what is left until deadline (time.monotonic(), None = none)."""
+    if deadline is None:
+        return safe_query(index, **kw)
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("RETRIEVAL_NS_TIMEOUT_MS passed before the query was sent")
+    return safe_query(index, timeout=left, **kw)
+
+def _fan_out(index, calls: Dict[str, Dict[str, Any]], metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ns -> query response (or the exception it raised), all namespaces in flight at once.
+    A namespace still unanswered after RETRIEVAL_HEDGE_MS gets a second, identical query and the
+    first answer wins; one unanswered after RETRIEVAL_NS_TIMEOUT_MS is given up on and listed in
+    metrics["timed_out"]. Every query is sent with the time left until that deadline as its
+    request timeout, so abandoned queries give their pool thread back by then.
+    """
+    timeout_s = _env_ms("RETRIEVAL_NS_TIMEOUT_MS", 2500)
+    hedge_s = _env_ms("RETRIEVAL_HEDGE_MS", 0)
+    pool = _query_pool()
+    start = time.monotonic()
+    deadline = start + timeout_s if timeout_s else None
+    attempts: Dict[str, List[Future]] = {ns: [pool.submit(_query_by, index, deadline, kw)] for ns, kw in calls.items()}
+    out: Dict[str, Any] = {}
+
+    while attempts:
+        now = time.monotonic() - start
+        for ns in list(attempts):
+            futs = attempts[ns]
+            won = next((f for f in futs if f.done() and f.exception() is None), None)
+            if won is not None:
+                out[ns] = won.result()
+            elif all(f.done() for f in futs):
+                if deadline is not None and time.monotonic() >= deadline:
+                    continue  # the request timeout fired at the deadline: reported as timed out below
+                out[ns] = futs[-1].exception()
+            else:
+                continue
+            del attempts[ns]
+            for f in futs:
+                f.cancel()
+        if not attempts:
+            break
+        if timeout_s and now >= timeout_s:
+            for ns, futs in attempts.items():
+                for f in futs:
+                    f.cancel()
+                metrics.setdefault("timed_out", []).append(ns)
+            break
+        if hedge_s and now >= hedge_s:
+            for ns, futs in attempts.items():
+                if len(futs) == 1:
+                    futs.append(pool.submit(_query_by, index, deadline, calls[ns]))
+                    metrics.setdefault("hedged", []).append(ns)
+        # sleep until an answer arrives or the next hedge / deadline is due
+        due = [timeout_s] if timeout_s else []
+        if hedge_s and any(len(futs) == 1 for futs in attempts.values()):
+            due.append(hedge_s)
+        due = [t for t in due if t > now]
+        wait([f for futs in attempts.values() for f in futs],
+             timeout=(min(due) - now) if due else None, return_when=FIRST_COMPLETED)
+    return out
+
+def _namespace_calls(vector, namespaces, top_k, flt) -> Dict[str, Dict[str, Any]]:
+    calls: Dict[str, Dict[str, Any]] = {}
+    for ns in dict.fromkeys(namespaces):
+        kwargs: Dict[str, Any] = {"vector": vector, "top_k": top_k, "include_metadata": True, "namespace": ns}
+        if flt:
+            kwargs["filter"] = flt
+        calls[ns] = kwargs
+    return calls
+
+def _collect_hits(calls: Dict[str, Any], responses: Dict[str, Any], metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
+    hits: List[Dict[str, Any]] = []
+    errors: List[Exception] = []
+    for ns in calls:
+        res = responses.get(ns)
+        if res is None:
+            continue  # timed out
+        if isinstance(res, Exception):
+            logger.warning("pinecone query failed for ns=%s: %s", ns, res)
+            metrics.setdefault("failed", []).append(ns)
+            errors.append(res)
+            continue
+        for m in res.matches or []:
+            mem_id = _memory_id(m)
+            if not mem_id:
+                continue
+            hits.append({
+                "memory_id": mem_id,
+                "vector_id": m.id,
+                "namespace": ns,
+                "score": float(m.score or 0.0),
+                "metadata": m.metadata or {},
+            })
+    if errors and len(errors) == len(calls):
+        raise errors[-1]
+    if metrics.get("timed_out"):
+        logger.warning("pinecone query timed out for ns=%s", ",".join(metrics["timed_out"]))
+    return hits
+
+def query_namespaces(
+    index,
+    vector: List[float],
+    namespaces: Sequence[str] = NAMESPACES,
+    top_k: int = 8,
+    flt: Optional[Dict[str, Any]] = None,
+    metrics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Hits {memory_id, vector_id, namespace, score, metadata} from every namespace, same vector.
+    Namespaces are queried concurrently (RETRIEVAL_CONCURRENT=false: one after another, no deadline).
+    A failing namespace is logged and skipped (metrics["failed"]); a slow one is dropped at its
+    deadline (metrics["timed_out"]). If every namespace fails outright, the error is raised.
+    """
+    metrics = metrics if metrics is not None else {}
+    calls = _namespace_calls(vector, namespaces, top_k, flt)
+    if os.getenv("RETRIEVAL_CONCURRENT", "true").lower() == "true":
+        responses = _fan_out(index, calls, metrics)
+    else:
+        responses = {}
+        for ns, kw in calls.items():
+            try:
+                responses[ns] = safe_query(index, **kw)
+            except Exception as e:
+                responses[ns] = e
+    return _collect_hits(calls, responses, metrics)
+
+def _hydrate_query(sb, ids: List[str], include_text: bool):
+    cols = list(ROW_COLUMNS) + ([text_column()] if include_text else [])
+    return sb.table("memories").select(",".join(dict.fromkeys(cols))).in_("id", ids).limit(len(ids))
+
+def _rows_by_id(rows, include_text: bool) -> Dict[str, Dict[str, Any]]:
+    data = rows.data if hasattr(rows, "data") else rows.get("data") or []
+    text_col = text_column()
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in data:
+        if include_text:
+            r["text"] = r.get(text_col) or ""
+        out[r["id"]] = r
+    return out
+
+def hydrate(sb, ids: Iterable[str], include_text: bool = True) -> Dict[str, Dict[str, Any]]:
+    """id -> memories row (ROW_COLUMNS, plus `text` from MEMORIES_TEXT_COLUMN), one `in_` query."""
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return {}
+    return _rows_by_id(_hydrate_query(sb, ids, include_text).execute(), include_text)
+
+def _merge(hits: List[Dict[str, Any]], rows: Dict[str, Dict[str, Any]], limit: Optional[int]) -> List[Dict[str, Any]]:
+    hits.sort(key=lambda h: h["score"], reverse=True)
+    out: List[Dict[str, Any]] = []
+    seen = set()
+    for h in hits:
+        r = rows.get(h["memory_id"])
+        if not r or h["memory_id"] in seen:
+            continue
+        seen.add(h["memory_id"])
+        out.append({
+            **r,
+            "id": r["id"],
+            "memory_id": h["memory_id"],
+            "vector_id": h["vector_id"],
+            "namespace": h["namespace"],
+            "score": h["score"],
+            "metadata": h["metadata"],
+            "tags": r.get("tags") or [],
+        })
+        if limit and len(out) >= limit:
+            break
+    return out
+
+def retrieve(
+    sb,
+    index,
+    query: str,
+    *,
+    namespaces: Sequence[str] = NAMESPACES,
+    top_k_per_ns: int = 8,
+    limit: Optional[int] = None,
+    flt: Optional[Dict[str, Any]] = None,
+    include_text: bool = True,
+    metrics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    One embedding, one concurrent query per namespace, one hydration query. Returns hits that
+    still have a `memories` row, best score first (a memory found in several namespaces is kept
+    once), as {id, memory_id, vector_id, namespace, score, metadata, type, title, tags,
+    created_at, source, text}. A given `metrics` dict gets ms plus any timed_out / failed /
+    hedged namespaces.
+    """
+    metrics = metrics if metrics is not None else {}
+    t0 = time.monotonic()
+    vec = embed_query(query)
+    hits = query_namespaces(index, vec, namespaces, top_k_per_ns, flt, metrics)
+    rows = hydrate(sb, (h["memory_id"] for h in hits), include_text)
+    metrics["ms"] = int((time.monotonic() - t0) * 1000)
+    return _merge(hits, rows, limit)
+
+# ---------- asyncio variant (async OpenAI / Pinecone / Supabase clients) ----------
+
+async def aembed_query(text: str) -> List[float]:
+    """embed_query on the async OpenAI client; same model, dimensions and embedding cache."""
+    kw = embed_kwargs()
+    # the SQLite cache blocks and shares its lock with ingest threads: never touch it on the event loop
+    cache = await asyncio.to_thread(get_cache)
+    key = cache_key(text, kw["model"], kw.get("dimensions")) if cache else None
+    if cache:
+        hit = (await asyncio.to_thread(cache.get_many, [key])).get(key)
+        if hit:
+            return hit
+    resp = await get_async_openai().embeddings.create(input=[text], **kw)
+    vec = resp.data[0].embedding
+    if not vec:
+        raise RuntimeError("embedding unavailable")
+    if cache:
+        await asyncio.to_thread(cache.put_many, {key: vec}, kw["model"], kw.get("dimensions"))
+    return vec
+
+async def _afan_out(index, calls: Dict[str, Dict[str, Any]], metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """_fan_out as coroutines: same RETRIEVAL_NS_TIMEOUT_MS deadline and RETRIEVAL_HEDGE_MS hedge."""
+    timeout_s = _env_ms("RETRIEVAL_NS_TIMEOUT_MS", 2500)
+    hedge_s = _env_ms("RETRIEVAL_HEDGE_MS", 0)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_s if timeout_s else None
+
+    def query(ns: str):
+        # the request timeout also frees the thread a sync index's query runs on
+        left = max(0.001, deadline - loop.time()) if deadline is not None else None
+        return asyncio.ensure_future(safe_query_async(index, timeout=left, **calls[ns]))
+
+    async def first_answer(ns: str):
+        tasks = [query(ns)]
+        try:
+            if hedge_s:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_s)
+                if not done:
+                    tasks.append(query(ns))
+                    metrics.setdefault("hedged", []).append(ns)
+            pending = tasks
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                won = next((t for t in done if t.exception() is None), None)
+                if won is not None:
+                    return won.result()
+                if not pending:
+                    return next(iter(done)).exception()
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def bounded(ns: str):
+        try:
+            res = await asyncio.wait_for(first_answer(ns), timeout_s or None)
+        except asyncio.TimeoutError:
+            res = None
+        else:
+            if not (isinstance(res, Exception) and deadline is not None and loop.time() >= deadline):
+                return res
+        metrics.setdefault("timed_out", []).append(ns)
+        return None
+
+    results = await asyncio.gather(*(bounded(ns) for ns in calls))
+    return dict(zip(calls, results))
+
+async def aquery_namespaces(
+    index,
+    vector: List[float],
+    namespaces: Sequence[str] = NAMESPACES,
+    top_k: int = 8,
+    flt: Optional[Dict[str, Any]] = None,
+    metrics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """query_namespaces for an async index (vendors.pinecone_client.get_async_index)."""
+    metrics = metrics if metrics is not None else {}
+    calls = _namespace_calls(vector, namespaces, top_k, flt)
+    return _collect_hits(calls, await _afan_out(index, calls, metrics), metrics)
+
+async def ahydrate(sb, ids: Iterable[str], include_text: bool = True) -> Dict[str, Dict[str, Any]]:
+    """hydrate with a supabase AsyncClient (a sync client is run on a thread)."""
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return {}
+    q = _hydrate_query(sb, ids, include_text)
+    if inspect.iscoroutinefunction(q.execute):
+        rows = await q.execute()
+    else:
+        rows = await asyncio.to_thread(q.execute)
+    return _rows_by_id(rows, include_text)
+
+async def aretrieve(
+    sb,
+    index,
+    query: str,
+    *,
+    namespaces: Sequence[str] = NAMESPACES,
+    top_k_per_ns: int = 8,
+    limit: Optional[int] = None,
+    flt: Optional[Dict[str, Any]] = None,
+    include_text: bool = True,
+    metrics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """retrieve() without blocking the event loop; same items and metrics."""
+    metrics = metrics if metrics is not None else {}
+    t0 = time.monotonic()
+    vec = await aembed_query(query)
+    hits = await aquery_namespaces(index, vec, namespaces, top_k_per_ns, flt, metrics)
+    rows = await ahydrate(sb, (h["memory_id"] for h in hits), include_text)
+    metrics["ms"] = int((time.monotonic() - t0) * 1000)
+    return _merge(hits, rows, limit)
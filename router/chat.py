@@ -1,19 +1,24 @@
 # router/chat.py
 import os
 import json
+import asyncio
 import datetime
 from uuid import uuid4
 from typing import Optional, List, Dict, Any, Literal
 
 from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, ConfigDict, model_validator
 from openai import OpenAI
 
-from vendors.supabase_client import get_client
-from vendors.pinecone_client import get_index, safe_query
+from vendors.openai_client import get_async_client as get_async_openai
+from vendors.supabase_client import get_client, get_async_client
+from vendors.pinecone_client import get_index, get_async_index
 from ingest.pipeline import normalize_text
+from memory.retrieval import aretrieve, retrieve
 from memory.autosave import apply_autosave
-from guardrails.redteam import review_answer
+from memory.chat_jobs import after_response_enabled, autosave_status, get_chat_jobs
+from guardrails.redteam import areview_answer, review_answer
 from auth.light_identity import ensure_user  # <-- attribution helper
 from memory.graph import expand_entities
 from extractors.signals import extract_signals_from_text  # <-- NEW: fallback extractor
@@ -63,101 +68,21 @@ def _auth(x_api_key: Optional[str]):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 
-def _embed(text: str) -> List[float]:
-    kwargs: Dict[str, Any] = {"model": os.getenv("EMBED_MODEL", "text-embedding-3-small"), "input": text}
-    dim = os.getenv("EMBED_DIM")
-    if dim:
-        kwargs["dimensions"] = int(dim)
-    er = client.embeddings.create(**kwargs)
-    return er.data[0].embedding
-
-
-def _retrieve(sb, index, query: str, top_k_per_type: int = 8) -> List[Dict[str, Any]]:
-    vec = _embed(query)
-    namespaces = ["semantic", "episodic", "procedural"]
-    hits: List[Dict[str, Any]] = []
-
-    for ns in namespaces:
-        res = safe_query(index, vector=vec, top_k=top_k_per_type, include_metadata=True, namespace=ns)
-        for m in res.matches:
-            md = m.metadata or {}
-            mem_id = (md.get("id") or (m.id or "")).replace("mem_", "")
-            if not mem_id:
-                continue
-            hits.append({"memory_id": mem_id, "namespace": ns, "score": float(m.score or 0.0)})
-
-    ids = list({h["memory_id"] for h in hits})
-    by_id: Dict[str, Dict[str, Any]] = {}
-    if ids:
-        rows = (
-            sb.table("memories")
-            .select("id,type,title,tags,created_at")
-            .in_("id", ids)
-            .limit(len(ids))
-            .execute()
-        )
-        data = rows.data if hasattr(rows, "data") else rows.get("data") or []
-        by_id = {r["id"]: r for r in data}
-
-    out: List[Dict[str, Any]] = []
-    for h in hits:
-        r = by_id.get(h["memory_id"])
-        if not r:
-            continue
-        out.append(
-            {
-                "id": r["id"],
-                "type": r["type"],
-                "title": r.get("title"),
-                "tags": r.get("tags") or [],
-                "created_at": r.get("created_at"),
-                "score": h["score"],
-            }
-        )
-
-    out.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-    return out[:12]
-
-
-def _pack_context(sb, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    if not items:
-        return []
-
-    ids = [it["id"] for it in items]
-    text_col = (os.getenv("MEMORIES_TEXT_COLUMN", "text")).strip().lower()
-
-    # Only fetch what actually exists in 'memories'
-    rows = sb.table("memories").select(f"id,title,type,{text_col}") \
-              .in_("id", ids).limit(len(ids)).execute()
-
-    data = rows.data if hasattr(rows, "data") else rows.get("data") or []
-    by_id = {r["id"]: r for r in data}
-
+def _pack_context(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Label each retrieved memory's text with its type for the answerer."""
     out: List[Dict[str, Any]] = []
     for it in items:
-        r = by_id.get(it["id"])
-        if not r:
-            continue
-
-        mem_type = (r.get("type") or "semantic").upper()
-        raw_text = r.get(text_col) or ""
-        norm_text = normalize_text(raw_text)
-
-        # Label the text with its memory type
-        labeled_text = f"[{mem_type} MEMORY] {norm_text}"
-
+        mem_type = (it.get("type") or "semantic").upper()
         out.append({
             "id": it["id"],
-            "title": r.get("title") or "",
-            "text": labeled_text,
-            "type": mem_type
+            "title": it.get("title") or "",
+            "text": f"[{mem_type} MEMORY] {normalize_text(it.get('text') or '')}",
+            "type": mem_type,
         })
-
     return out
 
 
-def _answer_json(prompt: str, context_str: str) -> Dict[str, Any]:
-    sys = """You are SUAPS Brain. Be concise and specific. Mentor tone: strategic, supportive.
+ANSWER_SYS = """You are SUAPS Brain. Be concise and specific. Mentor tone: strategic, supportive.
     Always ground answers in SUAPS data. Cite the memory IDs you used.
 
     You will see different types of memory in context:
@@ -171,58 +96,52 @@ def _answer_json(prompt: str, context_str: str) -> Dict[str, Any]:
     {...}
     """
 
+
+def _answer_request(prompt: str, context_str: str) -> Dict[str, Any]:
     user = json.dumps({"question": prompt, "context": context_str})
-    r = client.chat.completions.create(
-        model=os.getenv("CHAT_MODEL", "gpt-4.1-mini"),
-        messages=[{"role": "system", "content": sys}, {"role": "user", "content": user}],
-        temperature=0,
-    )
+    return {
+        "model": os.getenv("CHAT_MODEL", "gpt-4.1-mini"),
+        "messages": [{"role": "system", "content": ANSWER_SYS}, {"role": "user", "content": user}],
+        "temperature": 0,
+    }
+
+
+def _answer_json(prompt: str, context_str: str) -> Dict[str, Any]:
+    r = client.chat.completions.create(**_answer_request(prompt, context_str))
     raw = r.choices[0].message.content or "{}"
     return json.loads(raw)
 
 
+async def _aanswer_json(prompt: str, context_str: str) -> Dict[str, Any]:
+    r = await get_async_openai().chat.completions.create(**_answer_request(prompt, context_str))
+    raw = r.choices[0].message.content or "{}"
+    return json.loads(raw)
 
-# ---------- Route ----------
-@router.post("/chat", response_model=ChatResp)
-def chat_chat_post(
-    body: ChatReq,
-    x_api_key: Optional[str] = Header(None),
-    x_user_email: Optional[str] = Header(None),  # attribution header
-):
-    _auth(x_api_key)
-    sb = get_client()
-    index = get_index()
-    t0 = datetime.datetime.utcnow()
 
-    # Resolve/ensure user (best-effort)
-    author_user_id = ensure_user(sb=sb, email=x_user_email)
+def _latency_ms(t0: datetime.datetime) -> int:
+    return int((datetime.datetime.utcnow() - t0).total_seconds() * 1000)
+
+
+def _ensure_session(sb, session_id: Optional[str], author_user_id: Optional[str]) -> str:
+    if session_id:
+        return session_id
+    # Try DB-generated id
+    payload = {"title": None}
+    if author_user_id:
+        payload["user_id"] = author_user_id
+    try:
+        sb.table("sessions").insert(payload).execute()
+        sel = sb.table("sessions").select("id").order("created_at", desc=True).limit(1).execute()
+        data = sel.data if hasattr(sel, "data") else sel.get("data") or []
+        if data:
+            session_id = data[0]["id"]
+    except Exception:
+        # Local fallback
+        session_id = str(uuid4())
+    return session_id
 
-    # Ensure a session id
-    session_id = body.session_id
-    if not session_id:
-        # Try DB-generated id
-        payload = {"title": None}
-        if author_user_id:
-            payload["user_id"] = author_user_id
-        try:
-            sb.table("sessions").insert(payload).execute()
-            sel = sb.table("sessions").select("id").order("created_at", desc=True).limit(1).execute()
-            data = sel.data if hasattr(sel, "data") else sel.get("data") or []
-            if data:
-                session_id = data[0]["id"]
-        except Exception:
-            # Local fallback
-            session_id = str(uuid4())
-
-    # Retrieval
-    retrieved_meta = _retrieve(
-        sb,
-        index,
-        body.prompt,
-        top_k_per_type=int(os.getenv("TOPK_PER_TYPE", "8"))
-    )
-    retrieved_chunks = _pack_context(sb, retrieved_meta)
 
+def _with_graph(sb, retrieved_chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # 🔗 Graph Expansion (3 hops) - non-fatal
     try:
         graph_neighbors = expand_entities(sb, retrieved_chunks, max_hops=3, max_neighbors=10, max_per_entity=3)
@@ -230,15 +149,10 @@ def chat_chat_post(
     except Exception as e:
         # non-fatal: log or ignore if graph expansion fails
         print("Graph expansion failed:", e)
+    return retrieved_chunks
 
-    # Build context string with memory-type labels
-    context_for_llm = "\n".join(chunk["text"] for chunk in retrieved_chunks)
-
-    # Collect just the IDs (for schema validation of "citations")
-    context_ids = [chunk["id"] for chunk in retrieved_chunks]
 
-    # Answer
-    draft = _answer_json(body.prompt, context_for_llm)
+def _checked_draft(draft: Any) -> Dict[str, Any]:
     if not isinstance(draft, dict):
         raise HTTPException(status_code=500, detail="Answerer returned non-JSON")
 
@@ -247,83 +161,112 @@ def chat_chat_post(
         draft["citations"] = [
             c if isinstance(c, str) else c.get("id") for c in draft["citations"]
         ]
+    return draft
 
-    # Red-team (non-fatal)
-    try:
-        verdict = review_answer(
-            draft_json=draft,
-            prompt=body.prompt,
-            retrieved_chunks=retrieved_chunks
-        ) or {}
-    except Exception:
-        verdict = {"action": "allow", "reasons": []}
-    action = (verdict.get("action") or "allow").lower()
 
-    if action == "block":
-        return {
-            "session_id": session_id,
-            "answer": "I can’t answer confidently with the available evidence. Try adding filters or uploading the source.",
-            "citations": [],
-            "guidance_questions": ["Do you want me to search with a narrower tag or date range?"],
-            "autosave": {"saved": False, "items": []},
-            "redteam": verdict,
-            "metrics": {"latency_ms": int((datetime.datetime.utcnow() - t0).total_seconds() * 1000)},
-        }
-
-    # -----------------------
-    # Autosave (non-fatal) with robust fallback
-    # -----------------------
-    try:
-        # Prefer LLM-provided autosave candidates
-        candidates = (draft.get("autosave_candidates") or []).copy()
-
-        # If none, derive from USER + ASSISTANT + small CONTEXT sample
-        if not candidates:
-            sample_ctx = "\n\n".join(
-                [(c.get("text") or "")[:1200] for c in (retrieved_chunks[:2] if retrieved_chunks else [])]
-            )
-            fallback_text = (
-                f"USER:\n{(body.prompt or '')[:4000]}\n\n"
-                f"ASSISTANT:\n{(draft.get('answer') or '')[:4000]}\n\n"
-                f"CONTEXT:\n{sample_ctx}"
-            )
-            derived = extract_signals_from_text(fallback_text) or []
-
-            # Tag derived items with provenance + session for traceability
-            for d in derived:
-                tags = set(d.get("tags") or [])
-                tags.update({"source:chat", f"session:{session_id}"})
-                d["tags"] = sorted(list(tags))
-            candidates.extend(derived)
-
-        autosave = apply_autosave(
-            sb=sb,
-            pinecone_index=index,
-            candidates=candidates,
-            session_id=session_id,
-            text_col_env=os.getenv("MEMORIES_TEXT_COLUMN", "text"),
-            author_user_id=author_user_id,  # pass attribution
+def _blocked_response(session_id: str, verdict: Dict[str, Any], metrics: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "session_id": session_id,
+        "answer": "I can’t answer confidently with the available evidence. Try adding filters or uploading the source.",
+        "citations": [],
+        "guidance_questions": ["Do you want me to search with a narrower tag or date range?"],
+        "autosave": {"saved": False, "items": []},
+        "redteam": verdict,
+        "metrics": metrics,
+    }
+
+
+def _run_autosave(sb, index, prompt: str, draft: Dict[str, Any], retrieved_chunks: List[Dict[str, Any]],
+                  session_id: str, author_user_id: Optional[str]) -> Dict[str, Any]:
+    # Prefer LLM-provided autosave candidates
+    candidates = (draft.get("autosave_candidates") or []).copy()
+
+    # If none, derive from USER + ASSISTANT + small CONTEXT sample
+    if not candidates:
+        sample_ctx = "\n\n".join(
+            [(c.get("text") or "")[:1200] for c in (retrieved_chunks[:2] if retrieved_chunks else [])]
+        )
+        fallback_text = (
+            f"USER:\n{(prompt or '')[:4000]}\n\n"
+            f"ASSISTANT:\n{(draft.get('answer') or '')[:4000]}\n\n"
+            f"CONTEXT:\n{sample_ctx}"
         )
+        derived = extract_signals_from_text(fallback_text) or []
+
+        # Tag derived items with provenance + session for traceability
+        for d in derived:
+            tags = set(d.get("tags") or [])
+            tags.update({"source:chat", f"session:{session_id}"})
+            d["tags"] = sorted(list(tags))
+        candidates.extend(derived)
+
+    return apply_autosave(
+        sb=sb,
+        pinecone_index=index,
+        candidates=candidates,
+        session_id=session_id,
+        text_col_env=os.getenv("MEMORIES_TEXT_COLUMN", "text"),
+        author_user_id=author_user_id,  # pass attribution
+        source="chat",
+    )
+
+
+def _autosave(sb, index, prompt: str, draft: Dict[str, Any], retrieved_chunks: List[Dict[str, Any]],
+              session_id: str, author_user_id: Optional[str]) -> Dict[str, Any]:
+    """Autosave (non-fatal) with robust fallback."""
+    try:
+        return _run_autosave(sb, index, prompt, draft, retrieved_chunks, session_id, author_user_id)
     except Exception:
-        autosave = {"saved": False, "items": []}
+        return {"saved": False, "items": []}
+
 
+def _persist_messages(sb, session_id: str, prompt: str, answer: str, latency_ms: int) -> None:
     # Persist messages (best-effort)
     try:
         sb.table("messages").insert(
-            {"session_id": session_id, "role": "user", "content": body.prompt, "model": os.getenv("CHAT_MODEL")}
+            {"session_id": session_id, "role": "user", "content": prompt, "model": os.getenv("CHAT_MODEL")}
         ).execute()
         sb.table("messages").insert(
             {
                 "session_id": session_id,
                 "role": "assistant",
-                "content": draft.get("answer") or "",
+                "content": answer,
                 "model": os.getenv("CHAT_MODEL"),
-                "latency_ms": int((datetime.datetime.utcnow() - t0).total_seconds() * 1000),
+                "latency_ms": latency_ms,
             }
         ).execute()
     except Exception:
         pass
 
+
+def _after_response(sb, prompt: str, draft: Dict[str, Any], retrieved_chunks: List[Dict[str, Any]],
+                    session_id: str, author_user_id: Optional[str], latency_ms: int) -> Dict[str, Any]:
+    """
+    Message inserts and autosave (signal extraction, importance classification, ingest) do not
+    change the answer, so they are queued on the chat job registry and the response carries
+    {"status": "pending", "id"} for GET /chat/autosave/{id}. With CHAT_AFTER_RESPONSE=false, or
+    while the queue is full, they run here as before and the autosave block is final.
+    """
+    answer = draft.get("answer") or ""
+    persist = lambda *_: _persist_messages(sb, session_id, prompt, answer, latency_ms)
+    # background errors surface as status "failed" instead of an empty autosave
+    save = lambda *_: _run_autosave(sb, get_index(), prompt, draft, retrieved_chunks, session_id, author_user_id)
+
+    if after_response_enabled():
+        jobs = get_chat_jobs()
+        meta = {"session_id": session_id}
+        if jobs.try_submit("chat_messages", persist, meta) is None:
+            persist()
+        job = jobs.try_submit("chat_autosave", save, meta)
+        if job is not None:
+            return {"status": "pending", "id": job.id, "saved": False, "items": []}
+    else:
+        persist()
+    return {**_autosave(sb, get_index(), prompt, draft, retrieved_chunks, session_id, author_user_id), "status": "done"}
+
+
+def _response(session_id: str, draft: Dict[str, Any], autosave: Dict[str, Any], verdict: Dict[str, Any],
+              metrics: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "session_id": session_id,
         "answer": draft.get("answer") or "",
@@ -331,5 +274,127 @@ def chat_chat_post(
         "guidance_questions": draft.get("guidance_questions") or [],
         "autosave": autosave,
         "redteam": verdict,
-        "metrics": {"latency_ms": int((datetime.datetime.utcnow() - t0).total_seconds() * 1000)},
+        "metrics": metrics,
     }
+
+
+# ---------- Chat turn: sync (threadpool) ----------
+def _chat_sync(body: ChatReq, x_api_key: Optional[str], x_user_email: Optional[str]) -> Dict[str, Any]:
+    _auth(x_api_key)
+    sb = get_client()
+    index = get_index()
+    t0 = datetime.datetime.utcnow()
+
+    # Resolve/ensure user (best-effort), then a session id
+    author_user_id = ensure_user(sb=sb, email=x_user_email)
+    session_id = _ensure_session(sb, body.session_id, author_user_id)
+
+    # Retrieval: one query embedding, namespaces queried concurrently, one memories round trip
+    retrieval_metrics: Dict[str, Any] = {}
+    retrieved = retrieve(
+        sb,
+        index,
+        body.prompt,
+        top_k_per_ns=int(os.getenv("TOPK_PER_TYPE", "8")),
+        limit=12,
+        metrics=retrieval_metrics,
+    )
+    retrieved_chunks = _with_graph(sb, _pack_context(retrieved))
+
+    # Build context string with memory-type labels
+    context_for_llm = "\n".join(chunk["text"] for chunk in retrieved_chunks)
+
+    # Answer
+    draft = _checked_draft(_answer_json(body.prompt, context_for_llm))
+
+    # Red-team (non-fatal)
+    try:
+        verdict = review_answer(
+            draft_json=draft,
+            prompt=body.prompt,
+            retrieved_chunks=retrieved_chunks
+        ) or {}
+    except Exception:
+        verdict = {"action": "allow", "reasons": []}
+    action = (verdict.get("action") or "allow").lower()
+
+    if action == "block":
+        return _blocked_response(session_id, verdict, {"latency_ms": _latency_ms(t0), "retrieval": retrieval_metrics})
+
+    autosave = _after_response(sb, body.prompt, draft, retrieved_chunks, session_id, author_user_id, _latency_ms(t0))
+
+    return _response(session_id, draft, autosave, verdict, {"latency_ms": _latency_ms(t0), "retrieval": retrieval_metrics})
+
+
+# ---------- Chat turn: async (event loop) ----------
+async def _chat_async(body: ChatReq, x_api_key: Optional[str], x_user_email: Optional[str]) -> Dict[str, Any]:
+    """
+    The same turn on the asyncio OpenAI / Pinecone / Supabase clients, so a worker holds many
+    chats while they wait on vendors. Helpers that only exist sync (user/session rows, graph
+    expansion, queueing the after-response work) run on the threadpool.
+    """
+    _auth(x_api_key)
+    sb = get_client()
+    t0 = datetime.datetime.utcnow()
+    asb, aindex = await asyncio.gather(get_async_client(), get_async_index())
+
+    async def identity():
+        author_user_id = await run_in_threadpool(ensure_user, sb=sb, email=x_user_email)
+        return author_user_id, await run_in_threadpool(_ensure_session, sb, body.session_id, author_user_id)
+
+    # User/session bookkeeping and retrieval do not depend on each other
+    retrieval_metrics: Dict[str, Any] = {}
+    (author_user_id, session_id), retrieved = await asyncio.gather(
+        identity(),
+        aretrieve(
+            asb,
+            aindex,
+            body.prompt,
+            top_k_per_ns=int(os.getenv("TOPK_PER_TYPE", "8")),
+            limit=12,
+            metrics=retrieval_metrics,
+        ),
+    )
+    retrieved_chunks = await run_in_threadpool(_with_graph, sb, _pack_context(retrieved))
+    context_for_llm = "\n".join(chunk["text"] for chunk in retrieved_chunks)
+
+    draft = _checked_draft(await _aanswer_json(body.prompt, context_for_llm))
+
+    try:
+        verdict = await areview_answer(draft_json=draft, prompt=body.prompt, retrieved_chunks=retrieved_chunks) or {}
+    except Exception:
+        verdict = {"action": "allow", "reasons": []}
+    if (verdict.get("action") or "allow").lower() == "block":
+        return _blocked_response(session_id, verdict, {"latency_ms": _latency_ms(t0), "retrieval": retrieval_metrics})
+
+    # queueing is instant; the threadpool only matters when the work has to run inline
+    autosave = await run_in_threadpool(
+        _after_response, sb, body.prompt, draft, retrieved_chunks, session_id, author_user_id, _latency_ms(t0)
+    )
+    return _response(session_id, draft, autosave, verdict, {"latency_ms": _latency_ms(t0), "retrieval": retrieval_metrics})
+
+
+# ---------- Route ----------
+@router.post("/chat", response_model=ChatResp)
+async def chat_chat_post(
+    body: ChatReq,
+    x_api_key: Optional[str] = Header(None),
+    x_user_email: Optional[str] = Header(None),  # attribution header
+):
+    # CHAT_ASYNC=false: the blocking turn on the threadpool, as before
+    if os.getenv("CHAT_ASYNC", "true").lower() != "true":
+        return await run_in_threadpool(_chat_sync, body, x_api_key, x_user_email)
+    return await _chat_async(body, x_api_key, x_user_email)
+
+
+@router.get("/chat/autosave/{autosave_id}")
+def chat_autosave_get(autosave_id: str, x_api_key: Optional[str] = Header(None)):
+    """Final autosave result for a chat answered with autosave.status == "pending"."""
+    _auth(x_api_key)
+    job = get_chat_jobs().get(autosave_id)
+    if job is None or job.kind != "chat_autosave":
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown or expired autosave id (ids only resolve on the worker that answered the chat)",
+        )
+    return autosave_status(job)
@@ -6,6 +6,7 @@ from pydantic import BaseModel
 
 from vendors.supabase_client import get_client
 from vendors.pinecone_client import get_index, safe_query
+from ingest.embed_cache import cache_summary
 
 router = APIRouter()
 
@@ -79,6 +80,7 @@ def debug_selftest_get(x_api_key: Optional[str] = Header(None)):
         "pinecone_roundtrip": ok_round,
         "latency_ms": lat,
     }
+
 def _embedding_dim(client, model, dim_override=None):
     # create a tiny embedding to measure the real output size
     kwargs = {"model": model, "input": "dimension check"}
@@ -100,3 +102,10 @@ def selftest():
     if dim != index_dim:
         return {"ok": False, "error": f"Embedding dim {dim} != Pinecone index dim {index_dim}"}
     return {"ok": True, "embedding_dim": dim, "index_dim": index_dim}
+
+
+@router.get("/debug/embed_cache")
+def debug_embed_cache(x_api_key: Optional[str] = Header(None)):
+    """Embedding cache size and hit/miss counters since process start."""
+    _auth(x_api_key)
+    return cache_summary()
@@ -9,6 +9,9 @@ from vendors.supabase_client import get_client
 from vendors.pinecone_client import get_index
 from ingest.pipeline import upsert_memories_from_chunks, normalize_text
 from auth.light_identity import ensure_user
+from ingest.jobs import get_registry
+from ingest.file_dedupe import ingest_failures
+from ingest.journal import journal_key, open_journal
 
 router = APIRouter()
 
@@ -35,6 +38,21 @@ def _auth(x_api_key: Optional[str]):
     if expected and x_api_key != expected:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
+@router.get("/ingest/jobs/{job_id}")
+def ingest_job_status(job_id: str, x_api_key: Optional[str] = Header(None)):
+    """Status, current stage and per-stage counts of a background ingest job (e.g. from /upload)."""
+    _auth(x_api_key)
+    job = get_registry().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found (finished jobs expire; ids are per server process)")
+    return job.snapshot()
+
+@router.get("/ingest/jobs")
+def ingest_jobs_list(limit: int = 50, x_api_key: Optional[str] = Header(None)):
+    _auth(x_api_key)
+    reg = get_registry()
+    return {"max_concurrent": reg.max_workers, "counts": reg.counts(), "items": reg.list(max(1, min(limit, 500)))}
+
 @router.post("/ingest/batch", response_model=IngestBatchResponse)
 def ingest_batch_ingest_batch_post(body: IngestBatchRequest, x_api_key: Optional[str] = Header(None), x_user_email: Optional[str] = Header(None),):
     _auth(x_api_key)
@@ -66,6 +84,9 @@ def ingest_batch_ingest_batch_post(body: IngestBatchRequest, x_api_key: Optional
     all_updated: List[Dict[str, Any]] = []
     all_skipped: List[Dict[str, Any]] = []
 
+    # same items resubmitted after a crash resume from the journal
+    journal = open_journal(journal_key("batch", file_id, *(f"{t}:{x}" for t, xs in by_type.items() for x in xs)))
+
     for ttype, texts in by_type.items():
         if not texts:
             continue
@@ -82,9 +103,13 @@ def ingest_batch_ingest_batch_post(body: IngestBatchRequest, x_api_key: Optional
             source=source,
             text_col_env=os.getenv("MEMORIES_TEXT_COLUMN", "text"),
             author_user_id=author_user_id,
+            journal=journal,
         )
         all_upserted.extend(resp.get("upserted", []))
         all_updated.extend(resp.get("updated", []))
         all_skipped.extend(resp.get("skipped", []))
 
+    # failed chunks keep the journal, so resubmitting the same items resumes and repairs them
+    if journal and not ingest_failures({"skipped": all_skipped}):
+        journal.complete()
     return {"upserted": all_upserted, "updated": all_updated, "skipped": all_skipped}
@@ -4,13 +4,12 @@ from typing import Optional, List, Dict, Any
 
 from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel, Field, model_validator, ConfigDict
-from openai import OpenAI
 
 from vendors.supabase_client import get_client
-from vendors.pinecone_client import get_index, safe_query
+from vendors.pinecone_client import get_index
+from memory.retrieval import NAMESPACES, retrieve
 
 router = APIRouter()
-client = OpenAI()
 
 # ---------- Models ----------
 class SearchReq(BaseModel):
@@ -41,6 +40,8 @@ class SearchItem(BaseModel):
 
 class SearchResp(BaseModel):
     items: List[SearchItem]
+    # retrieval timing: ms, plus timed_out / failed / hedged namespaces when any
+    metrics: Optional[Dict[str, Any]] = None
 
 # ---------- Auth helper ----------
 def _auth(x_api_key: Optional[str]):
@@ -48,18 +49,6 @@ def _auth(x_api_key: Optional[str]):
     if expected and x_api_key != expected:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
-# ---------- Embedding helper ----------
-def _embed(text: str) -> List[float]:
-    kwargs: Dict[str, Any] = {
-        "model": os.getenv("EMBED_MODEL", "text-embedding-3-small"),
-        "input": text,
-    }
-    dim = os.getenv("EMBED_DIM")
-    if dim:
-        kwargs["dimensions"] = int(dim)
-    er = client.embeddings.create(**kwargs)
-    return er.data[0].embedding
-
 # ---------- Core semantic search ----------
 @router.post("/search/semantic", response_model=SearchResp)
 def search_semantic_post(body: SearchReq, x_api_key: Optional[str] = Header(None)):
@@ -67,49 +56,30 @@ def search_semantic_post(body: SearchReq, x_api_key: Optional[str] = Header(None
     if not body.q or not body.q.strip():
         raise HTTPException(status_code=400, detail="Missing query string")
 
-    sb = get_client()
-    index = get_index()
-
-    qvec = _embed(body.q)
-    types = body.type or ["semantic", "episodic", "procedural"]
-
-    matches: List[Dict[str, Any]] = []
-    for t in types:
-        res = safe_query(index, vector=qvec, top_k=body.top_k, include_metadata=True, namespace=t)
-        for m in (res.matches or []):
-            md = m.metadata or {}
-            mem_id = (md.get("id") or (m.id or "")).replace("mem_", "")
-            if not mem_id:
-                continue
-            matches.append({"memory_id": mem_id, "type": t, "score": float(m.score or 0.0)})
-
-    ids = list({m["memory_id"] for m in matches})
-    text_col = (os.getenv("MEMORIES_TEXT_COLUMN", "text")).strip().lower()
-    by_id: Dict[str, Dict[str, Any]] = {}
-
-    if ids:
-        sel_cols = f"id,type,title,{text_col}" if body.include_text else "id,type,title"
-        rows = sb.table("memories").select(sel_cols).in_("id", ids).limit(len(ids)).execute()
-        data = rows.data if hasattr(rows, "data") else rows.get("data") or []
-        by_id = {r["id"]: r for r in data}
-
-    out: List[Dict[str, Any]] = []
-    for m in matches:
-        r = by_id.get(m["memory_id"])
-        if not r:
-            continue
-        out.append(
+    metrics: Dict[str, Any] = {}
+    items = retrieve(
+        get_client(),
+        get_index(),
+        body.q,
+        namespaces=body.type or list(NAMESPACES),
+        top_k_per_ns=body.top_k,
+        limit=body.top_k,
+        include_text=body.include_text,
+        metrics=metrics,
+    )
+    return {
+        "items": [
             {
-                "id": r["id"],
-                "type": r["type"],
-                "title": r.get("title"),
-                "score": m["score"],
-                "text": r.get(text_col) if body.include_text else None,
+                "id": it["id"],
+                "type": it["type"],
+                "title": it.get("title"),
+                "score": it["score"],
+                "text": it.get("text") if body.include_text else None,
             }
-        )
-
-    out.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-    return {"items": out[: body.top_k]}
+            for it in items
+        ],
+        "metrics": metrics,
+    }
 
 # ---------- Aliases: make /search and /search/ work ----------
 @router.post("/search", response_model=SearchResp)
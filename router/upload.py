@@ -5,8 +5,17 @@ from fastapi import APIRouter, Header, HTTPException, UploadFile, File, Form
 
 from vendors.supabase_client import get_client
 from vendors.pinecone_client import get_index
-from ingest.converters import sniff_and_convert
-from ingest.pipeline import normalize_text, chunk_text, upsert_memories_from_chunks
+from ingest.converters import convert_offloaded
+from ingest.executors import run_blocking
+from ingest.file_dedupe import (
+    cached_conversion, duplicate_response, find_by_content_hash, ingest_failures, ingest_params,
+    record_result, result_record,
+)
+from ingest.pipeline import normalize_text, iter_chunks, iter_fulltext_chunks, upsert_memories_from_chunks
+from ingest.reingest import ReingestPlan, find_previous_file
+from ingest.jobs import IngestJob, get_registry
+from ingest.journal import journal_key, open_journal
+from ingest.spool import SpooledUpload, UploadTooLarge, spool_upload
 
 from extractors.signals import extract_signals_from_text
 from memory.autosave import apply_autosave
@@ -19,12 +28,25 @@ def _safe_len(x) -> int:
     except Exception:
         return 0
 
+def _stored_text(text: str) -> Optional[str]:
+    """
+    What goes into files.text_extracted: FILES_STORE_TEXT=false stores nothing,
+    FILES_TEXT_MAX_CHARS (default 0 = no limit) keeps only a prefix.
+    """
+    if os.getenv("FILES_STORE_TEXT", "true").lower() != "true":
+        return None
+    limit = int(os.getenv("FILES_TEXT_MAX_CHARS", "0"))
+    return text[:limit] if limit > 0 else text
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
     tags: Optional[str] = Form(None),             # csv or leave empty
     type: Optional[str] = Form("semantic"),       # semantic default
     extract_signals: Optional[bool] = Form(True), # <— NEW: control from Make
+    reingest: Optional[bool] = Form(False),       # diff against the previous version of this file (also bypasses whole-file dedupe)
+    file_id: Optional[str] = Form(None),          # re-ingest target (defaults to latest row with this filename)
+    wait: Optional[bool] = Form(None),            # false = queue a background job (default: inline, unless UPLOAD_ASYNC_DEFAULT=true)
     x_api_key: Optional[str] = Header(None),
 ):
     # --- auth guard ---
@@ -35,10 +57,98 @@ async def upload_file(
     if type not in ("semantic","episodic","procedural"):
         raise HTTPException(status_code=400, detail="type must be one of semantic|episodic|procedural")
 
-    # --- read & convert ---
-    raw = await file.read()
+    # --- copy the parsed part to our spool in UPLOAD_BLOCK_SIZE blocks, hashing it; the request body
+    #     itself was already capped at UPLOAD_MAX_BYTES by UploadBodyLimit (app.py) ---
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if wait is None:
+        # inline by default: existing clients (Make scenarios) read the full result from this response
+        wait = os.getenv("UPLOAD_ASYNC_DEFAULT", "false").lower() != "true"
+
+    # --- whole-file dedupe on the raw-bytes sha256 + upload parameters: a retry of a finished (or running) upload costs one lookup ---
+    tags_list: List[str] = [t.strip() for t in (tags or "").split(",") if t.strip()]
+    params = ingest_params(type, tags_list, bool(extract_signals))
+    if not reingest and not wait:
+        active = get_registry().find_active("upload", sha256=upload.sha256, params=params)
+        if active:
+            upload.cleanup()
+            return _queued_response(file, upload, active, duplicate=True)
+    try:
+        known = await run_blocking(find_by_content_hash, get_client(), upload.sha256)
+    except Exception:
+        known = None
+    if known and not reingest:
+        dup = duplicate_response(known, params)
+        if dup:
+            upload.cleanup()
+            return dup
+
+    args = dict(
+        upload=upload, type=type, tags=tags, extract_signals=extract_signals,
+        reingest=reingest, file_id=file_id, known=known,
+    )
+    if wait:
+        # blocking stages run on the vendor I/O pool (conversion on the process pool), not on the event loop
+        try:
+            return await run_blocking(process_upload, **args)
+        finally:
+            upload.cleanup()
+
+    # --- background: answer now, poll GET /ingest/jobs/{id} ---
+    def _run(j: IngestJob) -> Dict[str, Any]:
+        try:
+            return process_upload(job=j, **args)
+        finally:
+            upload.cleanup()
+
+    job = get_registry().submit(
+        "upload", _run,
+        meta={"file_name": file.filename, "bytes": upload.size, "type": type, "sha256": upload.sha256, "params": params},
+    )
+    return _queued_response(file, upload, job)
+
+def _queued_response(file: UploadFile, upload: SpooledUpload, job: IngestJob, duplicate: bool = False) -> Dict[str, Any]:
+    return {
+        "status": "queued",
+        "file_name": file.filename,
+        "file_id": None,                    # known once the job has converted the file (see result.file_id)
+        "mime_type": file.content_type,
+        "bytes": upload.size,
+        "ingest_job_id": job.id,
+        "job_url": f"/ingest/jobs/{job.id}",
+        "duplicate": duplicate,             # true: the same bytes are already being ingested by this job
+    }
+
+def process_upload(
+    *,
+    upload: SpooledUpload,
+    type: str,
+    tags: Optional[str],
+    extract_signals: Optional[bool],
+    reingest: Optional[bool],
+    file_id: Optional[str],
+    known: Optional[Dict[str, Any]] = None,
+    job: Optional[IngestJob] = None,
+) -> Dict[str, Any]:
+    """
+    Convert → chunk/ingest → signals/autosave for one spooled upload. Runs inline or as an ingest job.
+    known: the files row already holding these bytes (content_hash match), if any.
+    """
+    filename = upload.filename
+    def stage(name: str) -> None:
+        if job:
+            job.set_stage(name)
+
+    sb = get_client()
+
+    # --- read & convert (a finished ingest of the same bytes left its text in files.text_extracted) ---
+    stage("converting")
+    cached = cached_conversion(sb, known) if known else None
     try:
-        text, mime = sniff_and_convert(file.filename, raw)
+        text, mime = cached or convert_offloaded(filename, upload.path)
     except ValueError as e:
         # make converters raise ValueError for bad bytes (invalid PDF, etc.)
         raise HTTPException(status_code=400, detail=f"Invalid content: {e}")
@@ -50,26 +160,53 @@ async def upload_file(
         raise HTTPException(status_code=400, detail="no text extracted from file")
     text = normalize_text(text)
 
-    sb = get_client()
+    # --- journal: resubmitting the same bytes after a crash resumes the interrupted ingest ---
+    journal = open_journal(journal_key("upload", filename, type, reingest, upload.sha256))
 
-    # --- provenance: files row (best-effort) ---
+    # --- re-ingest: reuse the previous files row and diff against its stored chunks ---
+    known_fid = known.get("id") if known else None
+    if reingest:
+        # same bytes re-ingested without an explicit target: the row that holds them
+        prior_fid = find_previous_file(sb, filename, file_id) if file_id or not known_fid else known_fid
+    else:
+        prior_fid = None
+    if reingest and file_id and not prior_fid:
+        raise HTTPException(status_code=404, detail="file_id not found")
+    # an unfinished earlier run of these bytes (journal, or a files row without ingest_result) is resumed in place
+    resume_fid = ((journal.file_id if journal else None) or known_fid) if not prior_fid else None
+
+    # --- provenance: files row (best-effort); ingest_result is set again once this run finishes ---
     fid = None
+    target = prior_fid or resume_fid
+    frow = {
+        "filename": filename, "mime_type": mime, "bytes": upload.size,
+        "storage_url": "", "text_extracted": _stored_text(text), "ingest_result": None,
+    }
+    if not known_fid or known_fid == target:
+        frow["content_hash"] = upload.sha256  # unique: only the row holding these bytes carries it
     try:
-        frow = {
-            "filename": file.filename, "mime_type": mime, "bytes": len(raw),
-            "storage_url": "", "text_extracted": text
-        }
-        sb.table("files").insert(frow).execute()
-        sel = sb.table("files").select("id").order("created_at", desc=True).limit(1).execute()
-        fid = (sel.data or [{}])[0].get("id")
+        fid = _save_file_row(sb, frow, target)
     except Exception:
-        pass
+        fid = target
+    if journal:
+        journal.set_file(fid)
 
-    # --- chunk & ingest ---
-    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE","2000"))
-    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP","200"))
-    chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
+    plan = None
+    if prior_fid:
+        try:
+            plan = ReingestPlan(sb, prior_fid)
+        except Exception as e:
+            print("Re-ingest diff unavailable, ingesting everything:", e)
 
+    # --- chunk & ingest (lazy, token-aware: CHUNK_TOKENS / CHUNK_OVERLAP_TOKENS) ---
+    chunk_count = 0
+    def _chunks():
+        nonlocal chunk_count
+        for c in iter_chunks(text):
+            chunk_count += 1
+            yield c
+
+    stage("ingesting")
     pinecone_index = get_index()
     tags_list: List[str] = [t.strip() for t in (tags or "").split(",") if t.strip()]
 
@@ -78,95 +215,65 @@ async def upload_file(
         pinecone_index=pinecone_index,
         embedder=None,
         file_id=fid,
-        title_prefix=file.filename,
-        chunks=chunks,
+        title_prefix=filename,
+        chunks=plan.filter(_chunks()) if plan else _chunks(),
         mem_type=type,
         tags=tags_list,
         role_view=[],
         source="upload",
         text_col_env=os.getenv("MEMORIES_TEXT_COLUMN","text"),
+        on_progress=job.add if job else None,
+        journal=journal,
     )
 
-    # Optional: also store fulltext as semantic
+    # Optional: also store fulltext as semantic (split only past the embedding limit, so it can be embedded)
+    fulltext_result: Dict[str, Any] = {}
     if os.getenv("UPLOAD_ALSO_STORE_FULLTEXT_SEMANTIC","true").lower() == "true" and type != "semantic":
+        stage("fulltext")
         try:
-            upsert_memories_from_chunks(
+            fulltext_result = upsert_memories_from_chunks(
                 sb=sb,
                 pinecone_index=pinecone_index,
                 embedder=None,
                 file_id=fid,
-                title_prefix=file.filename,
-                chunks=[text],
+                title_prefix=filename,
+                chunks=plan.filter(iter_fulltext_chunks(text)) if plan else iter_fulltext_chunks(text),
                 mem_type="semantic",
                 tags=list(set((tags_list or []) + ["fulltext"])),
                 role_view=[],
                 source="upload",
                 text_col_env=os.getenv("MEMORIES_TEXT_COLUMN","text"),
+                journal=journal,
             )
         except Exception as e:
             print("Fulltext semantic upsert skipped:", e)
 
+    # --- re-ingest: retire vectors/rows for chunks that disappeared ---
+    reingest_summary: Optional[Dict[str, Any]] = None
+    if plan:
+        stage("retiring")
+        rewritten = [u.get("memory_id") for r in (ingest_result, fulltext_result) for u in (r.get("updated") or [])]
+        try:
+            plan.retire(sb, pinecone_index, keep_ids=rewritten)
+        except Exception as e:
+            print("Re-ingest retire failed:", e)
+        reingest_summary = {"file_id": plan.file_id, "unchanged": plan.unchanged, "retired": plan.retired}
+
+    # chunks are all written unless some failed: then the journal stays, so a retry resumes and repairs them
+    resumed = bool(journal and journal.resumed)
+    failures = ingest_failures(ingest_result, fulltext_result)
+    if journal and not failures:
+        journal.complete()
+
     # --- extraction → autosave (tolerant) ---
     autosave_summary: Dict[str, Any] = {"saved": False, "items": [], "skipped": []}
     autosave_error: Optional[str] = None
     extracted_candidates_count = 0
 
     if (os.getenv("ENABLE_UPLOAD_SIGNAL_EXTRACTION","true").lower() == "true") and extract_signals:
-        try:
-            ex = extract_signals_from_text(title=file.filename, text=text) or {}
-            # tolerate various shapes: {"candidates":[...]} or {"items":[...]}
-            candidates = ex.get("candidates") or ex.get("items") or []
-            if not isinstance(candidates, list):
-                # sometimes models return a stringified JSON – try to parse
-                if isinstance(candidates, str):
-                    try:
-                        candidates = json.loads(candidates)
-                    except Exception:
-                        candidates = []
-                else:
-                    candidates = []
-            extracted_candidates_count = len(candidates)
-
-            # best-effort signals logging
-            try:
-                for c in candidates:
-                    sig_hash = hashlib.md5(
-                        (str(c.get("fact_type","")) + (c.get("title") or "") + (c.get("text") or ""))
-                        .strip().lower().encode("utf-8")
-                    ).hexdigest()
-                    sb.table("signals").upsert(
-                        {
-                            "source": "upload",
-                            "source_ref": file.filename,
-                            "doc_title": file.filename,
-                            "fact_type": c.get("fact_type") or c.get("type"),
-                            "title": c.get("title"),
-                            "text": c.get("text") or c.get("value"),
-                            "confidence": c.get("confidence"),
-                            "hash": sig_hash
-                        },
-                        on_conflict="hash"
-                    ).execute()
-            except Exception as le:
-                print("signals upsert skipped:", le)
-
-            try:
-                autosave_summary = apply_autosave(
-                    sb=sb,
-                    pinecone_index=pinecone_index,
-                    candidates=candidates,
-                    session_id=None,
-                    text_col_env=os.getenv("MEMORIES_TEXT_COLUMN","text"),
-                    author_user_id=None,
-                ) or autosave_summary
-            except Exception as ae:
-                # DO NOT fail the request – surface as warning
-                autosave_error = str(ae)
-                print("Autosave failed:", autosave_error)
-
-        except Exception as e:
-            autosave_error = str(e)
-            print("Extractor/autosave failed:", autosave_error)
+        extracted_candidates_count, autosave_summary, autosave_error = extract_and_autosave(
+            sb, pinecone_index, filename, text, stage=stage,
+        )
 
         # --- stable response for Make/Slack/Email ---
     # Try to extract common counts from ingest_result without assuming shape
@@ -181,21 +288,128 @@ async def upload_file(
     updated  = _get(ingest_result, "updated")
     skipped  = _get(ingest_result, "skipped")
 
-    return {
+    response = {
         "status": "ok",
-        "file_name": file.filename,
+        "file_name": filename,
         "file_id": fid,
         "mime_type": mime,
-        "bytes": len(raw),
-        "chunks": len(chunks),
+        "bytes": upload.size,
+        "ingest_job_id": job.id if job else None,
+        "chunks": chunk_count,
         "ingest": {
             "upserted": upserted,
             "updated": updated,
             "skipped": skipped,
+            "failed": len(failures),        # chunks to retry (insert/embed/upsert failures), included in skipped
             "raw": ingest_result,  # keep original for debugging
         },
+        "reingest": reingest_summary,       # null unless reingest=true matched a previous file
+        "resumed": resumed,                 # true when an interrupted ingest of the same bytes was picked up
         "extraction_enabled": bool(extract_signals),
         "extracted_candidates": extracted_candidates_count,
         "autosave": autosave_summary,
         "autosave_error": autosave_error,   # null if all good
+        "duplicate": False,                 # true when answered from an earlier ingest of the same bytes
+        "conversion_cached": bool(cached),  # true when the text came from files.text_extracted
     }
+    # retries of the same bytes and parameters are answered from this row from now on (clean ingests only)
+    if not failures:
+        record_result(sb, fid, result_record(response, text, ingest_params(type, tags_list, bool(extract_signals))))
+    return response
+
+
+def extract_and_autosave(sb, pinecone_index, filename: str, text: str, stage=lambda name: None):
+    """
+    Signals extraction → signals log → autosave for one document, never raising.
+    Returns (extracted_candidates_count, autosave_summary, autosave_error).
+    """
+    autosave_summary: Dict[str, Any] = {"saved": False, "items": [], "skipped": []}
+    autosave_error: Optional[str] = None
+    extracted_candidates_count = 0
+    stage("signals")
+    try:
+        ex = extract_signals_from_text(title=filename, text=text) or {}
+        # tolerate various shapes: {"candidates":[...]} or {"items":[...]}
+        candidates = ex.get("candidates") or ex.get("items") or []
+        if not isinstance(candidates, list):
+            # sometimes models return a stringified JSON – try to parse
+            if isinstance(candidates, str):
+                try:
+                    candidates = json.loads(candidates)
+                except Exception:
+                    candidates = []
+            else:
+                candidates = []
+        extracted_candidates_count = len(candidates)
+
+        # best-effort signals logging
+        try:
+            for c in candidates:
+                sig_hash = hashlib.md5(
+                    (str(c.get("fact_type","")) + (c.get("title") or "") + (c.get("text") or ""))
+                    .strip().lower().encode("utf-8")
+                ).hexdigest()
+                sb.table("signals").upsert(
+                    {
+                        "source": "upload",
+                        "source_ref": filename,
+                        "doc_title": filename,
+                        "fact_type": c.get("fact_type") or c.get("type"),
+                        "title": c.get("title"),
+                        "text": c.get("text") or c.get("value"),
+                        "confidence": c.get("confidence"),
+                        "hash": sig_hash
+                    },
+                    on_conflict="hash"
+                ).execute()
+        except Exception as le:
+            print("signals upsert skipped:", le)
+
+        stage("autosave")
+        try:
+            autosave_summary = apply_autosave(
+                sb=sb,
+                pinecone_index=pinecone_index,
+                candidates=candidates,
+                session_id=None,
+                text_col_env=os.getenv("MEMORIES_TEXT_COLUMN","text"),
+                author_user_id=None,
+                source="upload",
+            ) or autosave_summary
+        except Exception as ae:
+            # DO NOT fail the request – surface as warning
+            autosave_error = str(ae)
+            print("Autosave failed:", autosave_error)
+
+    except Exception as e:
+        autosave_error = str(e)
+        print("Extractor/autosave failed:", autosave_error)
+    return extracted_candidates_count, autosave_summary, autosave_error
+
+def _missing_dedupe_columns(e: Exception) -> bool:
+    """An error from a files schema without content_hash / ingest_result (or without the unique index on content_hash)."""
+    msg = str(e).lower()
+    return "content_hash" in msg or "ingest_result" in msg or "on conflict" in msg
+
+def _save_file_row(sb, frow: Dict[str, Any], target: Optional[str]) -> Optional[str]:
+    """Update the target files row or create one; returns its id."""
+    try:
+        if target:
+            sb.table("files").update(frow).eq("id", target).execute()
+            return target
+        if "content_hash" in frow:
+            # upsert on the unique hash: two concurrent first uploads of the same bytes share one row
+            res = sb.table("files").upsert(frow, on_conflict="content_hash").execute()
+        else:
+            res = sb.table("files").insert(frow).execute()
+    except Exception as e:
+        if not _missing_dedupe_columns(e):
+            raise
+        # schema without files.content_hash / ingest_result: store the row the old way
+        print("files dedupe columns unavailable:", e)
+        frow = {k: v for k, v in frow.items() if k not in ("content_hash", "ingest_result")}
+        if target:
+            sb.table("files").update(frow).eq("id", target).execute()
+            return target
+        res = sb.table("files").insert(frow).execute()
+    return ((res.data or [{}])[0]).get("id")
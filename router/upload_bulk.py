@@ -0,0 +1,399 @@
+# router/upload_bulk.py
+# POST /upload/bulk: many files and/or .zip archives in one call. Archive entries are
+# spooled to disk one at a time (never the whole archive in memory), documents are
+# converted in parallel on the conversion pool, and every chunk goes through ONE batched
+# ingest run. Converted texts wait on disk (SpooledText) and are read back one document
+# at a time, so a large batch never holds every document's text in memory. The response is NDJSON: a line per file as soon as its outcome is known,
+# progress lines while the ingest runs, and a final summary line.
+
+import asyncio, json, os, time, zipfile
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+
+from vendors.supabase_client import get_client
+from vendors.pinecone_client import get_index
+from ingest.converters import convert_offloaded
+from ingest.executors import run_blocking
+from ingest.file_dedupe import (
+    cached_conversion, duplicate_response, find_by_content_hash, ingest_failures, ingest_params,
+    record_result, result_record,
+)
+from ingest.journal import journal_key, open_journal
+from ingest.pipeline import normalize_text, iter_chunks, iter_fulltext_chunks, upsert_memories_from_chunks
+from ingest.spool import (
+    SpooledText, SpooledUpload, UploadTooLarge, bulk_max_bytes, spool_stream, spool_text, spool_upload,
+)
+
+from router.upload import _save_file_row, _stored_text, extract_and_autosave
+
+router = APIRouter()
+
+# archive entries with other extensions are reported as skipped
+BULK_EXTENSIONS = (".pdf", ".docx", ".md", ".markdown", ".html", ".htm", ".txt")
+
+def _bulk_limits():
+    """BULK_MAX_FILES (default 200 documents) and BULK_MAX_BYTES (default 1 GiB spooled, after decompression)."""
+    return int(os.getenv("BULK_MAX_FILES", "200")), bulk_max_bytes()
+
+class BulkItem:
+    """One document of a bulk upload and its outcome."""
+
+    def __init__(self, name: str, upload: Optional[SpooledUpload] = None, archive: Optional[str] = None):
+        self.name = name
+        self.upload = upload
+        self.archive = archive
+        self.known: Optional[Dict[str, Any]] = None
+        self.duplicate: Optional[Dict[str, Any]] = None   # stored result of a finished ingest of these bytes
+        self.text: Optional[SpooledText] = None    # None until converted, or when nothing was extracted
+        self.mime: Optional[str] = None
+        self.cached = False
+        self.fid: Optional[str] = None
+        self.chunks = 0
+
+    def line(self, status: str, **extra: Any) -> bytes:
+        out = {"event": "file", "status": status, "file_name": self.name}
+        if self.archive:
+            out["archive"] = self.archive
+        out.update(extra)
+        return (json.dumps(out, default=str) + "\n").encode("utf-8")
+
+    def cleanup(self) -> None:
+        if self.upload:
+            self.upload.cleanup()
+        if self.text:
+            self.text.cleanup()
+
+def _event(kind: str, **data: Any) -> bytes:
+    return (json.dumps({"event": kind, **data}, default=str) + "\n").encode("utf-8")
+
+def _is_archive(name: Optional[str]) -> bool:
+    return (name or "").lower().endswith(".zip")
+
+def _archive_members(path: str):
+    """Open a spooled archive; its document entries in archive order (directories / resource forks left out)."""
+    zf = zipfile.ZipFile(path)
+    members = [
+        i for i in zf.infolist()
+        if not i.is_dir() and not i.filename.startswith("__MACOSX/") and not os.path.basename(i.filename).startswith(".")
+    ]
+    return zf, members
+
+def _spool_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, budget: Optional[int]) -> Optional[SpooledUpload]:
+    """
+    Decompress one entry to disk, or None when it does not fit the remaining BULK_MAX_BYTES budget
+    (by its declared size, or by its actual bytes for entries that understate it).
+    UploadTooLarge past UPLOAD_MAX_BYTES.
+    """
+    if budget is not None and info.file_size > budget:
+        return None
+    try:
+        with zf.open(info) as src:
+            return spool_stream(info.filename, src, budget=budget)
+    except UploadTooLarge as e:
+        if e.setting == "BULK_MAX_BYTES":
+            return None
+        raise
+
+def _convert(item: BulkItem, sb, params: Dict[str, Any]) -> None:
+    """Dedupe lookup, then the converters (blocking; runs on the I/O pool). The text is spooled to disk."""
+    item.known = find_by_content_hash(sb, item.upload.sha256)
+    if item.known:
+        item.duplicate = duplicate_response(item.known, params)
+        if item.duplicate:
+            return
+    cached = cached_conversion(sb, item.known) if item.known else None
+    text, mime = cached or convert_offloaded(item.name, item.upload.path)
+    text = normalize_text(text)
+    item.mime, item.cached = mime, bool(cached)
+    if text.strip():
+        item.text = spool_text(item.name, text)
+
+def _ingest_all(
+    sb, items: List[BulkItem], mem_type: str, tags_list: List[str], params: Dict[str, Any], on_progress,
+) -> List[Dict[str, Any]]:
+    """
+    files rows for every document, then one upsert_memories_from_chunks run over all their
+    chunks (each chunk carries its file_id / title / part). Returns one /upload-style result per item;
+    only items whose chunks all landed get their result stored for dedupe. Each text is read
+    back from its spool file while its row is saved and its chunks are cut, then dropped.
+    """
+    text_col = os.getenv("MEMORIES_TEXT_COLUMN","text")
+    for item in items:
+        frow = {
+            "filename": item.name, "mime_type": item.mime, "bytes": item.upload.size,
+            "storage_url": "", "text_extracted": _stored_text(item.text.load()), "ingest_result": None,
+            "content_hash": item.upload.sha256,
+        }
+        target = item.known.get("id") if item.known else None  # unfinished earlier run of these bytes
+        try:
+            item.fid = _save_file_row(sb, frow, target)
+        except Exception:
+            item.fid = target
+
+    owner: List[int] = []   # chunk idx -> position in items
+    def _chunks():
+        for pos, item in enumerate(items):
+            for part, c in enumerate(iter_chunks(item.text.load()), 1):
+                c.file_id, c.title_prefix, c.part = item.fid, item.name, part
+                owner.append(pos)
+                item.chunks += 1
+                yield c
+
+    # the same document set resubmitted after a crash resumes from the journal
+    journal = open_journal(journal_key("bulk", mem_type, *tags_list, *sorted(i.upload.sha256 for i in items)))
+    pinecone_index = get_index()
+    result = upsert_memories_from_chunks(
+        sb=sb,
+        pinecone_index=pinecone_index,
+        embedder=None,
+        file_id=None,
+        title_prefix="Bulk upload",
+        chunks=_chunks(),
+        mem_type=mem_type,
+        tags=tags_list,
+        role_view=[],
+        source="upload",
+        text_col_env=text_col,
+        on_progress=on_progress,
+        journal=journal,
+    )
+
+    # Optional: also store fulltext as semantic (as /upload does; split only past the embedding limit)
+    fulltext: Dict[str, Any] = {}
+    fulltext_owner: List[int] = []
+    if os.getenv("UPLOAD_ALSO_STORE_FULLTEXT_SEMANTIC","true").lower() == "true" and mem_type != "semantic":
+        def _fulltexts():
+            for pos, item in enumerate(items):
+                for part, t in enumerate(iter_fulltext_chunks(item.text.load()), 1):
+                    t.file_id, t.title_prefix, t.part = item.fid, item.name, part
+                    fulltext_owner.append(pos)
+                    yield t
+        try:
+            fulltext = upsert_memories_from_chunks(
+                sb=sb, pinecone_index=pinecone_index, embedder=None, file_id=None, title_prefix="Bulk upload",
+                chunks=_fulltexts(), mem_type="semantic", tags=list(set(tags_list + ["fulltext"])), role_view=[],
+                source="upload", text_col_env=text_col, journal=journal,
+            )
+        except Exception as e:
+            print("Fulltext semantic upsert skipped:", e)
+    # failed chunks keep the journal, so resubmitting the set resumes and repairs them
+    if journal and not ingest_failures(result, fulltext):
+        journal.complete()
+
+    per_item = [{"upserted": 0, "updated": 0, "skipped": 0, "failed": 0} for _ in items]
+    for key in ("upserted", "updated", "skipped"):
+        for r in result.get(key) or []:
+            per_item[owner[r["idx"]]][key] += 1
+    for r in ingest_failures(result):
+        per_item[owner[r["idx"]]]["failed"] += 1
+    for r in ingest_failures(fulltext):
+        per_item[fulltext_owner[r["idx"]]]["failed"] += 1
+
+    responses = []
+    for item, ingest in zip(items, per_item):
+        response = {
+            "status": "ok",
+            "file_name": item.name,
+            "file_id": item.fid,
+            "mime_type": item.mime,
+            "bytes": item.upload.size,
+            "chunks": item.chunks,
+            "ingest": ingest,
+            "extraction_enabled": False,
+            "extracted_candidates": 0,
+            "duplicate": False,
+            "conversion_cached": item.cached,
+        }
+        # a later /upload or /upload/bulk of the same bytes and parameters is answered from this row
+        # (with extract_signals the caller stores it once signals/autosave have run)
+        if not ingest["failed"] and not params["extract_signals"]:
+            record_result(sb, item.fid, result_record(response, item.text, params))
+        responses.append(response)
+    return responses
+
+@router.post("/upload/bulk")
+async def upload_bulk(
+    files: List[UploadFile] = File(...),           # documents and/or .zip archives
+    tags: Optional[str] = Form(None),              # csv, applied to every document
+    type: Optional[str] = Form("semantic"),
+    extract_signals: Optional[bool] = Form(False), # per-document signals/autosave (off by default for bulk loads)
+    x_api_key: Optional[str] = Header(None),
+):
+    expected = os.getenv("X_API_KEY")
+    if expected and x_api_key != expected:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    if type not in ("semantic","episodic","procedural"):
+        raise HTTPException(status_code=400, detail="type must be one of semantic|episodic|procedural")
+
+    # the request's upload files are only valid until this handler returns: spool them now,
+    # all of them together within BULK_MAX_BYTES
+    max_bytes = _bulk_limits()[1]
+    spooled: List[SpooledUpload] = []
+    try:
+        for f in files:
+            budget = max_bytes - sum(s.size for s in spooled) if max_bytes else None
+            spooled.append(await spool_upload(f, budget=budget))
+    except UploadTooLarge as e:
+        for s in spooled:
+            s.cleanup()
+        raise HTTPException(status_code=413, detail=f"{e} ({f.filename})")
+
+    tags_list: List[str] = [t.strip() for t in (tags or "").split(",") if t.strip()]
+    return StreamingResponse(
+        _bulk_stream(spooled, type, tags_list, bool(extract_signals)),
+        media_type="application/x-ndjson",
+    )
+
+async def _bulk_stream(spooled: List[SpooledUpload], mem_type: str, tags_list: List[str], extract_signals: bool):
+    started = time.time()
+    params = ingest_params(mem_type, tags_list, extract_signals)
+    max_files, max_bytes = _bulk_limits()
+    sb = get_client()
+    items: List[BulkItem] = []
+    tasks: Dict[asyncio.Task, BulkItem] = {}
+    seen: Dict[str, str] = {}     # sha256 -> first file name in this request
+    counts = {"files": 0, "ingested": 0, "duplicate": 0, "skipped": 0, "failed": 0}
+    total_bytes = 0   # documents spooled so far (archive entries decompressed)
+    docs = 0
+    over = "over BULK_MAX_FILES / BULK_MAX_BYTES"
+
+    def full(next_size: int = 0) -> bool:
+        """True once another document of next_size bytes would pass BULK_MAX_FILES / BULK_MAX_BYTES."""
+        return docs >= max_files or bool(max_bytes and total_bytes + next_size > max_bytes)
+
+    def admit(item: BulkItem) -> Optional[bytes]:
+        """Start converting an item, or return its final line (duplicate / over limit)."""
+        nonlocal total_bytes, docs
+        counts["files"] += 1
+        if full(item.upload.size):
+            item.cleanup()
+            counts["skipped"] += 1
+            return item.line("skipped", detail=over)
+        docs += 1
+        total_bytes += item.upload.size
+        if item.upload.sha256 in seen:
+            item.cleanup()
+            counts["duplicate"] += 1
+            return item.line("duplicate", duplicate_of=seen[item.upload.sha256])
+        seen[item.upload.sha256] = item.name
+        items.append(item)
+        tasks[asyncio.ensure_future(run_blocking(_convert, item, sb, params))] = item
+        return None
+
+    def finished(done) -> List[bytes]:
+        """Final lines for conversions that ended in a duplicate or an error."""
+        out = []
+        for t in done:
+            item = tasks.pop(t)
+            err = t.exception()
+            if err is None and item.duplicate:
+                items.remove(item)
+                item.cleanup()
+                counts["duplicate"] += 1
+                out.append(item.line("duplicate", **{k: v for k, v in item.duplicate.items() if k not in ("status", "file_name")}))
+            elif err is not None or item.text is None:
+                items.remove(item)
+                item.cleanup()
+                counts["failed"] += 1
+                out.append(item.line("failed", detail=f"Conversion failed: {err}" if err else "no text extracted from file"))
+            else:
+                item.upload.cleanup()  # the text is spooled; the uploaded bytes are no longer needed
+        return out
+
+    try:
+        # ---- expand archives entry by entry; conversions start as soon as each document is on disk.
+        #      Limits are checked before an entry is decompressed, and expansion stops at the first one hit.
+        for up in spooled:
+            if not _is_archive(up.filename):
+                line = admit(BulkItem(up.filename or "upload", up))
+                if line:
+                    yield line
+                continue
+            if full():
+                counts["skipped"] += 1
+                up.cleanup()
+                yield BulkItem(up.filename or "archive.zip").line("skipped", detail=over)
+                continue
+            try:
+                zf, members = await run_blocking(_archive_members, up.path)
+            except Exception as e:
+                counts["failed"] += 1
+                up.cleanup()
+                yield BulkItem(up.filename or "archive.zip").line("failed", detail=f"Invalid archive: {e}")
+                continue
+            try:
+                for pos, info in enumerate(members):
+                    if not info.filename.lower().endswith(BULK_EXTENSIONS):
+                        counts["files"] += 1
+                        counts["skipped"] += 1
+                        yield BulkItem(info.filename, archive=up.filename).line("skipped", detail="unsupported file type")
+                        continue
+                    try:
+                        entry = None if full() else await run_blocking(
+                            _spool_member, zf, info, max_bytes - total_bytes if max_bytes else None,
+                        )
+                    except Exception as e:
+                        counts["files"] += 1
+                        counts["failed"] += 1
+                        yield BulkItem(info.filename, archive=up.filename).line("failed", detail=str(e))
+                        continue
+                    if entry is None:
+                        # a limit is reached: the rest of this archive is reported in one line, never decompressed
+                        left = sum(1 for i in members[pos:] if i.filename.lower().endswith(BULK_EXTENSIONS))
+                        counts["files"] += left
+                        counts["skipped"] += left
+                        yield BulkItem(up.filename or "archive.zip").line("skipped", detail=over, entries=left)
+                        break
+                    line = admit(BulkItem(info.filename, entry, archive=up.filename))
+                    if line:
+                        yield line
+                    # report conversions that already ended (duplicates / failures) while expanding
+                    for l in finished([t for t in tasks if t.done()]):
+                        yield l
+            finally:
+                zf.close()
+                up.cleanup()
+
+        # ---- wait for the remaining conversions
+        while tasks:
+            done, _ = await asyncio.wait(list(tasks), return_when=asyncio.FIRST_COMPLETED)
+            for l in finished(done):
+                yield l
+
+        if items:
+            # ---- one files row per document, then a single batched ingest over all chunks
+            progress: Dict[str, int] = {}
+            def on_progress(stage: str, n: int) -> None:
+                progress[stage] = progress.get(stage, 0) + n
+
+            fut = asyncio.ensure_future(run_blocking(_ingest_all, sb, items, mem_type, tags_list, params, on_progress))
+            while not fut.done():
+                await asyncio.wait({fut}, timeout=float(os.getenv("BULK_PROGRESS_S", "5")))
+                if not fut.done():
+                    yield _event("progress", stage="ingesting", progress=dict(progress))
+            results = fut.result()
+
+            pinecone_index = get_index() if extract_signals else None
+            for item, response in zip(items, results):
+                if extract_signals:
+                    if os.getenv("ENABLE_UPLOAD_SIGNAL_EXTRACTION","true").lower() == "true":
+                        n, summary, err = await run_blocking(extract_and_autosave, sb, pinecone_index, item.name, item.text.load())
+                        response.update({"extraction_enabled": True, "extracted_candidates": n,
+                                         "autosave": summary, "autosave_error": err})
+                    if not response["ingest"]["failed"]:
+                        await run_blocking(record_result, sb, item.fid, result_record(response, item.text, params))
+                counts["ingested"] += 1
+                yield item.line("ok", **{k: v for k, v in response.items() if k not in ("status", "file_name")})
+
+        yield _event("done", **counts, seconds=round(time.time() - started, 1))
+    except Exception as e:
+        yield _event("error", detail=str(e), **counts)
+    finally:
+        for t in tasks:
+            t.cancel()
+        for item in items:
+            item.cleanup()
+        for up in spooled:
+            up.cleanup()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Checks that the streaming HTML / DOCX converters return exactly the text of the
+BeautifulSoup / python-docx ones, then times both on large generated files.
+Usage:
+  python scripts/bench_converters.py [file.html|file.docx ...]
+Given files are compared as well; exits 1 on the first mismatch.
+Env: BENCH_SEED (default 7), BENCH_CASES (random documents per format, default 300),
+     BENCH_PARAGRAPHS (size of the large documents, default 20000)
+"""
+import io, os, random, sys, time, tracemalloc, warnings, zipfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ingest import converters as C  # noqa: E402
+
+warnings.filterwarnings("ignore")  # bs4's XMLParsedAsHTMLWarning on the random "<?xml" prologues
+
+SEED = int(os.getenv("BENCH_SEED", "7"))
+CASES = int(os.getenv("BENCH_CASES", "300"))
+PARAGRAPHS = int(os.getenv("BENCH_PARAGRAPHS", "20000"))
+
+WORDS = ["alpha", "béta", "gamma", "δέλτα", "epsilon", "&amp;", "&lt;tag&gt;", "&nbsp;", "zeta", "eta", "😀"]
+SPACES = [" ", "  ", "\n", "\n\n", "\t", " \n ", "\r\n", "\x0c", ""]
+
+# ---------- html ----------
+
+def _words(rnd, n):
+    return "".join(rnd.choice(WORDS) + rnd.choice(SPACES) for _ in range(n))
+
+def _html_node(rnd, depth):
+    if depth <= 0 or rnd.random() < 0.3:
+        return _words(rnd, rnd.randint(0, 6))
+    tag = rnd.choice([
+        "p", "div", "span", "b", "a", "li", "ul", "pre", "textarea", "script", "style", "noscript",
+        "template", "ruby", "rt", "rp", "table", "tr", "td", "h1", "br", "img", "svg", "o:p",
+    ])
+    inner = "".join(_html_node(rnd, depth - 1) for _ in range(rnd.randint(0, 4)))
+    extra = rnd.choice(["", "<!-- note -->", "<?php echo 1 ?>", "<![CDATA[raw]]>", "</p>", "<p>", "<b>"])
+    close = "" if rnd.random() < 0.15 else f"</{tag}>"  # unclosed tags exercise lxml's recovery
+    return f"<{tag} class='c{depth}'>{inner}{extra}{close}" + rnd.choice(SPACES)
+
+def random_html(rnd):
+    head = rnd.choice(["", "<!DOCTYPE html>", "﻿<!doctype html>\n", "<?xml version='1.0'?>"])
+    body = "".join(_html_node(rnd, 4) for _ in range(rnd.randint(1, 6)))
+    if rnd.random() < 0.5:
+        body = f"<html><head><title>{_words(rnd, 2)}</title><style>p{{x:1}}</style></head><body>{body}</body></html>"
+    return (head + body).encode("utf-8")
+
+def large_html(n):
+    rows = [f"<div class='s'><h2>Section {i}</h2><p>Paragraph {i} has <b>bold</b>, <a href='#'>a link</a> and "
+            f"ordinary prose for the converter.</p><script>var x={i};</script></div>\n" for i in range(n)]
+    return ("<!DOCTYPE html><html><head><style>p{color:red}</style></head><body>" + "".join(rows) + "</body></html>").encode()
+
+# ---------- docx ----------
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    "</Types>"
+)
+RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+
+def make_docx(body_xml):
+    doc = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document xmlns:w="{W_NS}"><w:body>'
+           f"{body_xml}<w:sectPr/></w:body></w:document>")
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", CONTENT_TYPES)
+        z.writestr("_rels/.rels", RELS)
+        z.writestr("word/document.xml", doc)
+    return buf.getvalue()
+
+def _xml_words(rnd, n):
+    return "".join(rnd.choice(["alpha", "béta", "&amp;", "&lt;", "😀", " ", "  ", "\n", "\t"]) for _ in range(n))
+
+def _run(rnd):
+    items = []
+    for _ in range(rnd.randint(0, 4)):
+        k = rnd.random()
+        if k < 0.5:
+            space = rnd.choice(["", ' xml:space="preserve"'])
+            items.append(f"<w:t{space}>{_xml_words(rnd, rnd.randint(0, 5))}</w:t>")
+        else:
+            items.append(rnd.choice([
+                "<w:tab/>", "<w:br/>", '<w:br w:type="page"/>', '<w:br w:type="column"/>', "<w:cr/>",
+                "<w:noBreakHyphen/>", "<w:ptab/>", "<w:softHyphen/>", "<w:rPr><w:b/></w:rPr>", "<!-- c -->",
+                "\n  ", "<w:t/>",
+            ]))
+    return "<w:r>" + "".join(items) + "</w:r>"
+
+def _paragraph(rnd, depth=0):
+    items = []
+    for _ in range(rnd.randint(0, 5)):
+        k = rnd.random()
+        if k < 0.6:
+            items.append(_run(rnd))
+        elif k < 0.75:
+            items.append("<w:hyperlink>" + "".join(_run(rnd) for _ in range(rnd.randint(0, 3))) + "</w:hyperlink>")
+        elif k < 0.85:
+            items.append(f"<w:ins>{_run(rnd)}</w:ins>")  # python-docx skips runs inside revision marks
+        elif k < 0.95 and depth == 0:
+            items.append(f"<w:r><w:pict><w:txbxContent>{_paragraph(rnd, 1)}</w:txbxContent></w:pict></w:r>")
+        else:
+            items.append("\n ")
+    return "<w:p><w:pPr><w:tabs><w:tab w:val='left'/></w:tabs></w:pPr>" + "".join(items) + "</w:p>"
+
+def random_docx(rnd):
+    blocks = []
+    for _ in range(rnd.randint(0, 12)):
+        k = rnd.random()
+        if k < 0.7:
+            blocks.append(_paragraph(rnd))
+        elif k < 0.85:
+            blocks.append(f"<w:tbl><w:tr><w:tc>{_paragraph(rnd)}</w:tc></w:tr></w:tbl>")
+        elif k < 0.95:
+            blocks.append(f"<w:sdt><w:sdtContent>{_paragraph(rnd)}</w:sdtContent></w:sdt>")
+        else:
+            blocks.append("<w:bookmarkStart/>\n")
+    return make_docx("".join(blocks))
+
+def whitespace_docx(n, rnd):
+    # whitespace-only w:t spread across many read chunks of the incremental parser
+    ws = [" ", "  ", "\t", " \n ", ""]
+    return make_docx("".join(
+        f"<w:p><w:r><w:t>{rnd.choice(ws)}</w:t><w:t xml:space='preserve'>{rnd.choice(ws)}</w:t><w:t>x{i}</w:t></w:r>"
+        + " " * rnd.randint(0, 50) + "</w:p>" for i in range(n)
+    ))
+
+def authored_docx():
+    # a real package written by python-docx (styles, settings, core properties, tables)
+    from docx import Document
+    doc = Document()
+    doc.add_heading("Benchmark", 0)
+    for i in range(200):
+        p = doc.add_paragraph(f"Paragraph {i}\twith a tab ")
+        p.add_run("and a bold run").bold = True
+        p.add_run().add_break()
+    table = doc.add_table(rows=3, cols=3)
+    table.cell(0, 0).text = "cell text is not a body paragraph"
+    doc.add_page_break()
+    doc.add_paragraph("after the table")
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+def large_docx(n):
+    paras = [f"<w:p><w:r><w:t>Paragraph {i} of the benchmark document,</w:t></w:r><w:r><w:tab/>"
+             f'<w:t xml:space="preserve"> with a second run</w:t><w:br/></w:r><w:hyperlink><w:r><w:t>and a link.</w:t>'
+             f"</w:r></w:hyperlink></w:p>" for i in range(n)]
+    return make_docx("".join(paras))
+
+# ---------- checks ----------
+
+ENGINES = {
+    ".html": (lambda src: C._html_text(C._decode(src)), lambda src: C._html_text_legacy(C._decode(src))),
+    ".docx": (C._docx_text, C._docx_text_legacy),
+}
+
+def check(name, data):
+    fast, legacy = ENGINES[os.path.splitext(name)[1]]
+    a, b = fast(data), legacy(data)
+    if a != b:
+        i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+        print(f"MISMATCH {name} at {i}:\n  fast:   {a[max(0, i-40):i+40]!r}\n  legacy: {b[max(0, i-40):i+40]!r}")
+        sys.exit(1)
+
+def measure(fn, data, reps=3):
+    best = None
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn(data)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    tracemalloc.start()
+    fn(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def main(paths):
+    rnd = random.Random(SEED)
+    for i in range(CASES):
+        check(f"random-{i}.html", random_html(rnd))
+        check(f"random-{i}.docx", random_docx(rnd))
+    check("whitespace.docx", whitespace_docx(PARAGRAPHS, rnd))
+    check("authored.docx", authored_docx())
+    print(f"equivalence: {CASES} random HTML + {CASES} random DOCX documents identical")
+    for p in paths:
+        with open(p, "rb") as f:
+            check(p, f.read())
+        print(f"equivalence: {p} identical")
+
+    for ext, data in ((".html", large_html(PARAGRAPHS)), (".docx", large_docx(PARAGRAPHS))):
+        check("large" + ext, data)
+        fast, legacy = ENGINES[ext]
+        (tf, mf), (tl, ml) = measure(fast, data), measure(legacy, data)
+        # peaks are Python allocations (tracemalloc); libxml2's own buffers are not counted
+        print(f"{ext[1:]:5} {len(data)/1e6:6.1f} MB  legacy {tl*1000:7.0f} ms peak {ml/1e6:7.1f} MB"
+              f"  |  fast {tf*1000:7.0f} ms peak {mf/1e6:7.1f} MB  ({tl/tf:.1f}x)")
+    print("PASS")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -65,6 +65,11 @@ create table if not exists public.files (
   created_at    timestamptz not null default now()
 );
 create index if not exists idx_files_created on public.files(created_at);
+-- Whole-file dedupe for /upload (router/upload.py, ingest/file_dedupe.py):
+-- sha256 of the raw uploaded bytes, and the response summary of the finished ingest
+alter table public.files add column if not exists content_hash char(64);
+alter table public.files add column if not exists ingest_result jsonb;
+create unique index if not exists uq_files_content_hash on public.files(content_hash);
 
 -- =====================================================================
 -- MEMORIES (canonical stored knowledge; chunk-level or note-level)
@@ -89,11 +94,22 @@ create index if not exists idx_memories_type on public.memories(type);
 create index if not exists idx_memories_tags on public.memories using gin(tags);
 create index if not exists idx_memories_created on public.memories(created_at);
 
+-- Columns written by ingest/pipeline.py (older projects may predate them)
+alter table public.memories add column if not exists summary text;
+alter table public.memories add column if not exists simhash64 bigint;  -- signed view of the 64-bit SimHash
+
 drop trigger if exists trg_memories_set_updated on public.memories;
 create trigger trg_memories_set_updated
   before update on public.memories
   for each row execute function set_updated_at();
 
+-- Bulk back-write of Pinecone ids after a batched vector upsert
+-- (vector id is always 'mem_' || memories.id; see ingest/vectors.py)
+create or replace function public.set_memory_embedding_ids(ids uuid[])
+returns void language sql as $$
+  update public.memories set embedding_id = 'mem_' || id::text where id = any(ids);
+$$;
+
 -- =====================================================================
 -- ENTITIES (graph)
 -- =====================================================================
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# Checks that /healthz stays responsive while a large /upload is being processed.
+# Usage: BASE_URL=http://localhost:8000 python tests/evals/upload_latency_probe.py [file]
+#        (default: a generated ~8 MB text file)
+# Afterwards the memories the upload reported as newly inserted (rows + vectors) and its files row
+# are deleted directly, so SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY / PINECONE_* of the same
+# deployment are required as well. Rows it rewrote in place (near-duplicates) are never touched.
+import os, sys, time, threading, uuid, requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+BASE = os.getenv("BASE_URL")
+KEY  = os.getenv("X_API_KEY")
+TAG  = "latency-probe"
+MAX_P95_MS = int(os.getenv("HEALTHZ_MAX_P95_MS", "250"))
+MAX_RATIO  = float(os.getenv("HEALTHZ_MAX_RATIO", "3"))
+
+def ping():
+    t0 = time.time()
+    r = requests.get(f"{BASE}/healthz", timeout=30)
+    return r.status_code, int((time.time()-t0)*1000)
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs)-1, int(round(p/100.0*(len(xs)-1))))] if xs else 0
+
+def summary(xs):
+    return f"n={len(xs)} p50={pct(xs,50)}ms p95={pct(xs,95)}ms max={max(xs) if xs else 0}ms"
+
+def upload(name, data, out):
+    t0 = time.time()
+    r = requests.post(
+        f"{BASE}/upload",
+        headers={"X-API-Key": KEY or ""},
+        files={"file": (name, data)},
+        data={"wait": "true", "extract_signals": "false", "tags": TAG},
+        timeout=1800,
+    )
+    out["status"], out["ms"] = r.status_code, int((time.time()-t0)*1000)
+    try:
+        out["response"] = r.json()
+    except ValueError:
+        out["response"] = {}
+
+def cleanup(sb, index, resp):
+    """
+    Delete what this upload created: the memories its response lists as upserted (rows + vectors)
+    and its files row. Nothing is deleted when the upload was answered as a duplicate, resumed an
+    earlier run, or re-ingested an existing file.
+    """
+    from ingest.reingest import retire_memories
+
+    if not resp or resp.get("duplicate") or resp.get("resumed") or resp.get("reingest"):
+        print("cleanup     nothing created by this run")
+        return
+    raw = (resp.get("ingest") or {}).get("raw") or {}
+    ids = [u["memory_id"] for u in raw.get("upserted") or [] if u.get("memory_id")]
+    rows = []
+    for i in range(0, len(ids), 500):
+        rows.extend(sb.table("memories").select("id,type,embedding_id").in_("id", ids[i : i + 500]).execute().data or [])
+    deleted = retire_memories(sb, index, rows)
+    if raw.get("updated"):
+        # rewritten rows now point at this files row: keep it
+        print(f"cleanup     {deleted} memories deleted; files row {resp.get('file_id')} kept ({len(raw['updated'])} rows rewritten in place)")
+        return
+    if resp.get("file_id"):
+        sb.table("files").delete().eq("id", resp["file_id"]).execute()
+    print(f"cleanup     {deleted} memories, files row {resp.get('file_id')} deleted")
+
+def main(path):
+    if not BASE:
+        print("FAIL: set BASE_URL (the probe uploads ~8 MB into that deployment's store)")
+        sys.exit(2)
+    try:
+        from vendors.supabase_client import get_client
+        from vendors.pinecone_client import get_index
+        sb, index = get_client(), get_index()
+    except Exception as e:
+        print(f"FAIL: cleanup needs the deployment's Supabase/Pinecone credentials: {e}")
+        sys.exit(2)
+
+    if path:
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            data = f.read()
+    else:
+        # a fresh token in every paragraph: never a byte-level or near duplicate of anything stored
+        name = "latency-probe.txt"
+        run = uuid.uuid4().hex
+        data = "\n\n".join(
+            f"Section {i} of probe {run}, marker {uuid.uuid4().hex}. The probe paragraph number {i} "
+            f"repeats ordinary prose so conversion and chunking have work to do."
+            for i in range(40000)
+        ).encode("utf-8")
+
+    base = []
+    for _ in range(20):
+        code, ms = ping()
+        if code != 200:
+            print(f"FAIL: /healthz HTTP {code} before upload")
+            sys.exit(1)
+        base.append(ms)
+        time.sleep(0.05)
+    print("baseline   ", summary(base))
+
+    res = {}
+    t = threading.Thread(target=upload, args=(name, data, res), daemon=True)
+    t.start()
+    loaded = []
+    try:
+        while t.is_alive():
+            code, ms = ping()
+            loaded.append(ms)
+            time.sleep(0.1)
+    finally:
+        t.join()
+        cleanup(sb, index, res.get("response"))
+    print(f"upload      HTTP {res.get('status')} in {res.get('ms')}ms ({len(data)} bytes)")
+    print("during     ", summary(loaded))
+
+    limit = max(MAX_P95_MS, pct(base, 95) * MAX_RATIO)
+    if not loaded:
+        print("WARN: upload finished before any /healthz sample; use a larger file")
+    elif pct(loaded, 95) > limit:
+        print(f"FAIL: /healthz p95 {pct(loaded,95)}ms during upload exceeds {int(limit)}ms")
+        sys.exit(1)
+    print("PASS")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,9 +1,23 @@
 import os
+import weakref
 from openai import OpenAI
 
 # Single client instance. Requires OPENAI_API_KEY in the environment.
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI (httpx pools are loop-bound)
+
+def get_async_client():
+    """AsyncOpenAI for the running event loop."""
+    import asyncio
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    aclient = _async_clients.get(loop)
+    if aclient is None:
+        aclient = _async_clients[loop] = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return aclient
+
 # Model env names:
 # Prefer PRD vars (CHAT_MODEL, EMBED_MODEL); fall back to legacy ones.
 CHAT_MODEL  = os.getenv("CHAT_MODEL")  or os.getenv("OPENAI_CHAT_MODEL")  or "gpt-4.1-mini"
@@ -1,26 +1,85 @@
 # vendors/pinecone_client.py
+import asyncio
+import inspect
 import os
+import weakref
 from types import SimpleNamespace
 from pinecone import Pinecone, ServerlessSpec
 
 _pc_singleton = None
 _index = None
+_index_host = None
+_async_indexes = weakref.WeakKeyDictionary()  # event loop -> async index (its HTTP session is loop-bound)
+
+def _pc():
+    global _pc_singleton
+    if _pc_singleton is None:
+        _pc_singleton = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    return _pc_singleton
 
 def get_index():
-    global _pc_singleton, _index
+    global _index
     if _index: 
         return _index
-    _pc_singleton = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
     name = os.getenv("PINECONE_INDEX", "uap-kb")
-    _index = _pc_singleton.Index(name)
+    _index = _pc().Index(name)
     return _index
 
-def safe_query(index, **kwargs):
+async def get_async_index():
+    """
+    Asyncio data-plane client for this event loop (needs pinecone[asyncio]). Without it,
+    the sync index is returned and safe_query_async runs its queries on threads.
+    """
+    global _index_host
+    loop = asyncio.get_running_loop()
+    idx = _async_indexes.get(loop)
+    if idx is None:
+        try:
+            if _index_host is None:
+                name = os.getenv("PINECONE_INDEX", "uap-kb")
+                _index_host = (await asyncio.to_thread(_pc().describe_index, name)).host
+            idx = _pc().IndexAsyncio(host=_index_host)
+        except Exception as e:
+            print("Async Pinecone client unavailable, querying the sync index on threads:", e)
+            idx = get_index()
+        _async_indexes[loop] = idx
+    return idx
+
+def _timeout_kwargs(query, timeout):
+    """
+    The SDK's per-request timeout argument for index.query: `timeout` on current SDKs,
+    `_request_timeout` on the older OpenAPI-generated ones (passed through **kwargs).
+    """
+    if not timeout:
+        return {}
+    try:
+        params = inspect.signature(query).parameters
+    except (TypeError, ValueError):
+        return {}
+    if "timeout" in params:
+        return {"timeout": timeout}
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+        return {"_request_timeout": timeout}
+    return {}
+
+def safe_query(index, timeout=None, **kwargs):
     """
     Always return an object with .matches (list of Ns with .id, .score, .metadata dict).
     Works whether the SDK returns objects or dict-like.
+    timeout (seconds) bounds the HTTP request itself, so the calling thread is freed by then.
     """
-    resp = index.query(**kwargs)
+    return _normalize(index.query(**kwargs, **_timeout_kwargs(index.query, timeout)))
+
+async def safe_query_async(index, timeout=None, **kwargs):
+    """safe_query for get_async_index(): awaits an asyncio index, threads a sync one."""
+    kwargs.update(_timeout_kwargs(index.query, timeout))
+    if inspect.iscoroutinefunction(getattr(index, "query", None)):
+        resp = await index.query(**kwargs)
+    else:
+        resp = await asyncio.to_thread(index.query, **kwargs)
+    return _normalize(resp)
+
+def _normalize(resp):
     # normalize
     data = resp.to_dict() if hasattr(resp, "to_dict") else (resp if isinstance(resp, dict) else None)
     if data:
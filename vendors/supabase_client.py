@@ -1,9 +1,11 @@
 # vendors/supabase_client.py
 import os
+import weakref
 from typing import Optional
 from supabase import create_client, Client
 
 _client: Optional[Client] = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient (httpx pools are loop-bound)
 
 def get_client() -> Client:
     """Return a cached Supabase Client using SERVICE ROLE credentials."""
@@ -17,6 +19,22 @@ def get_client() -> Client:
     _client = create_client(url, key)
     return _client
 
+async def get_async_client():
+    """Cached supabase AsyncClient (SERVICE ROLE) for the running event loop."""
+    import asyncio
+    from supabase import acreate_client
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
+        client = await acreate_client(url, key)
+        _async_clients[loop] = client
+    return client
+
 # ---- Backward-compat shim ----
 # Some legacy code does: `from vendors.supabase_client import supabase` then `supabase.table("...")`.
 # Provide an object with .table/.schema/.rpc/.storage that forwards to the real client.